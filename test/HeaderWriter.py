@@ -16,25 +16,104 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import hashlib
+import itertools
 import os
+import re
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Set, Union
+
+import numpy as np
 
 
 class HeaderWriter:
-    def __init__(self, gendir, tabwidth=4):
+    # Sections behind the pmsis data placement macros
+    SECTION_MACROS = {
+        "PI_L1": ".data_l1",
+        "PI_L2": ".l2_data",
+    }
+
+    def __init__(self, gendir, tabwidth=4, binary=False):
         self.incdir = os.path.join(gendir, "inc")
         os.makedirs(self.incdir, exist_ok=True)
         self.srcdir = os.path.join(gendir, "src")
         os.makedirs(self.srcdir, exist_ok=True)
         self.tabwidth = tabwidth
+        # Emit initialized vectors as raw binary files included by an assembler stub
+        # instead of C initializer lists which are slow to compile
+        self.binary = binary
+        # Files written or removed because their content changed
+        self.changed_files: List[str] = []
+        # Files written, changed or not
+        self.generated_files: Set[str] = set()
+
+    @staticmethod
+    def _file_digest(filepath) -> bytes:
+        h = hashlib.sha256()
+        with open(filepath, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                h.update(block)
+        return h.digest()
+
+    def write_file(self, filepath, body: Union[str, bytes, Iterable[str]]) -> bool:
+        """Write body to filepath unless the file already has the same content
+
+        The body is streamed into a temporary file that atomically replaces the
+        target, or gets discarded when it matches, so that unchanged files keep
+        their timestamps and don't trigger rebuilds.
+        Returns whether the file changed.
+        """
+        self.generated_files.add(os.path.abspath(filepath))
+        dirname = os.path.dirname(filepath)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=dirname)
+        try:
+            h = hashlib.sha256()
+            with os.fdopen(fd, "wb") as file:
+                chunks = [body] if isinstance(body, (str, bytes)) else body
+                for chunk in chunks:
+                    data = chunk.encode() if isinstance(chunk, str) else chunk
+                    h.update(data)
+                    file.write(data)
+
+            changed = not (
+                os.path.isfile(filepath)
+                and os.path.getsize(filepath) == os.path.getsize(tmp_path)
+                and HeaderWriter._file_digest(filepath) == h.digest()
+            )
+            if changed:
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, filepath)
+                self.changed_files.append(filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return changed
+
+    def remove_file(self, filepath) -> None:
+        if os.path.isfile(filepath):
+            os.remove(filepath)
+            self.changed_files.append(filepath)
+
+    def remove_stale_files(self) -> None:
+        """Remove the generated files that weren't written since the last reset"""
+        for dirpath in [self.incdir, self.srcdir]:
+            for filename in sorted(os.listdir(dirpath)):
+                filepath = os.path.join(dirpath, filename)
+                if os.path.abspath(filepath) not in self.generated_files:
+                    self.remove_file(filepath)
+
+    def _report(self, kind, filepath, changed):
+        print(
+            f"Generating {kind} file -> {filepath}{'' if changed else ' (unchanged)'}"
+        )
 
     def header_guard_begin(self, filename):
         guard = filename.replace(".", "_")
         return """#ifndef __{GUARD}__
 #define __{GUARD}__
 
-""".format(
-            GUARD=guard.upper()
-        )
+""".format(GUARD=guard.upper())
 
     def header_guard_end(self, filename):
         guard = filename.replace(".", "_")
@@ -70,34 +149,93 @@ class HeaderWriter:
         retval += f"{_type} {name}[{name.upper()}_SIZE]"
         return retval
 
-    def vector_initial_value(self, data, elements_per_row=10):
-        indent = " " * self.tabwidth
-        size = self.vector_size(data)
-
-        if hasattr(data, "flatten"):
-            data = data.flatten()
+    # Elements rendered at once, bounds the memory used while rendering
+    _RENDER_CHUNK_SIZE = 1 << 16
+    _HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+    def _render_elements(self, chunk, offset, size, elements_per_row):
+        """Render a chunk of elements starting at offset as "{:#04x}" formatted values
+
+        Every element is rendered into a row of a byte matrix followed by its separator,
+        unused bytes are zero and get dropped when the matrix is flattened.
+        """
+        n = chunk.size
+        negative = chunk < 0
+        has_negative = bool(negative.any())
+        # Negating INT64_MIN wraps around to itself, which is the right uint64 magnitude
+        magnitude = (
+            np.where(negative, -chunk, chunk) if has_negative else chunk
+        ).astype(np.uint64)
+
+        # Number of significant digits, "#04x" pads to 2 digits or 1 after the sign
+        max_digits = max(2, (int(magnitude.max()).bit_length() + 3) // 4)
+        digits = np.ones(n, dtype=np.int64)
+        for i in range(1, max_digits):
+            digits += magnitude >= np.uint64(16**i)
+        digits = np.maximum(digits, np.where(negative, 1, 2) if has_negative else 2)
+
+        shifts = np.arange(4 * (max_digits - 1), -1, -4, dtype=np.uint64)
+        nibbles = ((magnitude[:, None] >> shifts) & np.uint64(0xF)).astype(np.uint8)
+        rendered_digits = HeaderWriter._HEX_DIGITS[nibbles]
+        if bool((digits < max_digits).any()):
+            rendered_digits[np.arange(max_digits) < max_digits - digits[:, None]] = 0
+
+        newline = "\n" + " " * self.tabwidth
+        separator = 3 + max_digits
+        matrix = np.zeros((n, separator + 2 + len(newline)), dtype=np.uint8)
+        if has_negative:
+            matrix[negative, 0] = ord("-")
+        matrix[:, 1] = ord("0")
+        matrix[:, 2] = ord("x")
+        matrix[:, 3:separator] = rendered_digits
+        matrix[:, separator : separator + 2] = np.frombuffer(b", ", dtype=np.uint8)
+        first_row_end = (
+            elements_per_row - 1 - offset % elements_per_row
+        ) % elements_per_row
+        matrix[first_row_end::elements_per_row, separator + 2 :] = np.frombuffer(
+            newline.encode(), dtype=np.uint8
+        )
+        if offset + n == size:
+            # Nothing follows the last element
+            matrix[-1, separator:] = 0
+
+        flat = matrix.ravel()
+        return flat[flat != 0].tobytes().decode("ascii")
+
+    def vector_initial_value_chunks(self, data, elements_per_row=10) -> Iterator[str]:
+        if hasattr(data, "numpy"):
+            data = data.numpy()
+        data = np.asarray(data).ravel()
+        size = data.size
+
+        yield " = {"
+        if size > 0:
+            yield "\n" + " " * self.tabwidth
+        for offset in range(0, size, HeaderWriter._RENDER_CHUNK_SIZE):
+            chunk = data[offset : offset + HeaderWriter._RENDER_CHUNK_SIZE]
+            yield self._render_elements(
+                chunk.astype(np.int64), offset, size, elements_per_row
+            )
+        yield "\n}"
 
-        retval = ""
-        retval += " = {"
-        for i, element in enumerate(data):
-            if i % elements_per_row == 0:
-                retval += "\n" + indent
-            retval += "{value:#04x}".format(value=int(element))
-            if i < size - 1:
-                retval += ", "
-        retval += "\n}"
-        return retval
+    def vector_initial_value(self, data, elements_per_row=10):
+        return "".join(self.vector_initial_value_chunks(data, elements_per_row))
 
     def vector_end(self):
         return ";\n\n"
 
-    def render_vector(self, name, size, _type, init=None, elements_per_row=10):
-        retval = ""
-        retval += self.vector_declaration(name, _type, size)
+    def render_vector_chunks(
+        self, name, size, _type, init=None, elements_per_row=10
+    ) -> Iterator[str]:
+        yield self.vector_declaration(name, _type, size)
         if init is not None:
-            retval += self.vector_initial_value(init, elements_per_row)
-        retval += self.vector_end()
-        return retval
+            yield from self.vector_initial_value_chunks(init, elements_per_row)
+        yield self.vector_end()
+
+    def render_vector(self, name, size, _type, init=None, elements_per_row=10):
+        return "".join(
+            self.render_vector_chunks(name, size, _type, init, elements_per_row)
+        )
 
     def check_declaration(self, name):
         return f"void check_{name}();\n\n"
@@ -126,14 +264,11 @@ class HeaderWriter:
         filename = name + ".h"
         filepath = os.path.join(self.incdir, filename)
 
-        print(f"Generating header file -> {filepath}")
-
         filerender = (
             self.header_guard_begin(filename) + body + self.header_guard_end(filename)
         )
 
-        with open(filepath, "w") as file:
-            file.write(filerender)
+        self._report("header", filepath, self.write_file(filepath, filerender))
 
     def generate_vector_header(self, name, size, _type, init=None, golden=None):
         render = ""
@@ -146,29 +281,113 @@ class HeaderWriter:
 
         self.generate_header(name, render)
 
-    def generate_source(self, name, body):
+    def generate_source(self, name, body: Union[str, Iterable[str]]):
         filename = name + ".c"
         filepath = os.path.join(self.srcdir, filename)
 
-        print(f"Generating source file -> {filepath}")
+        self._report("source", filepath, self.write_file(filepath, body))
+
+    def section_name(self, section):
+        match = re.fullmatch(r'__attribute__\(\(section\("([^"]+)"\)\)\)', section)
+        if match is not None:
+            return match.group(1)
+        assert (
+            section in HeaderWriter.SECTION_MACROS
+        ), f"Unknown section {section}. Known sections: {list(HeaderWriter.SECTION_MACROS)}"
+        return HeaderWriter.SECTION_MACROS[section]
+
+    @staticmethod
+    def binary_data(_type, data) -> bytes:
+        """Returns data as little-endian raw values of the C type _type"""
+        if hasattr(data, "numpy"):
+            data = data.numpy()
+        dtype = np.dtype(_type.removesuffix("_t")).newbyteorder("<")
+        return np.asarray(data).ravel().astype(dtype).tobytes()
+
+    def generate_binary(self, name, _type, data):
+        """Write data as little-endian raw values of the C type _type"""
+        filepath = os.path.join(self.srcdir, name + ".bin")
+        blob = HeaderWriter.binary_data(_type, data)
+
+        self._report("binary", filepath, self.write_file(filepath, blob))
+
+        return filepath, hashlib.sha256(blob).hexdigest()
+
+    def generate_image(self, filepath, blob: bytes):
+        """Write a binary image loaded by the app at runtime"""
+        self._report("image", filepath, self.write_file(filepath, blob))
+
+    def render_incbin(self, name, section, filepath, digest):
+        # The digest changes the stub together with the data since the
+        # build systems don't track .incbin dependencies. The file is found
+        # through the assembler's include path so that the stub doesn't depend
+        # on the location of the generated sources.
+        return f"""/* {os.path.basename(filepath)} sha256: {digest} */
+    .section {self.section_name(section)}, "aw", @progbits
+    .global {name}
+    .type {name}, @object
+    .balign 4
+{name}:
+    .incbin "{os.path.basename(filepath)}"
+    .size {name}, . - {name}
+
+"""
+
+    def generate_asm_source(self, name, body):
+        filename = name + ".S"
+        filepath = os.path.join(self.srcdir, filename)
 
-        with open(filepath, "w") as file:
-            file.write(body)
+        self._report("assembly source", filepath, self.write_file(filepath, body))
 
-    def generate_vector_source(
+    def generate_vector_binary_source(
         self, name, size, _type, init=None, golden=None, section="PI_L1"
     ):
-        render = ""
-        render += f'#include "{name}.h"\n\n'
-        render += self.render_vector(name, f"{section} {_type}", size, init=init)
+        render = f'#include "{name}.h"\n\n'
+        stub = ""
+
+        if init is not None:
+            stub += self.render_incbin(
+                name, section, *self.generate_binary(name, _type, init)
+            )
+        else:
+            render += self.render_vector(name, f"{section} {_type}", size)
 
         if golden is not None:
-            render += self.render_vector(
-                "golden_" + name, "PI_L2 " + _type, size, init=golden
+            stub += self.render_incbin(
+                "golden_" + name,
+                "PI_L2",
+                *self.generate_binary("golden_" + name, _type, golden),
             )
             render += self.check(name)
 
         self.generate_source(name, render)
+        if len(stub) > 0:
+            # Different name than the C source to avoid clashing object files
+            self.generate_asm_source(name + "_data", stub)
+
+    def generate_vector_source(
+        self, name, size, _type, init=None, golden=None, section="PI_L1"
+    ):
+        if self.binary and (init is not None or golden is not None):
+            self.generate_vector_binary_source(name, size, _type, init, golden, section)
+            return
+
+        # Rendered lazily so large vectors get streamed into the file
+        render = itertools.chain(
+            [f'#include "{name}.h"\n\n'],
+            self.render_vector_chunks(name, f"{section} {_type}", size, init=init),
+        )
+
+        if golden is not None:
+            render = itertools.chain(
+                render,
+                self.render_vector_chunks(
+                    "golden_" + name, "PI_L2 " + _type, size, init=golden
+                ),
+                [self.check(name)],
+            )
+
+        self.generate_source(name, render)
 
     def generate_vector_files(
         self, name, size, _type, init=None, golden=None, section="PI_L1"
@@ -195,3 +414,25 @@ class HeaderWriter:
 
     def generate_defines_header(self, name, defines):
         self.generate_header(name, body=self.render_grouped_defines(defines) + "\n")
+
+    def field_value(self, value):
+        if value is None:
+            return "NULL"
+        elif isinstance(value, bool):
+            return str(int(value))
+        # Strings are C expressions
+        return str(value)
+
+    def render_grouped_fields(self, fields: Dict[str, Any], prefix=None, indent=1):
+        """Render fields as designated initializers, flattening the groups like defines"""
+        retval = ""
+        for name, value in fields.items():
+            full_name = name if prefix is None else f"{prefix}_{name}"
+            if isinstance(value, dict):
+                retval += self.render_grouped_fields(value, full_name, indent)
+            else:
+                retval += (
+                    " " * (indent * self.tabwidth)
+                    + f".{full_name} = {self.field_value(value)},\n"
+                )
+        return retval
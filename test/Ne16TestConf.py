@@ -22,7 +22,7 @@ from typing import List, Optional, Union
 
 from pydantic import field_validator, model_validator
 
-from NeuralEngineFunctionalModel import NeuralEngineFunctionalModel
+from NeuralEngineFunctionalModelNumpy import NeuralEngineFunctionalModelNumpy
 from NnxTestClasses import NnxTestConf
 from TestClasses import IntegerType, KernelShape, Stride, implies
 
@@ -103,9 +103,9 @@ class Ne16TestConf(NnxTestConf):
     def check_valid_out_type_with_norm_quant(self) -> Ne16TestConf:
         assert implies(
             not self.has_norm_quant,
-            self.out_type == NeuralEngineFunctionalModel.ACCUMULATOR_TYPE,
+            self.out_type == NeuralEngineFunctionalModelNumpy.ACCUMULATOR_TYPE,
         ), (
             f"Without quantization, the output type has to be equal to the "
-            f"accumulator type {NeuralEngineFunctionalModel.ACCUMULATOR_TYPE}. Given output type {self.out_type}"
+            f"accumulator type {NeuralEngineFunctionalModelNumpy.ACCUMULATOR_TYPE}. Given output type {self.out_type}"
         )
         return self
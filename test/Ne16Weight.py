@@ -16,7 +16,7 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 import numpy.typing as npt
@@ -104,13 +104,16 @@ class Ne16Weight(NnxWeight):
 
         return weight
 
-    def source_generate(
-        self, init: npt.NDArray[np.uint8], header_writer: HeaderWriter
-    ) -> None:
+    def section(self) -> str:
         assert (
             self.wmem == NnxWmem.tcdm
         ), f"Unsupported weight memory destination {self.wmem}"
-        section = "PI_L1"
+        return "PI_L1"
+
+    def source_generate(
+        self, init: npt.NDArray[np.uint8], header_writer: HeaderWriter
+    ) -> Optional[str]:
+        section = self.section()
 
         header_writer.generate_vector_files(
             "weight",
@@ -119,3 +122,5 @@ class Ne16Weight(NnxWeight):
             init=init,
             section=section,
         )
+
+        return None
@@ -3,11 +3,14 @@ from typing import Optional
 import torch
 import torch.nn.functional as F
 
+from NeuralEngineFunctionalModelNumpy import NeuralEngineFunctionalModelNumpy
 from TestClasses import IntegerType, Padding, Stride
 
 
 class NeuralEngineFunctionalModel:
-    ACCUMULATOR_TYPE = IntegerType(name="int32")
+    # Shared with the NumPy implementation which has to compute the same outputs
+    VERSION = NeuralEngineFunctionalModelNumpy.VERSION
+    ACCUMULATOR_TYPE = NeuralEngineFunctionalModelNumpy.ACCUMULATOR_TYPE
 
     @staticmethod
     def _cast(
@@ -66,24 +69,81 @@ class NeuralEngineFunctionalModel:
 
         return tensor
 
-    def convolution(
+    # Integers of up to 53 bits are exact in float64
+    _FLOAT64_EXACT_BITS = 53
+
+    @staticmethod
+    def _matmul(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+        """Exact integer matrix multiplication
+
+        Uses the float64 BLAS kernels whenever the sums can't get big enough to
+        round, which are a lot faster than the integer ones.
+        """
+        a = a.type(torch.int64)
+        b = b.type(torch.int64)
+        if a.numel() == 0 or b.numel() == 0:
+            return torch.matmul(a, b)
+
+        bound = int(a.abs().max()) * int(b.abs().max()) * a.shape[-1]
+        if bound.bit_length() <= NeuralEngineFunctionalModel._FLOAT64_EXACT_BITS:
+            return torch.matmul(a.type(torch.float64), b.type(torch.float64)).type(
+                torch.int64
+            )
+        else:
+            return torch.matmul(a, b)
+
+    @staticmethod
+    def _conv2d(
+        input: torch.Tensor, weight: torch.Tensor, stride: Stride, depthwise: bool
+    ) -> torch.Tensor:
+        """Exact integer convolution of an already padded input
+
+        The weight is either shared by the whole batch, with shape (cout, cin, height, width),
+        or stacked per sample, with shape (N, cout, cin, height, width).
+        """
+        if weight.dim() == 4:
+            weight = weight.unsqueeze(0)
+        _, _, _, kernel_height, kernel_width = weight.shape
+        # Shape (N, C, H_out, W_out, kernel_height, kernel_width)
+        patches = input.unfold(2, kernel_height, stride.height).unfold(
+            3, kernel_width, stride.width
+        )
+
+        if depthwise:
+            # Each channel gets convolved with its own filter
+            patches = patches.type(torch.int64)
+            weight = weight.type(torch.int64)
+            output = torch.zeros(patches.shape[:4], dtype=torch.int64)
+            for i in range(kernel_height):
+                for j in range(kernel_width):
+                    output += patches[..., i, j] * weight[:, :, 0, i, j, None, None]
+            return output
+
+        # im2col
+        n, c, h_out, w_out, _, _ = patches.shape
+        columns = patches.permute(0, 2, 3, 1, 4, 5).reshape(
+            n, h_out * w_out, c * kernel_height * kernel_width
+        )
+        output = NeuralEngineFunctionalModel._matmul(
+            columns, weight.flatten(2).transpose(1, 2)
+        )
+        return output.reshape(n, h_out, w_out, -1).permute(0, 3, 1, 2)
+
+    def accumulate(
         self,
         input: torch.Tensor,
         weight: torch.Tensor,
-        scale: Optional[torch.Tensor],
-        bias: Optional[torch.Tensor],
-        global_shift: Optional[torch.Tensor],
         padding: Padding,
         stride: Stride,
         depthwise: bool,
-        out_type: IntegerType,
-        bias_type: Optional[IntegerType],
-        has_norm_quant: bool,
-        has_bias: bool,
-        has_relu: bool,
         verbose: bool = False,
         **kwargs,
     ) -> torch.Tensor:
+        """Raw accumulator values of the convolution before normalization/requantization
+
+        A batch of inputs can either share the weight or have their own ones stacked
+        along a leading dimension.
+        """
         _ = kwargs
 
         input_padded = F.pad(
@@ -100,12 +160,9 @@ class NeuralEngineFunctionalModel:
 
         # Accumulators are 32bit non-saturating.
         # Calculate in higher precision (int64)
-        output = F.conv2d(
-            input=input_padded,
-            weight=weight,
-            stride=(stride.height, stride.width),
-            groups=weight.shape[0] if depthwise else 1,
-        ).type(torch.int64)
+        output = NeuralEngineFunctionalModel._conv2d(
+            input_padded, weight, stride, depthwise
+        )
 
         # Cast to accumulator type
         output = NeuralEngineFunctionalModel._cast(
@@ -116,19 +173,73 @@ class NeuralEngineFunctionalModel:
             print("INTERMEDIATE RESULTS (pre-normalization/requant):")
             print(output)
 
-        if has_norm_quant:
-            assert scale is not None
-            assert global_shift is not None
-            output = self._norm_quant(
-                output,
-                scale,
-                bias,
-                global_shift,
-                out_type,
-                bias_type,
-                has_bias,
-                has_relu,
-                verbose,
-            )
-
         return output
+
+    def requantize(
+        self,
+        accumulator: torch.Tensor,
+        scale: Optional[torch.Tensor],
+        bias: Optional[torch.Tensor],
+        global_shift: Optional[torch.Tensor],
+        out_type: IntegerType,
+        bias_type: Optional[IntegerType],
+        has_norm_quant: bool,
+        has_bias: bool,
+        has_relu: bool,
+        verbose: bool = False,
+        **kwargs,
+    ) -> torch.Tensor:
+        """Output of the layer given the accumulator values from accumulate"""
+        _ = kwargs
+
+        if not has_norm_quant:
+            return accumulator
+
+        assert scale is not None
+        assert global_shift is not None
+        return self._norm_quant(
+            accumulator,
+            scale,
+            bias,
+            global_shift,
+            out_type,
+            bias_type,
+            has_bias,
+            has_relu,
+            verbose,
+        )
+
+    def convolution(
+        self,
+        input: torch.Tensor,
+        weight: torch.Tensor,
+        scale: Optional[torch.Tensor],
+        bias: Optional[torch.Tensor],
+        global_shift: Optional[torch.Tensor],
+        padding: Padding,
+        stride: Stride,
+        depthwise: bool,
+        out_type: IntegerType,
+        bias_type: Optional[IntegerType],
+        has_norm_quant: bool,
+        has_bias: bool,
+        has_relu: bool,
+        verbose: bool = False,
+        **kwargs,
+    ) -> torch.Tensor:
+        _ = kwargs
+
+        output = self.accumulate(input, weight, padding, stride, depthwise, verbose)
+
+        return self.requantize(
+            output,
+            scale,
+            bias,
+            global_shift,
+            out_type,
+            bias_type,
+            has_norm_quant,
+            has_bias,
+            has_relu,
+            verbose,
+        )
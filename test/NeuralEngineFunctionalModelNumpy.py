@@ -0,0 +1,250 @@
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+from numpy.lib.stride_tricks import sliding_window_view
+
+from TestClasses import IntegerType, Padding, Stride
+
+
+class NeuralEngineFunctionalModelNumpy:
+    """NumPy implementation of NeuralEngineFunctionalModel
+
+    Doesn't depend on torch, and computes the same outputs with the same types.
+    """
+
+    # Bump on any change that alters the model outputs
+    VERSION = 1
+    ACCUMULATOR_TYPE = IntegerType(name="int32")
+
+    @staticmethod
+    def _cast(
+        tensor: npt.NDArray, _type: IntegerType, saturate: bool = False
+    ) -> npt.NDArray:
+        if saturate:
+            return np.clip(tensor, _type.min, _type.max)
+        else:
+            return tensor & ((1 << _type._bits) - 1)
+
+    def _norm_quant(
+        self,
+        tensor: npt.NDArray,
+        scale: npt.NDArray,
+        bias: Optional[npt.NDArray],
+        global_shift: npt.NDArray,
+        out_type: IntegerType,
+        bias_type: Optional[IntegerType],
+        has_bias: bool,
+        has_relu: bool,
+        verbose: bool,
+    ) -> npt.NDArray:
+        # Scale accumulators are in 48bit, so keeping the data in 64bit
+        tensor = tensor * scale
+        assert tensor.dtype == np.int64
+
+        if verbose:
+            print("INTERMEDIATE RESULTS (after scale):")
+            print(tensor)
+
+        if has_bias:
+            assert bias is not None
+            assert bias_type is not None
+
+            tensor = NeuralEngineFunctionalModelNumpy._cast(
+                tensor, bias_type, saturate=False
+            ).astype(np.int32)
+
+            tensor = tensor + bias
+
+            tensor = NeuralEngineFunctionalModelNumpy._cast(
+                tensor, bias_type, saturate=True
+            ).astype(np.int32)
+
+            if verbose:
+                print("INTERMEDIATE RESULTS (after bias):")
+                print(tensor)
+
+        if has_relu:
+            tensor = np.maximum(tensor, 0)
+
+        tensor = tensor >> global_shift
+
+        # Saturate into out_type
+        tensor = NeuralEngineFunctionalModelNumpy._cast(tensor, out_type, saturate=True)
+
+        return tensor
+
+    # Integers of up to 53 bits are exact in float64
+    _FLOAT64_EXACT_BITS = 53
+
+    @staticmethod
+    def _matmul(a: npt.NDArray, b: npt.NDArray) -> npt.NDArray:
+        """Exact integer matrix multiplication
+
+        Uses the float64 BLAS kernels whenever the sums can't get big enough to
+        round, since NumPy doesn't have BLAS kernels for integers at all.
+        """
+        a = a.astype(np.int64)
+        b = b.astype(np.int64)
+        if a.size == 0 or b.size == 0:
+            return np.matmul(a, b)
+
+        bound = int(np.abs(a).max()) * int(np.abs(b).max()) * a.shape[-1]
+        if bound.bit_length() <= NeuralEngineFunctionalModelNumpy._FLOAT64_EXACT_BITS:
+            return np.matmul(a.astype(np.float64), b.astype(np.float64)).astype(
+                np.int64
+            )
+        else:
+            return np.matmul(a, b)
+
+    @staticmethod
+    def _conv2d(
+        input: npt.NDArray, weight: npt.NDArray, stride: Stride, depthwise: bool
+    ) -> npt.NDArray:
+        """Exact integer convolution of an already padded input
+
+        The weight is either shared by the whole batch, with shape (cout, cin, height, width),
+        or stacked per sample, with shape (N, cout, cin, height, width).
+        """
+        if weight.ndim == 4:
+            weight = weight[np.newaxis]
+        _, _, _, kernel_height, kernel_width = weight.shape
+        # Shape (N, C, H_out, W_out, kernel_height, kernel_width)
+        patches = sliding_window_view(
+            sliding_window_view(input, kernel_height, axis=2), kernel_width, axis=3
+        )[:, :, :: stride.height, :: stride.width]
+
+        if depthwise:
+            # Each channel gets convolved with its own filter
+            patches = patches.astype(np.int64)
+            weight = weight.astype(np.int64)
+            output = np.zeros(patches.shape[:4], dtype=np.int64)
+            for i in range(kernel_height):
+                for j in range(kernel_width):
+                    output += patches[..., i, j] * weight[:, :, 0, i, j, None, None]
+            return output
+
+        # im2col
+        n, c, h_out, w_out, _, _ = patches.shape
+        columns = patches.transpose(0, 2, 3, 1, 4, 5).reshape(
+            n, h_out * w_out, c * kernel_height * kernel_width
+        )
+        output = NeuralEngineFunctionalModelNumpy._matmul(
+            columns, weight.reshape(weight.shape[0], weight.shape[1], -1).swapaxes(1, 2)
+        )
+        return output.reshape(n, h_out, w_out, -1).transpose(0, 3, 1, 2)
+
+    def accumulate(
+        self,
+        input: npt.NDArray,
+        weight: npt.NDArray,
+        padding: Padding,
+        stride: Stride,
+        depthwise: bool,
+        verbose: bool = False,
+        **kwargs,
+    ) -> npt.NDArray:
+        """Raw accumulator values of the convolution before normalization/requantization
+
+        A batch of inputs can either share the weight or have their own ones stacked
+        along a leading dimension.
+        """
+        _ = kwargs
+
+        input_padded = np.pad(
+            input,
+            (
+                (0, 0),
+                (0, 0),
+                (padding.top, padding.bottom),
+                (padding.left, padding.right),
+            ),
+            "constant",
+            constant_values=0,
+        )
+
+        # Accumulators are 32bit non-saturating.
+        # Calculate in higher precision (int64)
+        output = NeuralEngineFunctionalModelNumpy._conv2d(
+            input_padded, weight, stride, depthwise
+        )
+
+        # Cast to accumulator type
+        output = NeuralEngineFunctionalModelNumpy._cast(
+            output, NeuralEngineFunctionalModelNumpy.ACCUMULATOR_TYPE, saturate=False
+        ).astype(np.int32)
+
+        if verbose:
+            print("INTERMEDIATE RESULTS (pre-normalization/requant):")
+            print(output)
+
+        return output
+
+    def requantize(
+        self,
+        accumulator: npt.NDArray,
+        scale: Optional[npt.NDArray],
+        bias: Optional[npt.NDArray],
+        global_shift: Optional[npt.NDArray],
+        out_type: IntegerType,
+        bias_type: Optional[IntegerType],
+        has_norm_quant: bool,
+        has_bias: bool,
+        has_relu: bool,
+        verbose: bool = False,
+        **kwargs,
+    ) -> npt.NDArray:
+        """Output of the layer given the accumulator values from accumulate"""
+        _ = kwargs
+
+        if not has_norm_quant:
+            return accumulator
+
+        assert scale is not None
+        assert global_shift is not None
+        return self._norm_quant(
+            accumulator,
+            scale,
+            bias,
+            global_shift,
+            out_type,
+            bias_type,
+            has_bias,
+            has_relu,
+            verbose,
+        )
+
+    def convolution(
+        self,
+        input: npt.NDArray,
+        weight: npt.NDArray,
+        scale: Optional[npt.NDArray],
+        bias: Optional[npt.NDArray],
+        global_shift: Optional[npt.NDArray],
+        padding: Padding,
+        stride: Stride,
+        depthwise: bool,
+        out_type: IntegerType,
+        bias_type: Optional[IntegerType],
+        has_norm_quant: bool,
+        has_bias: bool,
+        has_relu: bool,
+        verbose: bool = False,
+        **kwargs,
+    ) -> npt.NDArray:
+        _ = kwargs
+
+        output = self.accumulate(input, weight, padding, stride, depthwise, verbose)
+
+        return self.requantize(
+            output,
+            scale,
+            bias,
+            global_shift,
+            out_type,
+            bias_type,
+            has_norm_quant,
+            has_bias,
+            has_relu,
+            verbose,
+        )
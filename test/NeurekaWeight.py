@@ -17,7 +17,7 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 import numpy.typing as npt
@@ -162,18 +162,21 @@ class NeurekaWeight(NnxWeight):
 
         return weight
 
-    def source_generate(
-        self, init: npt.NDArray[np.uint8], header_writer: HeaderWriter
-    ) -> None:
+    def section(self) -> str:
         if self.wmem == NnxWmem.sram:
-            section = '__attribute__((section(".weightmem_sram")))'
+            return '__attribute__((section(".weightmem_sram")))'
         elif self.wmem == NnxWmem.mram:
-            section = '__attribute__((section(".weightmem_mram")))'
+            return '__attribute__((section(".weightmem_mram")))'
         elif self.wmem == NnxWmem.tcdm:
-            section = "PI_L1"
+            return "PI_L1"
         else:
             assert False, f"Unsupported weight memory destination {self.wmem}"
 
+    def source_generate(
+        self, init: npt.NDArray[np.uint8], header_writer: HeaderWriter
+    ) -> Optional[str]:
+        section = self.section()
+
         header_writer.generate_vector_files(
             "weight",
             _type="uint8_t",
@@ -181,3 +184,5 @@ class NeurekaWeight(NnxWeight):
             init=init,
             section=section,
         )
+
+        return None
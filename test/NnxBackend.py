@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import TYPE_CHECKING, Optional, Tuple, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from NeuralEngineFunctionalModelNumpy import NeuralEngineFunctionalModelNumpy
+
+if TYPE_CHECKING:
+    import torch
+
+# Tensors of the tests are torch tensors or NumPy arrays depending on the backend
+NnxTensor = Union["torch.Tensor", npt.NDArray]
+
+
+class NnxRandom(ABC):
+    """Source of the random data of a test"""
+
+    @abstractmethod
+    def randint(self, low: int, high: int, size: Tuple) -> npt.NDArray[np.int64]:
+        """Same as torch.randint"""
+        ...
+
+    @abstractmethod
+    def random_bytes(self, count: int) -> npt.NDArray[np.uint8]:
+        """Same as torch.Tensor.random_ on an uint8 tensor"""
+        ...
+
+
+class NnxTorchRandom(NnxRandom):
+    def __init__(self, seed: int) -> None:
+        import torch
+
+        self.generator = torch.Generator().manual_seed(seed)
+
+    def randint(self, low: int, high: int, size: Tuple) -> npt.NDArray[np.int64]:
+        import torch
+
+        return torch.randint(low, high, size=size, generator=self.generator).numpy()
+
+    def random_bytes(self, count: int) -> npt.NDArray[np.uint8]:
+        import torch
+
+        tensor = torch.empty(count, dtype=torch.uint8)
+        tensor.random_(generator=self.generator)
+        return tensor.numpy()
+
+
+class NnxNumpyRandom(NnxRandom):
+    """Draws the same numbers as a torch CPU generator with the same seed
+
+    The torch CPU generator is an MT19937 initialized with the lower 32 bits of the
+    seed, the same as NumPy's legacy RandomState. Bounded integers are then drawn
+    serially by taking a 32 bit number, or two of them as the upper and the lower
+    half of a 64 bit number if the range doesn't fit into 32 bits, modulo the range.
+    """
+
+    def __init__(self, seed: int) -> None:
+        self.state = np.random.RandomState(seed & 0xFFFFFFFF)
+
+    def _random32(self, count: int) -> npt.NDArray[np.uint32]:
+        return self.state.randint(0, 1 << 32, size=count, dtype=np.uint32)
+
+    def randint(self, low: int, high: int, size: Tuple) -> npt.NDArray[np.int64]:
+        count = int(np.prod(size))
+        _range = high - low
+        values: npt.NDArray
+        if _range >= 1 << 32:
+            halves = self._random32(2 * count).astype(np.uint64).reshape(count, 2)
+            values = (halves[:, 0] << np.uint64(32)) | halves[:, 1]
+            values %= np.uint64(_range)
+        else:
+            # Reduced in 32 bits, the modulo of a power of two as a cheaper mask
+            values = self._random32(count)
+            if _range & (_range - 1) == 0:
+                values &= np.uint32(_range - 1)
+            else:
+                values %= np.uint32(_range)
+        return np.add(values, low, dtype=np.int64).reshape(size)
+
+    def random_bytes(self, count: int) -> npt.NDArray[np.uint8]:
+        # The cast keeps the lowest byte
+        return self._random32(count).astype(np.uint8)
+
+
+class NnxBackend(Enum):
+    """Array library computing the test data
+
+    Both backends generate the same data bit for bit. The numpy one doesn't need torch,
+    though tensors saved in the pt format can only be read and written with torch.
+    """
+
+    torch = "torch"
+    numpy = "numpy"
+
+    def __str__(self) -> str:
+        return self.value
+
+    def random(self, seed: int) -> NnxRandom:
+        if self == NnxBackend.torch:
+            return NnxTorchRandom(seed)
+        else:
+            return NnxNumpyRandom(seed)
+
+    def from_numpy(self, array: npt.NDArray) -> NnxTensor:
+        """Tensor of the backend sharing the array's memory"""
+        if self == NnxBackend.torch:
+            import torch
+
+            return torch.from_numpy(array)
+        else:
+            return np.asarray(array)
+
+    def accumulate(
+        self, input: npt.NDArray, weight: npt.NDArray, **kwargs
+    ) -> npt.NDArray:
+        """NeuralEngineFunctionalModel.accumulate of the backend on NumPy arrays"""
+        if self == NnxBackend.torch:
+            import torch
+
+            from NeuralEngineFunctionalModel import NeuralEngineFunctionalModel
+
+            return (
+                NeuralEngineFunctionalModel()
+                .accumulate(torch.from_numpy(input), torch.from_numpy(weight), **kwargs)
+                .numpy()
+            )
+        else:
+            return NeuralEngineFunctionalModelNumpy().accumulate(
+                input, weight, **kwargs
+            )
+
+    def requantize(
+        self,
+        accumulator: npt.NDArray,
+        scale: Optional[npt.NDArray],
+        bias: Optional[npt.NDArray],
+        global_shift: Optional[npt.NDArray],
+        **kwargs,
+    ) -> npt.NDArray:
+        """NeuralEngineFunctionalModel.requantize of the backend on NumPy arrays"""
+        if self == NnxBackend.torch:
+            import torch
+
+            from NeuralEngineFunctionalModel import NeuralEngineFunctionalModel
+
+            def from_numpy(array: Optional[npt.NDArray]) -> Optional[torch.Tensor]:
+                return None if array is None else torch.from_numpy(array)
+
+            return (
+                NeuralEngineFunctionalModel()
+                .requantize(
+                    torch.from_numpy(accumulator),
+                    from_numpy(scale),
+                    from_numpy(bias),
+                    from_numpy(global_shift),
+                    **kwargs,
+                )
+                .numpy()
+            )
+        else:
+            return NeuralEngineFunctionalModelNumpy().requantize(
+                accumulator, scale, bias, global_shift, **kwargs
+            )
@@ -1,53 +1,554 @@
+import functools
 import os
+import re
+import shutil
+import signal
 import subprocess
+import threading
 from abc import ABC, abstractmethod
 from enum import Enum
 from pathlib import Path
-from typing import Dict, Type
+from typing import Dict, List, Optional, Tuple, Type, Union
 
+from NnxCache import NnxCache
 from NnxMapping import NnxName
 
 
+class NnxRunWatchdog:
+    """Watches the output of a simulation to stop it as soon as it failed
+
+    The simulation gets stopped once a check prints its failure summary, or once the
+    number of printed errors passes the error limit, which also bounds the amount
+    of output kept in memory.
+    """
+
+    ERROR_REGEX = re.compile(r"^ERROR: ")
+    FAILURE_REGEX = re.compile(r"^> Failure! Found (\d*)/(\d*) errors\.")
+    DEFAULT_ERROR_LIMIT = 100
+
+    def __init__(
+        self, error_limit: Optional[int] = DEFAULT_ERROR_LIMIT, stop_on_failure=True
+    ) -> None:
+        self.error_limit = error_limit
+        self.stop_on_failure = stop_on_failure
+        self.errors = 0
+
+    def copy(self) -> "NnxRunWatchdog":
+        """Watchdog with the same limits that didn't see any output yet"""
+        return NnxRunWatchdog(self.error_limit, self.stop_on_failure)
+
+    def check(self, line: str) -> Optional[str]:
+        """Returns the reason to stop the simulation after the line, if any"""
+        if NnxRunWatchdog.ERROR_REGEX.match(line):
+            self.errors += 1
+            if self.error_limit is not None and self.errors > self.error_limit:
+                return f"more than {self.error_limit} errors"
+        elif self.stop_on_failure and NnxRunWatchdog.FAILURE_REGEX.match(line):
+            return line.strip()
+        return None
+
+
+class NnxRunStopped(subprocess.SubprocessError):
+    """The watchdog stopped the command before it finished"""
+
+    def __init__(self, cmd: str, reason: str, output: str) -> None:
+        self.cmd = cmd
+        self.reason = reason
+        self.output = output
+
+    def __str__(self) -> str:
+        return f"Command '{self.cmd}' stopped early: {self.reason}"
+
+
+@functools.lru_cache
+def _command_output(cmd: Tuple[str, ...]) -> Optional[str]:
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _first_env(env_vars: List[str]) -> Optional[str]:
+    """Value of the first of the environment variables that is set"""
+    return next((os.environ[var] for var in env_vars if var in os.environ), None)
+
+
+def _list_files(root: str, paths: List[str]) -> List[str]:
+    """Files under the paths, given relative to the root, in a stable order"""
+    files = []
+    for path in paths:
+        path = os.path.join(root, path)
+        if os.path.isfile(path):
+            files.append(path)
+        for dirpath, _, filenames in os.walk(path):
+            files.extend(os.path.join(dirpath, filename) for filename in filenames)
+    return sorted(files)
+
+
+@functools.lru_cache
+def _tree_signature(*roots: str) -> str:
+    """Paths, sizes, and modification times of the files under the roots"""
+    signature = []
+    for root in roots:
+        root = os.path.realpath(root)
+        signature.append(root)
+        for path in _list_files(root, ["."]):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature.append(
+                f"{os.path.relpath(path, root)} {stat.st_size} {stat.st_mtime_ns}"
+            )
+    return "\n".join(signature)
+
+
+# Prefixes shared with other packages, whose lib directories aren't the simulator's own
+_SHARED_PREFIXES = ["/", "/usr", "/usr/local"]
+
+
+@functools.lru_cache
+def _simulator_signature(executable: str) -> str:
+    """Content of the simulator's executable and signature of its libraries and models
+
+    They're in the lib and models directories of its installation, the parent of the
+    executable's bin directory, or in their gvsoc subdirectories for an installation
+    into a shared prefix like /usr.
+    """
+    executable = os.path.realpath(executable)
+    root = os.path.dirname(os.path.dirname(executable))
+    dirs = ["lib", "models"]
+    if root in _SHARED_PREFIXES:
+        dirs = [os.path.join(dir, "gvsoc") for dir in dirs]
+    return "\n".join(
+        [
+            NnxCache.key(Path(executable).read_bytes()),
+            _tree_signature(*(os.path.join(root, dir) for dir in dirs)),
+        ]
+    )
+
+
 class NnxBuildFlow(ABC):
+    _BUILD_STAMP_NAME = ".nnx_build_stamp"
+    ARTIFACT_CACHE_DIR = os.path.join(NnxCache.DEFAULT_ROOT, "build")
+    RESULT_CACHE_DIR = os.path.join(NnxCache.DEFAULT_ROOT, "results")
+    _RESULT_FILENAME = "stdout.txt"
+    # Directories of the generated sources that get compiled, the rest of the
+    # generated files, e.g. the layer image, is only read at runtime
+    _GEN_SOURCE_DIRS = ["inc", "src"]
+    _APP_DIR = "app"
+    # Sources of the app and the library, relative to the app directory
+    _APP_SOURCES = ["src", "inc", "cmake", "Makefile", "CMakeLists.txt"]
+    _LIB_SOURCES = ["../../inc", "../../src", "../../util", "../../CMakeLists.txt"]
+
+    nnxName: NnxName
+    # Directory for the generated test sources
+    gen_dir: str
+
+    @abstractmethod
+    def __init__(self, nnxName: NnxName, workdir: Optional[str] = None) -> None:
+        """Without a workdir, the flow builds and runs in the shared app directory.
+        With it, the generated sources, build, and simulation files are all kept
+        inside of the workdir so that multiple flows can run in parallel.
+        """
+        ...
+
+    @abstractmethod
+    def build_stamp_path(self) -> str:
+        """Path of the file marking a successful build"""
+        ...
+
+    def _invalidate_build_stamp(self) -> None:
+        if os.path.isfile(self.build_stamp_path()):
+            os.remove(self.build_stamp_path())
+
+    def _write_build_stamp(self) -> None:
+        with open(self.build_stamp_path(), "w") as fp:
+            fp.write(str(self.nnxName))
+
+    def is_built(self) -> bool:
+        """Whether the last build succeeded and was done for this accelerator"""
+        if not os.path.isfile(self.build_stamp_path()):
+            return False
+        with open(self.build_stamp_path(), "r") as fp:
+            return fp.read() == str(self.nnxName)
+
+    @abstractmethod
+    def _build(self) -> None: ...
+
+    @abstractmethod
+    def artifact_dir(self) -> str:
+        """Directory holding the build outputs needed by the simulation"""
+        ...
 
     @abstractmethod
-    def __init__(self, nnxName: NnxName) -> None: ...
+    def artifact_names(self) -> List[str]:
+        """Files or directories inside of the artifact_dir needed by the simulation"""
+        ...
 
     @abstractmethod
-    def build(self) -> None: ...
+    def toolchain_version(self) -> Optional[str]:
+        """Identifies the compiler and the SDK of the build, None if not found"""
+        ...
+
+    def artifact_key(self) -> Optional[str]:
+        """Key of the build outputs in the artifact cache, None if it can't be known
+
+        Covers everything that goes into the binary: the generated sources, the app
+        and library sources, the accelerator, the build flow, and the toolchain.
+        """
+        toolchain = self.toolchain_version()
+        if toolchain is None:
+            return None
+
+        parts: List[Union[str, bytes]] = [str(self), str(self.nnxName), toolchain]
+        # The generated sources are named relative to the gen_dir so that every
+        # workdir with the same test shares the entry
+        for root, paths in [
+            (self.gen_dir, NnxBuildFlow._GEN_SOURCE_DIRS),
+            (
+                NnxBuildFlow._APP_DIR,
+                NnxBuildFlow._APP_SOURCES
+                + NnxBuildFlow._LIB_SOURCES
+                + [os.path.join("..", "..", str(self.nnxName))],
+            ),
+        ]:
+            for path in _list_files(root, paths):
+                parts.append(os.path.relpath(path, root))
+                parts.append(Path(path).read_bytes())
+        return NnxCache.key(*parts)
+
+    def _save_artifacts(self, entry_dir: str) -> None:
+        for name in self.artifact_names():
+            src = os.path.join(self.artifact_dir(), name)
+            dst = os.path.join(entry_dir, name)
+            if os.path.isdir(src):
+                shutil.copytree(src, dst, symlinks=True)
+            elif os.path.isfile(src):
+                shutil.copy2(src, dst)
+
+    def _remove_artifacts(self) -> None:
+        for name in self.artifact_names():
+            path = os.path.join(self.artifact_dir(), name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    def _restore_artifacts(self, entry_dir: str) -> None:
+        # Restored files get the current time so that make sees them as up to date
+        self._remove_artifacts()
+        for name in os.listdir(entry_dir):
+            src = os.path.join(entry_dir, name)
+            dst = os.path.join(self.artifact_dir(), name)
+            if os.path.isdir(src):
+                shutil.copytree(src, dst, symlinks=True, copy_function=shutil.copy)
+            else:
+                shutil.copy(src, dst)
+
+    def build(self, cache: Optional[NnxCache] = None) -> None:
+        """Build the app, or restore it from the artifact cache if it was built before"""
+        self._invalidate_build_stamp()
+        key = self.artifact_key() if cache is not None else None
+        if cache is not None and key is not None:
+            entry_dir = cache.lookup(key)
+            if entry_dir is not None:
+                try:
+                    self._restore_artifacts(entry_dir)
+                except OSError:
+                    # Evicted by a concurrent process, build from a clean state
+                    # instead of the half-restored outputs
+                    self._remove_artifacts()
+                else:
+                    self._write_build_stamp()
+                    return
+
+        self._build()
+
+        if cache is not None and key is not None:
+            artifacts = [
+                os.path.join(self.artifact_dir(), name)
+                for name in self.artifact_names()
+            ]
+            # An entry without artifacts would skip the next build for nothing
+            if any(os.path.exists(path) for path in artifacts):
+                cache.store(key, self._save_artifacts)
+        self._write_build_stamp()
 
     @abstractmethod
-    def run(self) -> str: ...
+    def env(self) -> Dict[str, str]: ...
+
+    @abstractmethod
+    def run_cmd(self) -> str: ...
+
+    @abstractmethod
+    def simulator_version(self) -> Optional[str]:
+        """Identifies the simulator's installation, None if not found"""
+        ...
+
+    def binary_key(self) -> Optional[str]:
+        """Identifies the built app, None if it can't be known
+
+        Defaults to the sources and the toolchain it got built from, since the
+        location of the linked binary depends on the SDK.
+        """
+        return self.artifact_key()
+
+    def run_key(self) -> Optional[str]:
+        """Key of the simulation's result in the result cache, None if it can't be known
+
+        Covers the app, the simulator, the command, and the generated files read at
+        runtime, e.g. the layer image. The paths of the workdir are left out of the
+        command so that the same test hits the entry from any workdir.
+        """
+        binary = self.binary_key()
+        simulator = self.simulator_version()
+        if binary is None or simulator is None:
+            return None
+
+        cmd = self.run_cmd()
+        for path, placeholder in [
+            (self.gen_dir, "<gen_dir>"),
+            (self.artifact_dir(), "<artifact_dir>"),
+        ]:
+            cmd = cmd.replace(os.path.abspath(path), placeholder)
+
+        parts: List[Union[str, bytes]] = [binary, simulator, cmd]
+        runtime_paths = [
+            name
+            for name in os.listdir(self.gen_dir)
+            if name not in NnxBuildFlow._GEN_SOURCE_DIRS
+        ]
+        for path in _list_files(self.gen_dir, runtime_paths):
+            parts.append(os.path.relpath(path, self.gen_dir))
+            parts.append(Path(path).read_bytes())
+        return NnxCache.key(*parts)
+
+    @staticmethod
+    def _lookup_result(cache: NnxCache, key: str) -> Optional[str]:
+        entry_dir = cache.lookup(key)
+        if entry_dir is None:
+            return None
+        try:
+            with open(os.path.join(entry_dir, NnxBuildFlow._RESULT_FILENAME)) as fp:
+                return fp.read()
+        except OSError:
+            # Evicted by a concurrent process, simulate again
+            return None
+
+    @staticmethod
+    def _store_result(cache: NnxCache, key: str, stdout: str) -> None:
+        def write(entry_dir: str) -> None:
+            with open(
+                os.path.join(entry_dir, NnxBuildFlow._RESULT_FILENAME), "w"
+            ) as fp:
+                fp.write(stdout)
+
+        cache.store(key, write)
+
+    def run(
+        self,
+        timeout: Optional[float] = None,
+        watchdog: Optional[NnxRunWatchdog] = None,
+        cache: Optional[NnxCache] = None,
+    ) -> str:
+        """Run the simulation and return its output
+
+        Raises subprocess.TimeoutExpired if it didn't finish in timeout seconds and
+        NnxRunStopped if the watchdog stopped it, both holding the partial output.
+        With a result cache, returns the output of an identical earlier simulation
+        instead. Only the simulations that ran to their end get cached.
+        """
+        key = self.run_key() if cache is not None else None
+        if cache is not None and key is not None:
+            stdout = NnxBuildFlow._lookup_result(cache, key)
+            if stdout is not None:
+                return stdout
+
+        stdout = NnxBuildFlow.cmd_run(self.run_cmd(), self.env(), timeout, watchdog)
+
+        if cache is not None and key is not None:
+            NnxBuildFlow._store_result(cache, key, stdout)
+        return stdout
 
     @abstractmethod
     def __str__(self) -> str: ...
 
     @staticmethod
-    def cmd_run(cmd: str, env=None) -> str:
-        proc = subprocess.run(
-            cmd.split(), check=True, capture_output=True, text=True, env=env
+    def cmd_run(
+        cmd: str,
+        env=None,
+        timeout: Optional[float] = None,
+        watchdog: Optional[NnxRunWatchdog] = None,
+    ) -> str:
+        """Run the command and return its output, read line by line as it's printed
+
+        The command runs in its own process group so that stopping it also stops
+        the processes it started, e.g. the simulator started by make.
+        """
+        proc = subprocess.Popen(
+            cmd.split(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            env=env,
+            start_new_session=True,
         )
-        return proc.stdout
+
+        def kill() -> None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        timed_out = threading.Event()
+
+        def expire() -> None:
+            timed_out.set()
+            kill()
+
+        timer = threading.Timer(timeout, expire) if timeout is not None else None
+
+        lines: List[str] = []
+        reason = None
+        finished = False
+        try:
+            if timer is not None:
+                timer.start()
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                lines.append(line)
+                if watchdog is not None:
+                    reason = watchdog.check(line)
+                    if reason is not None:
+                        break
+            else:
+                finished = True
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if not finished:
+                kill()
+            assert proc.stdout is not None
+            proc.stdout.close()
+            proc.wait()
+
+        output = "".join(lines)
+        if timed_out.is_set():
+            assert timeout is not None
+            raise subprocess.TimeoutExpired(cmd, timeout, output=output)
+        if reason is not None:
+            raise NnxRunStopped(cmd, reason, output)
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, output=output)
+        return output
 
 
 class MakeBuildFlow(NnxBuildFlow):
-    BUILD_CMD = "make -C app all platform=gvsoc"
-    RUN_CMD = "make -C app run platform=gvsoc"
+    APP_DIR = "app"
+    # Build directories of the gap_sdk and the pulp-sdk
+    BUILD_DIRS = ["BUILD", "build"]
+    # Toolchains and homes of the gap_sdk and the pulp-sdk
+    TOOLCHAIN_ENV_VARS = ["GAP_RISCV_GCC_TOOLCHAIN", "PULP_RISCV_GCC_TOOLCHAIN"]
+    SDK_ENV_VARS = ["GAP_SDK_HOME", "PULP_SDK_HOME"]
+    COMPILER = "riscv32-unknown-elf-gcc"
+    # Dependency files of the objects, written by -MMD
+    DEP_FILE_SUFFIX = ".d"
 
-    def __init__(self, nnxName: NnxName) -> None:
+    def __init__(self, nnxName: NnxName, workdir: Optional[str] = None) -> None:
         self.nnxName = nnxName
+        self.workdir = workdir
+        if workdir is not None:
+            os.makedirs(workdir, exist_ok=True)
+        self.gen_dir = os.path.join(
+            MakeBuildFlow.APP_DIR if workdir is None else workdir, "gen"
+        )
 
-    def env(self) -> os._Environ:
-        _env = os.environ
+    def env(self) -> Dict[str, str]:
+        _env = os.environ.copy()
         _env["ACCELERATOR"] = str(self.nnxName)
         return _env
 
-    def build(self) -> None:
-        Path("app/src/nnx_layer.c").touch()
-        _ = NnxBuildFlow.cmd_run(MakeBuildFlow.BUILD_CMD, self.env())
+    def make_cmd(self, target: str) -> str:
+        if self.workdir is None:
+            return f"make -C {MakeBuildFlow.APP_DIR} {target} platform=gvsoc"
+        # Run the app's Makefile from the workdir so the build lands in there
+        makefile = os.path.abspath(os.path.join(MakeBuildFlow.APP_DIR, "Makefile"))
+        return f"make -C {os.path.abspath(self.workdir)} -f {makefile} {target} platform=gvsoc GEN_DIR={os.path.abspath(self.gen_dir)}"
 
-    def run(self) -> str:
-        return NnxBuildFlow.cmd_run(MakeBuildFlow.RUN_CMD, self.env())
+    def build_stamp_path(self) -> str:
+        return os.path.join(
+            MakeBuildFlow.APP_DIR if self.workdir is None else self.workdir,
+            NnxBuildFlow._BUILD_STAMP_NAME,
+        )
+
+    def _build(self) -> None:
+        _ = NnxBuildFlow.cmd_run(self.make_cmd("all"), self.env())
+
+    def artifact_dir(self) -> str:
+        return MakeBuildFlow.APP_DIR if self.workdir is None else self.workdir
+
+    def artifact_names(self) -> List[str]:
+        return MakeBuildFlow.BUILD_DIRS
+
+    def _dep_file_paths(self) -> List[Tuple[str, str]]:
+        """Absolute paths of the workdir in the dependency files, and their
+        placeholders in the cached ones
+        """
+        paths = [(os.path.abspath(self.gen_dir), "<GEN_DIR>")]
+        for name in MakeBuildFlow.BUILD_DIRS:
+            path = os.path.abspath(os.path.join(self.artifact_dir(), name))
+            paths.append((path, f"<{name}>"))
+        return paths
+
+    @staticmethod
+    def _rewrite_dep_files(root: str, replacements: List[Tuple[str, str]]) -> None:
+        for path in _list_files(root, MakeBuildFlow.BUILD_DIRS):
+            if not path.endswith(MakeBuildFlow.DEP_FILE_SUFFIX):
+                continue
+            with open(path) as fp:
+                deps = fp.read()
+            for old, new in replacements:
+                deps = deps.replace(old, new)
+            with open(path, "w") as fp:
+                fp.write(deps)
+
+    def _save_artifacts(self, entry_dir: str) -> None:
+        # The dependency files name the objects and the generated headers by their
+        # absolute paths, so the workdir's paths are swapped for placeholders to
+        # restore them into any workdir
+        super()._save_artifacts(entry_dir)
+        MakeBuildFlow._rewrite_dep_files(entry_dir, self._dep_file_paths())
+
+    def _restore_artifacts(self, entry_dir: str) -> None:
+        super()._restore_artifacts(entry_dir)
+        MakeBuildFlow._rewrite_dep_files(
+            self.artifact_dir(),
+            [(placeholder, path) for path, placeholder in self._dep_file_paths()],
+        )
+
+    def toolchain_version(self) -> Optional[str]:
+        # The Makefile includes the SDK's rules from RULES_DIR, which compile
+        # the SDK's runtime from its rtos directory into the app
+        rules_dir = os.environ.get("RULES_DIR")
+        toolchain = _first_env(MakeBuildFlow.TOOLCHAIN_ENV_VARS)
+        sdk = _first_env(MakeBuildFlow.SDK_ENV_VARS)
+        if rules_dir is None or toolchain is None or sdk is None:
+            return None
+        version = _command_output(
+            (os.path.join(toolchain, "bin", MakeBuildFlow.COMPILER), "--version")
+        )
+        if version is None:
+            return None
+        return f"{version}\n{_tree_signature(rules_dir, os.path.join(sdk, 'rtos'))}"
+
+    def run_cmd(self) -> str:
+        return self.make_cmd("run")
+
+    def simulator_version(self) -> Optional[str]:
+        # The SDK's rules run the gvsoc found on the PATH
+        gvsoc = shutil.which("gvsoc")
+        return None if gvsoc is None else _simulator_signature(gvsoc)
 
     def __str__(self) -> str:
         return "make"
@@ -57,28 +558,72 @@ class CmakeBuildFlow(NnxBuildFlow):
     BINARY_NAME = "test-pulp-nnx"
     TOOLCHAIN_FILE = "cmake/toolchain_gnu.cmake"
     GVSOC_TARGET = "siracusa"
+    COMPILER = "riscv32-unknown-elf-gcc"
 
-    def __init__(self, nnxName: NnxName) -> None:
+    def __init__(self, nnxName: NnxName, workdir: Optional[str] = None) -> None:
         self.nnxName = nnxName
-        self.build_dir = os.path.abspath(f"app/build_{nnxName}")
+        if workdir is None:
+            self.build_dir = os.path.abspath(f"app/build_{nnxName}")
+            self.gen_dir = "app/gen"
+        else:
+            self.build_dir = os.path.abspath(os.path.join(workdir, f"build_{nnxName}"))
+            self.gen_dir = os.path.join(workdir, "gen")
         self.gvsoc_workdir = os.path.join(self.build_dir, "gvsoc_workdir")
         assert "GVSOC" in os.environ, "The GVSOC environment variable is not set."
 
+    def env(self) -> Dict[str, str]:
+        return os.environ.copy()
+
+    def is_prepared(self) -> bool:
+        return os.path.isfile(os.path.join(self.build_dir, "CMakeCache.txt"))
+
     def prepare(self) -> None:
         os.makedirs(self.gvsoc_workdir, exist_ok=True)
         subprocess.run(
-            f"cmake -Sapp -B{self.build_dir} -GNinja -DCMAKE_TOOLCHAIN_FILE={CmakeBuildFlow.TOOLCHAIN_FILE} -DACCELERATOR={self.nnxName}".split(),
+            f"cmake -Sapp -B{self.build_dir} -GNinja -DCMAKE_TOOLCHAIN_FILE={CmakeBuildFlow.TOOLCHAIN_FILE} -DACCELERATOR={self.nnxName} -DGEN_DIR={os.path.abspath(self.gen_dir)}".split(),
             check=True,
+            env=self.env(),
         )
 
-    def build(self) -> None:
-        _ = NnxBuildFlow.cmd_run(f"cmake --build {self.build_dir}")
+    def build_stamp_path(self) -> str:
+        return os.path.join(self.build_dir, NnxBuildFlow._BUILD_STAMP_NAME)
+
+    def _build(self) -> None:
+        _ = NnxBuildFlow.cmd_run(f"cmake --build {self.build_dir}", self.env())
+
+    def artifact_dir(self) -> str:
+        return self.build_dir
 
-    def run(self) -> str:
+    def artifact_names(self) -> List[str]:
+        return [CmakeBuildFlow.BINARY_NAME]
+
+    def toolchain_version(self) -> Optional[str]:
+        # Both are required by the cmake files of the app
+        sdk = os.environ.get("PULP_SDK_HOME")
+        toolchain = os.environ.get("TOOLCHAIN_GNU_INSTALL_DIR")
+        if sdk is None or toolchain is None:
+            return None
+        version = _command_output(
+            (os.path.join(toolchain, "bin", CmakeBuildFlow.COMPILER), "--version")
+        )
+        if version is None:
+            return None
+        # The app compiles the SDK's runtime from its rtos directory
+        return f"{version}\n{_tree_signature(os.path.join(sdk, 'rtos'))}"
+
+    def run_cmd(self) -> str:
         bin = os.path.join(self.build_dir, CmakeBuildFlow.BINARY_NAME)
         gvsoc = os.environ["GVSOC"]
-        cmd = f"{gvsoc} --binary {bin} --work-dir {self.gvsoc_workdir} --target {CmakeBuildFlow.GVSOC_TARGET} image flash run"
-        return NnxBuildFlow.cmd_run(cmd)
+        return f"{gvsoc} --binary {bin} --work-dir {self.gvsoc_workdir} --target {CmakeBuildFlow.GVSOC_TARGET} image flash run"
+
+    def simulator_version(self) -> Optional[str]:
+        return _simulator_signature(os.environ["GVSOC"])
+
+    def binary_key(self) -> Optional[str]:
+        bin = os.path.join(self.build_dir, CmakeBuildFlow.BINARY_NAME)
+        if not os.path.isfile(bin):
+            return None
+        return NnxCache.key(Path(bin).read_bytes())
 
     def __str__(self) -> str:
         return "cmake"
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Callable, List, Optional, Tuple, Union
+
+
+class NnxCache:
+    """On-disk key-value store with size-bounded LRU eviction
+
+    Every entry is a directory named after its key. Entries are published
+    atomically by renaming a fully written temporary directory, and their
+    modification time is refreshed on every hit so that the least recently
+    used entries get evicted first once the cache grows over max_size bytes.
+    The size of the cache is only scanned once, and then tracked by adding the
+    size of every stored entry, so that storing doesn't walk the whole cache.
+    Going over max_size evicts the cache down to 90% of it.
+    """
+
+    DEFAULT_ROOT = ".cache"
+    DEFAULT_MAX_SIZE = 1 << 30
+    # Fraction of max_size the cache gets evicted down to once it grows over it,
+    # so that the next scans are only needed after a tenth of max_size more entries
+    _EVICT_TO = 0.9
+    _TMP_PREFIX = ".tmp-"
+
+    def __init__(
+        self, cache_dir: Union[str, os.PathLike], max_size: int = DEFAULT_MAX_SIZE
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        # Estimated total size, unknown until the first store
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def key(*parts: Union[str, bytes]) -> str:
+        h = hashlib.sha256()
+        for part in parts:
+            data = part.encode() if isinstance(part, str) else part
+            # Length prefix so that ("ab", "c") and ("a", "bc") differ
+            h.update(len(data).to_bytes(8, "little"))
+            h.update(data)
+        return h.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def lookup(self, key: str) -> Optional[str]:
+        path = self._entry_path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by a concurrent process
+            return None
+        return path
+
+    def store(self, key: str, write: Callable[[str], None]) -> str:
+        """Store an entry by calling write with a directory to fill in"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=NnxCache._TMP_PREFIX, dir=self.cache_dir)
+        path = self._entry_path(key)
+        try:
+            write(tmp_path)
+            os.rename(tmp_path, path)
+        except OSError:
+            # Someone else published the same entry in the meantime
+            if not os.path.isdir(path):
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        if self._size is None:
+            self._size = self.size()
+        else:
+            try:
+                self._size += NnxCache._dir_size(path)
+            except FileNotFoundError:
+                # Evicted by a concurrent process
+                pass
+        # Other processes' entries are only accounted for by the full scan of evict
+        if self._size > self.max_size:
+            self.evict(int(self.max_size * NnxCache._EVICT_TO))
+        return path
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        return sum(
+            os.path.getsize(os.path.join(dirpath, filename))
+            for dirpath, _, filenames in os.walk(path)
+            for filename in filenames
+        )
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """Returns (mtime, size, path) of all the entries"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir() or entry.name.startswith(NnxCache._TMP_PREFIX):
+                continue
+            try:
+                size = NnxCache._dir_size(entry.path)
+                entries.append((entry.stat().st_mtime, size, entry.path))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def __len__(self) -> int:
+        return len(self._entries())
+
+    def evict(self, max_size: Optional[int] = None) -> None:
+        if max_size is None:
+            max_size = self.max_size
+
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        self._size = total
+
+    def clear(self) -> None:
+        self.evict(max_size=0)
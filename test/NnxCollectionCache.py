@@ -0,0 +1,167 @@
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple, Type, Union
+
+import pydantic
+
+from NnxCache import NnxCache
+from NnxTestClasses import NnxTest, NnxTestConf
+
+
+class NnxCollectionCache:
+    """Record of the tests found under a test root, kept across pytest invocations
+
+    For every directory under the root it records its mtime and subdirectories, and
+    for every test its directory and conf.json mtimes, its validity, and its validation
+    error. Only the directories whose mtime changed get listed again, and only the
+    tests whose directory or conf.json changed get loaded again. Creating or removing
+    tensor files changes the directory mtime, so the recorded validity stays correct.
+    """
+
+    VERSION = 1
+    DEFAULT_DIR = os.path.join(NnxCache.DEFAULT_ROOT, "collection")
+
+    def __init__(
+        self,
+        cache_dir: Union[str, os.PathLike],
+        root: str,
+        nnxTestConfCls: Type[NnxTestConf],
+    ) -> None:
+        self.root = root
+        self.nnxTestConfCls = nnxTestConfCls
+        # The validity of a test depends on the accelerator's configuration class
+        key = NnxCache.key(
+            os.path.abspath(root),
+            nnxTestConfCls.__module__,
+            nnxTestConfCls.__qualname__,
+            str(NnxCollectionCache.VERSION),
+        )
+        self.filepath = os.path.join(cache_dir, f"{key}.json")
+        self._dirs: Dict[str, Dict] = {}
+        self._tests: Dict[str, Dict] = {}
+        self._dirty = False
+        self._read()
+
+    def _read(self) -> None:
+        try:
+            with open(self.filepath, "r") as fp:
+                data = json.load(fp)
+            self._dirs = data["dirs"]
+            self._tests = data["tests"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing or corrupted cache, start from scratch
+            self._dirs = {}
+            self._tests = {}
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+
+        # Replaced atomically since pytest-xdist workers collect concurrently
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            suffix=".tmp", dir=os.path.dirname(self.filepath)
+        )
+        try:
+            with os.fdopen(fd, "w") as fp:
+                json.dump({"dirs": self._dirs, "tests": self._tests}, fp)
+            os.replace(tmp_path, self.filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._dirty = False
+
+    def _path(self, relpath: str) -> str:
+        return os.path.join(self.root, relpath) if relpath else self.root
+
+    def find_test_dirs(self) -> List[str]:
+        """Test directories under the root in the same order as os.walk"""
+        test_dirs = []
+        visited = set()
+        stack = [""]
+        while len(stack) > 0:
+            relpath = stack.pop()
+            visited.add(relpath)
+            path = self._path(relpath)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+
+            record = self._dirs.get(relpath)
+            if record is None or record["mtime"] != mtime:
+                subdirs = []
+                is_test_dir = False
+                try:
+                    with os.scandir(path) as it:
+                        for entry in it:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(os.path.join(relpath, entry.name))
+                            elif entry.name == NnxTest._CONF_NAME:
+                                is_test_dir = True
+                except OSError:
+                    continue
+                record = {"mtime": mtime, "subdirs": subdirs, "test": is_test_dir}
+                self._dirs[relpath] = record
+                self._dirty = True
+
+            if record["test"]:
+                test_dirs.append(path)
+            stack.extend(reversed(record["subdirs"]))
+
+        # Forget the removed directories
+        if set(self._dirs) - visited or set(self._tests) - set(test_dirs):
+            self._dirs = {
+                relpath: record
+                for relpath, record in self._dirs.items()
+                if relpath in visited
+            }
+            self._tests = {
+                test_dir: record
+                for test_dir, record in self._tests.items()
+                if test_dir in test_dirs
+            }
+            self._dirty = True
+
+        return test_dirs
+
+    @staticmethod
+    def _mtimes(test_dir: str) -> Tuple[int, int]:
+        return (
+            os.stat(test_dir).st_mtime_ns,
+            os.stat(os.path.join(test_dir, NnxTest._CONF_NAME)).st_mtime_ns,
+        )
+
+    @staticmethod
+    def check_uncached(
+        nnxTestConfCls: Type[NnxTestConf], test_dir: str
+    ) -> Tuple[bool, Optional[str]]:
+        """Returns whether the test's data is valid and its validation error if any
+
+        Raises the pydantic.ValidationError of configurations with missing fields.
+        """
+        try:
+            return NnxTest.load(nnxTestConfCls, test_dir).is_valid(), None
+        except pydantic.ValidationError as e:
+            for error in e.errors():
+                if error["type"] == "missing":
+                    raise e
+            return False, str(e.errors())
+
+    def check(self, test_dir: str) -> Tuple[bool, Optional[str]]:
+        """Same as check_uncached, but only loads the tests that changed"""
+        mtimes = list(NnxCollectionCache._mtimes(test_dir))
+        record = self._tests.get(test_dir)
+        if record is not None and record["mtimes"] == mtimes:
+            return record["valid"], record["error"]
+
+        valid, error = NnxCollectionCache.check_uncached(self.nnxTestConfCls, test_dir)
+
+        self._tests[test_dir] = {
+            "mtimes": mtimes,
+            "valid": valid,
+            "error": error,
+        }
+        self._dirty = True
+        return valid, error
@@ -1,13 +1,11 @@
+from __future__ import annotations
+
+import importlib
 from enum import Enum
-from typing import Dict, NamedTuple, Type
+from typing import TYPE_CHECKING, Dict, Iterator, Mapping, NamedTuple, Tuple, Type
 
-from Ne16TestConf import Ne16TestConf
-from Ne16Weight import Ne16Weight
-from NeurekaTestConf import NeurekaTestConf
-from NeurekaV2TestConf import NeurekaV2TestConf
-from NeurekaV2Weight import NeurekaV2Weight
-from NeurekaWeight import NeurekaWeight
-from NnxTestClasses import NnxTestConf, NnxWeight
+if TYPE_CHECKING:
+    from NnxTestClasses import NnxTestConf, NnxWeight
 
 
 class NnxName(Enum):
@@ -24,8 +22,36 @@ class NnxAcceleratorClasses(NamedTuple):
     weightCls: Type[NnxWeight]
 
 
-NnxMapping: Dict[NnxName, NnxAcceleratorClasses] = {
-    NnxName.ne16: NnxAcceleratorClasses(Ne16TestConf, Ne16Weight),
-    NnxName.neureka: NnxAcceleratorClasses(NeurekaTestConf, NeurekaWeight),
-    NnxName.neureka_v2: NnxAcceleratorClasses(NeurekaV2TestConf, NeurekaV2Weight),
-}
+class _NnxLazyMapping(Mapping[NnxName, NnxAcceleratorClasses]):
+    """Imports the classes of an accelerator on first access
+
+    The classes are named after their modules.
+    """
+
+    _MODULES: Dict[NnxName, Tuple[str, str]] = {
+        NnxName.ne16: ("Ne16TestConf", "Ne16Weight"),
+        NnxName.neureka: ("NeurekaTestConf", "NeurekaWeight"),
+        NnxName.neureka_v2: ("NeurekaV2TestConf", "NeurekaV2Weight"),
+    }
+
+    def __init__(self) -> None:
+        self._classes: Dict[NnxName, NnxAcceleratorClasses] = {}
+
+    def __getitem__(self, nnxName: NnxName) -> NnxAcceleratorClasses:
+        if nnxName not in self._classes:
+            self._classes[nnxName] = NnxAcceleratorClasses(
+                *(
+                    getattr(importlib.import_module(name), name)
+                    for name in _NnxLazyMapping._MODULES[nnxName]
+                )
+            )
+        return self._classes[nnxName]
+
+    def __iter__(self) -> Iterator[NnxName]:
+        return iter(_NnxLazyMapping._MODULES)
+
+    def __len__(self) -> int:
+        return len(_NnxLazyMapping._MODULES)
+
+
+NnxMapping: Mapping[NnxName, NnxAcceleratorClasses] = _NnxLazyMapping()
@@ -18,18 +18,36 @@
 
 from __future__ import annotations
 
+import json
 import os
+import struct
+import tempfile
+import zlib
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import List, Literal, Optional, Set, Tuple, Type, Union, get_args
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+    get_args,
+    overload,
+)
 
 import numpy as np
 import numpy.typing as npt
-import torch
 from pydantic import BaseModel, PositiveInt, model_validator
 
 from HeaderWriter import HeaderWriter
-from NeuralEngineFunctionalModel import NeuralEngineFunctionalModel
+from NeuralEngineFunctionalModelNumpy import NeuralEngineFunctionalModelNumpy
+from NnxBackend import NnxBackend, NnxRandom, NnxTensor
+from NnxCache import NnxCache
 from TestClasses import IntegerType, KernelShape, Padding, Stride, implies
 
 
@@ -42,6 +60,22 @@ class NnxWmem(Enum):
         return self.value
 
 
+class NnxOutputCheck(Enum):
+    """How the app verifies the output of a layer
+
+    With golden, the output gets compared element by element with a golden copy
+    kept in L2. With crc32, only a CRC32 digest of every output row is kept in L2,
+    which leaves more of it for larger layers, at the cost of reporting only the
+    wrong rows.
+    """
+
+    golden = "golden"
+    crc32 = "crc32"
+
+    def __str__(self) -> str:
+        return self.value
+
+
 class NnxTestConf(BaseModel):
     in_height: PositiveInt
     in_width: PositiveInt
@@ -109,26 +143,75 @@ class NnxTestConf(BaseModel):
         return self
 
 
+class NnxTensorFormat(Enum):
+    """On-disk format of the test tensors"""
+
+    pt = "pt"
+    npy = "npy"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class _LazyTensor:
+    """Tensor attribute of NnxTest that gets loaded from its file on first access"""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    @overload
+    def __get__(self, obj: None, objtype: Optional[type] = None) -> _LazyTensor: ...
+
+    @overload
+    def __get__(
+        self, obj: NnxTest, objtype: Optional[type] = None
+    ) -> Optional[NnxTensor]: ...
+
+    def __get__(
+        self, obj: Optional[NnxTest], objtype: Optional[type] = None
+    ) -> Union[_LazyTensor, Optional[NnxTensor]]:
+        if obj is None:
+            return self
+        return obj._get_tensor(self.name)
+
+    def __set__(self, obj: NnxTest, value: Optional[NnxTensor]) -> None:
+        obj._set_tensor(self.name, value)
+
+
 class NnxTest:
     _CONF_NAME = "conf.json"
-    _INPUT_NAME = "input.pt"
-    _OUTPUT_NAME = "output.pt"
-    _WEIGHT_NAME = "weight.pt"
-    _SCALE_NAME = "scale.pt"
-    _BIAS_NAME = "bias.pt"
-    _GLOBAL_SHIFT_NAME = "global_shift.pt"
+    _STAMP_NAME = "stamp.json"
+    _TENSOR_NAMES = ["input", "output", "weight", "scale", "bias", "global_shift"]
+    DEFAULT_TENSOR_FORMAT = NnxTensorFormat.pt
+    DEFAULT_BACKEND = NnxBackend.torch
+
+    input = _LazyTensor()
+    output = _LazyTensor()
+    weight = _LazyTensor()
+    scale = _LazyTensor()
+    bias = _LazyTensor()
+    global_shift = _LazyTensor()
 
     def __init__(
         self,
         conf: NnxTestConf,
-        input: Optional[torch.Tensor],
-        output: Optional[torch.Tensor],
-        weight: Optional[torch.Tensor],
-        scale: Optional[torch.Tensor] = None,
-        bias: Optional[torch.Tensor] = None,
-        global_shift: Optional[torch.Tensor] = torch.Tensor([0]),
+        input: Optional[NnxTensor],
+        output: Optional[NnxTensor],
+        weight: Optional[NnxTensor],
+        scale: Optional[NnxTensor] = None,
+        bias: Optional[NnxTensor] = None,
+        global_shift: Optional[NnxTensor] = None,
+        backend: NnxBackend = DEFAULT_BACKEND,
     ) -> None:
         self.conf = conf
+        # Backend of the tensors, the lazily loaded ones included
+        self.backend = backend
+        self._tensors: Dict[str, Optional[NnxTensor]] = {}
+        # Files of the tensors that haven't been loaded yet
+        self._tensor_files: Dict[str, str] = {}
+        # Provenance of the generated data, see NnxTestGenerator.stamp
+        self._stamp: Optional[Dict] = None
+        self._stamp_file: Optional[str] = None
         self.input = input
         self.output = output
         self.weight = weight
@@ -136,15 +219,46 @@ class NnxTest:
         self.bias = bias
         self.global_shift = global_shift
 
+    @property
+    def stamp(self) -> Optional[Dict]:
+        if self._stamp_file is not None:
+            try:
+                with open(self._stamp_file, "r") as fp:
+                    self._stamp = json.load(fp)
+            except (OSError, ValueError):
+                self._stamp = None
+            self._stamp_file = None
+        return self._stamp
+
+    @stamp.setter
+    def stamp(self, stamp: Optional[Dict]) -> None:
+        self._stamp_file = None
+        self._stamp = stamp
+
+    def _get_tensor(self, name: str) -> Optional[NnxTensor]:
+        if name in self._tensor_files:
+            self._tensors[name] = NnxTest._load_tensor(
+                self._tensor_files.pop(name), self.backend
+            )
+        return self._tensors[name]
+
+    def _set_tensor(self, name: str, tensor: Optional[NnxTensor]) -> None:
+        self._tensor_files.pop(name, None)
+        self._tensors[name] = tensor
+
+    def _has_tensor(self, name: str) -> bool:
+        """Whether the tensor exists without loading it"""
+        return name in self._tensor_files or self._tensors[name] is not None
+
     def is_valid(self) -> bool:
         return all(
             [
-                self.input is not None,
-                self.output is not None,
-                self.weight is not None,
-                implies(self.conf.has_norm_quant, self.scale is not None),
-                implies(self.conf.has_bias, self.bias is not None),
-                implies(self.conf.has_norm_quant, self.global_shift is not None),
+                self._has_tensor("input"),
+                self._has_tensor("output"),
+                self._has_tensor("weight"),
+                implies(self.conf.has_norm_quant, self._has_tensor("scale")),
+                implies(self.conf.has_bias, self._has_tensor("bias")),
+                implies(self.conf.has_norm_quant, self._has_tensor("global_shift")),
             ]
         )
 
@@ -154,24 +268,145 @@ class NnxTest:
         with open(os.path.join(path, NnxTest._CONF_NAME), "w") as fp:
             fp.write(self.conf.model_dump_json(indent=4))
 
-    def save_data(self, path: Union[str, os.PathLike]) -> None:
+    @staticmethod
+    def _tensor_path(
+        path: Union[str, os.PathLike], name: str, tensor_format: NnxTensorFormat
+    ) -> str:
+        return os.path.join(path, f"{name}.{tensor_format}")
+
+    @staticmethod
+    def _find_tensor_file(path: Union[str, os.PathLike], name: str) -> Optional[str]:
+        """Path of the tensor's file, preferring the memory mappable format
+
+        Empty files are considered missing.
+        """
+        for tensor_format in [NnxTensorFormat.npy, NnxTensorFormat.pt]:
+            filepath = NnxTest._tensor_path(path, name, tensor_format)
+            try:
+                if os.stat(filepath).st_size > 0:
+                    return filepath
+            except FileNotFoundError:
+                continue
+        return None
+
+    @staticmethod
+    def tensor_format(
+        path: Union[str, os.PathLike], default: NnxTensorFormat = DEFAULT_TENSOR_FORMAT
+    ) -> NnxTensorFormat:
+        """Format of the tensors in the test directory, or the default if it has none"""
+        for name in NnxTest._TENSOR_NAMES:
+            filepath = NnxTest._find_tensor_file(path, name)
+            if filepath is not None:
+                return NnxTensorFormat(os.path.splitext(filepath)[1][1:])
+        return default
+
+    @staticmethod
+    def default_tensor_format(backend: NnxBackend) -> NnxTensorFormat:
+        # The pt format needs torch
+        if backend == NnxBackend.numpy:
+            return NnxTensorFormat.npy
+        return NnxTest.DEFAULT_TENSOR_FORMAT
+
+    @staticmethod
+    def _load_tensor(
+        filepath: str, backend: NnxBackend = DEFAULT_BACKEND, mmap: bool = True
+    ) -> NnxTensor:
+        if filepath.endswith(f".{NnxTensorFormat.npy}"):
+            # Copy-on-write mapping so the tensor stays writable without a copy
+            return backend.from_numpy(
+                np.load(filepath, mmap_mode="c" if mmap else None)
+            )
+        else:
+            import torch
+
+            return backend.from_numpy(torch.load(filepath).numpy())
+
+    @staticmethod
+    def _save_file(filepath: str, write: Callable[[str], None]) -> None:
+        # Saved through a temporary file so concurrent writers of the same test,
+        # e.g. pytest-xdist workers regenerating it, never leave a torn file behind
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=os.path.basename(filepath) + ".",
+            suffix=".tmp",
+            dir=os.path.dirname(filepath),
+        )
+        os.close(fd)
+        try:
+            os.chmod(tmp_path, 0o644)
+            write(tmp_path)
+            os.replace(tmp_path, filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _save_tensor(tensor: NnxTensor, filepath: str) -> None:
+        def write(tmp_path: str) -> None:
+            if filepath.endswith(f".{NnxTensorFormat.npy}"):
+                with open(tmp_path, "wb") as fp:
+                    np.save(fp, np.asarray(tensor))
+            else:
+                import torch
+
+                torch.save(torch.as_tensor(tensor), tmp_path)
+
+        NnxTest._save_file(filepath, write)
+
+    @staticmethod
+    def _save_stamp(stamp: Dict, filepath: str) -> None:
+        def write(tmp_path: str) -> None:
+            with open(tmp_path, "w") as fp:
+                json.dump(stamp, fp, indent=4)
+
+        NnxTest._save_file(filepath, write)
+
+    def save_data(
+        self,
+        path: Union[str, os.PathLike],
+        tensor_format: Optional[NnxTensorFormat] = None,
+    ) -> None:
+        """Save the test tensors into path
+
+        Without a tensor_format, the tensors are saved in the format already used in path,
+        or the default format of the backend if there are none.
+        """
+        if tensor_format is None:
+            tensor_format = NnxTest.tensor_format(
+                path, NnxTest.default_tensor_format(self.backend)
+            )
+
         os.makedirs(path, exist_ok=True)
 
-        torch.save(self.input, os.path.join(path, NnxTest._INPUT_NAME))
-        torch.save(self.output, os.path.join(path, NnxTest._OUTPUT_NAME))
-        torch.save(self.weight, os.path.join(path, NnxTest._WEIGHT_NAME))
-        if self.scale is not None:
-            torch.save(self.scale, os.path.join(path, NnxTest._SCALE_NAME))
-        if self.bias is not None:
-            torch.save(self.bias, os.path.join(path, NnxTest._BIAS_NAME))
-        if self.global_shift is not None:
-            torch.save(
-                self.global_shift, os.path.join(path, NnxTest._GLOBAL_SHIFT_NAME)
+        # The old stamp is removed first so an interrupted save leaves the test stale
+        stamp = self.stamp
+        stamp_path = os.path.join(path, NnxTest._STAMP_NAME)
+        if os.path.exists(stamp_path):
+            os.remove(stamp_path)
+
+        for name in NnxTest._TENSOR_NAMES:
+            tensor = getattr(self, name)
+            if tensor is None:
+                continue
+            NnxTest._save_tensor(
+                tensor, NnxTest._tensor_path(path, name, tensor_format)
             )
+            # Remove the tensor's file in the other formats so it doesn't shadow this one
+            for other_format in NnxTensorFormat:
+                if other_format != tensor_format:
+                    filepath = NnxTest._tensor_path(path, name, other_format)
+                    if os.path.exists(filepath):
+                        os.remove(filepath)
 
-    def save(self, path: Union[str, os.PathLike]) -> None:
+        if stamp is not None:
+            NnxTest._save_stamp(stamp, stamp_path)
+
+    def save(
+        self,
+        path: Union[str, os.PathLike],
+        tensor_format: Optional[NnxTensorFormat] = None,
+    ) -> None:
         self.save_conf(path)
-        self.save_data(path)
+        self.save_data(path, tensor_format)
 
     @staticmethod
     def is_test_dir(path: Union[str, os.PathLike]) -> bool:
@@ -180,7 +415,12 @@ class NnxTest:
         return required_fileset.issubset(fileset)
 
     @classmethod
-    def load(cls, confCls: Type[NnxTestConf], path: Union[str, os.PathLike]) -> NnxTest:
+    def load(
+        cls,
+        confCls: Type[NnxTestConf],
+        path: Union[str, os.PathLike],
+        backend: NnxBackend = DEFAULT_BACKEND,
+    ) -> NnxTest:
         assert NnxTest.is_test_dir(
             path
         ), f"ERROR: Test {path} does not contain the necessary files."
@@ -188,89 +428,443 @@ class NnxTest:
         with open(os.path.join(path, NnxTest._CONF_NAME), "r") as fp:
             conf = confCls.model_validate_json(fp.read())
 
-        def load_if_exist(filename: str) -> Optional[torch.Tensor]:
-            filepath = os.path.join(path, filename)
-            return torch.load(filepath) if os.path.isfile(filepath) else None
+        return cls.load_data(conf, path, backend=backend)
 
-        input = load_if_exist(NnxTest._INPUT_NAME)
-        output = load_if_exist(NnxTest._OUTPUT_NAME)
-        weight = load_if_exist(NnxTest._WEIGHT_NAME)
-        scale = load_if_exist(NnxTest._SCALE_NAME)
-        bias = load_if_exist(NnxTest._BIAS_NAME)
-        global_shift = load_if_exist(NnxTest._GLOBAL_SHIFT_NAME)
+    @classmethod
+    def load_data(
+        cls,
+        conf: NnxTestConf,
+        path: Union[str, os.PathLike],
+        lazy: bool = True,
+        backend: NnxBackend = DEFAULT_BACKEND,
+    ) -> NnxTest:
+        """Load the test tensors from path
 
-        return cls(conf, input, output, weight, scale, bias, global_shift)
+        Lazily loaded tensors are only read from their files on first access, and the
+        ones in the npy format get memory mapped instead of read. Empty files are
+        considered missing.
+        """
+        test = cls(conf, None, None, None, None, None, None, backend)
+        for name in NnxTest._TENSOR_NAMES:
+            filepath = NnxTest._find_tensor_file(path, name)
+            if filepath is None:
+                continue
+            if lazy:
+                test._tensor_files[name] = filepath
+            else:
+                setattr(test, name, NnxTest._load_tensor(filepath, backend, mmap=False))
+
+        stamp_path = os.path.join(path, NnxTest._STAMP_NAME)
+        if os.path.isfile(stamp_path):
+            test._stamp_file = stamp_path
+            if not lazy:
+                _ = test.stamp
+        return test
 
 
 class NnxTestGenerator:
-    _DEFAULT_SEED = 0
+    # Bump on any change that alters the generated data
+    VERSION = 2
+    GOLDEN_CACHE_DIR = os.path.join(NnxCache.DEFAULT_ROOT, "golden")
 
     @staticmethod
     def _calculate_global_shift(
-        tensor: torch.Tensor, out_type: IntegerType
-    ) -> torch.Tensor:
+        tensor: npt.NDArray, out_type: IntegerType
+    ) -> npt.NDArray[np.uint8]:
         """Calculate global shift so that the output values are in the range of out_type"""
-        s = tensor.type(torch.float64).std()
-        target_s = 2 ** (out_type._bits - 1)
-        shift = torch.ceil(torch.log2(s / target_s))
-        return torch.clamp(shift, 0, 255).type(torch.uint8)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s = tensor.astype(np.float64).std(ddof=1)
+            target_s = 2 ** (out_type._bits - 1)
+            shift = np.ceil(np.log2(s / target_s))
+            return np.asarray(np.clip(shift, 0, 255)).astype(np.uint8)
+
+    # Fraction of non-zero values in sparse data
+    _SPARSE_DENSITY = 0.1
 
     @staticmethod
-    def _generate_random(_type: IntegerType, shape: Tuple):
-        return torch.randint(_type.min, _type.max, size=shape)
+    def _from_nhwc(tensor: npt.NDArray, shape: Tuple) -> npt.NDArray:
+        """Lay out a flat tensor, ordered as NHWC, into an NCHW tensor of given shape"""
+        return tensor.reshape((shape[0], shape[2], shape[3], shape[1])).transpose(
+            (0, 3, 1, 2)
+        )
 
     @staticmethod
-    def _generate_ones(_type: IntegerType, shape: Tuple):
-        _ = _type
-        return torch.ones(shape, dtype=torch.int64)
+    def _tile(period: npt.NDArray, count: int) -> npt.NDArray:
+        """Repeat the period up to count elements"""
+        if len(period) >= count:
+            return period[:count]
+        # Tiny periods get repeated into a bigger block first since copying them is slow
+        block = np.tile(period, max(1, 4096 // len(period)))
+        return np.tile(block, -(-count // len(block)))[:count]
 
     @staticmethod
-    def _generate_incremented(_type: IntegerType, shape: Tuple):
-        def incr_generator():
-            x = 0
-            while True:
-                yield x
-                x += 1
-                if x > _type.max:
-                    x = 0
+    def _generate_random(_type: IntegerType, shape: Tuple, generator: NnxRandom):
+        return generator.randint(_type.min, _type.max, size=shape)
 
-        return (
-            torch.from_numpy(
-                np.fromiter(incr_generator(), count=np.prod(shape), dtype=np.int64)
-            )
-            .reshape((shape[0], shape[2], shape[3], shape[1]))
-            .permute((0, 3, 1, 2))
-            .type(torch.int64)
-        )
+    @staticmethod
+    def _generate_ones(_type: IntegerType, shape: Tuple, generator: NnxRandom):
+        _ = _type, generator
+        return np.ones(shape, dtype=np.int64)
+
+    @staticmethod
+    def _generate_incremented(_type: IntegerType, shape: Tuple, generator: NnxRandom):
+        """Values counting up from 0 to the type's max and wrapping around, in NHWC order"""
+        _ = generator
+        count = int(np.prod(shape))
+        period = np.arange(min(_type.max + 1, count), dtype=np.int64)
+        return NnxTestGenerator._from_nhwc(NnxTestGenerator._tile(period, count), shape)
+
+    @staticmethod
+    def _generate_sparse(_type: IntegerType, shape: Tuple, generator: NnxRandom):
+        """Random values at a random _SPARSE_DENSITY fraction of positions, zeros elsewhere"""
+        count = int(np.prod(shape))
+        nonzeros = int(count * NnxTestGenerator._SPARSE_DENSITY)
+        tensor = np.zeros(count, dtype=np.int64)
+        indices = generator.randint(0, count, size=(nonzeros,))
+        tensor[indices] = generator.randint(_type.min, _type.max + 1, size=(nonzeros,))
+        return tensor.reshape(shape)
+
+    @staticmethod
+    def _generate_extremes(_type: IntegerType, shape: Tuple, generator: NnxRandom):
+        """Random mix of the type's min and max values to saturate the arithmetic"""
+        count = int(np.prod(shape))
+        # Draws 8 choices at a time as the bits of random bytes
+        random_bytes = generator.random_bytes((count + 7) // 8)
+        is_max = np.unpackbits(random_bytes, count=count)
+        extremes = np.array([_type.min, _type.max], dtype=np.int64)
+        return extremes[is_max].reshape(shape)
+
+    @staticmethod
+    def _generate_channel_constant(
+        _type: IntegerType, shape: Tuple, generator: NnxRandom
+    ):
+        """Random value per channel, the same across the other dimensions"""
+        channel_shape = (shape[0], shape[1]) + (1,) * (len(shape) - 2)
+        values = generator.randint(_type.min, _type.max + 1, size=channel_shape)
+        return np.broadcast_to(values, shape).copy()
+
+    @staticmethod
+    def _generate_bit_toggle(_type: IntegerType, shape: Tuple, generator: NnxRandom):
+        """Worst case switching activity where consecutive values in NHWC order toggle every bit"""
+        _ = generator
+        mask = (1 << _type._bits) - 1
+        # 0b0101... and its complement 0b1010...
+        pattern = int("01" * (_type._bits // 2 + 1), 2) & mask
+        values = [pattern, pattern ^ mask]
+        if _type._signed:
+            values = [v - (1 << _type._bits) if v > _type.max else v for v in values]
+        count = int(np.prod(shape))
+        period = np.array(values, dtype=np.int64)
+        return NnxTestGenerator._from_nhwc(NnxTestGenerator._tile(period, count), shape)
 
     class DataGenerationMethod(Enum):
         RANDOM = 0
         ONES = 1
         INCREMENTED = 2
+        SPARSE = 3
+        EXTREMES = 4
+        CHANNEL_CONSTANT = 5
+        BIT_TOGGLE = 6
 
     @staticmethod
     def _generate_data(
-        _type: IntegerType, shape: Tuple, method: NnxTestGenerator.DataGenerationMethod
-    ):
-        if method == NnxTestGenerator.DataGenerationMethod.RANDOM:
-            return NnxTestGenerator._generate_random(_type, shape)
-        elif method == NnxTestGenerator.DataGenerationMethod.ONES:
-            return NnxTestGenerator._generate_ones(_type, shape)
-        elif method == NnxTestGenerator.DataGenerationMethod.INCREMENTED:
-            return NnxTestGenerator._generate_incremented(_type, shape)
+        _type: IntegerType,
+        shape: Tuple,
+        method: NnxTestGenerator.DataGenerationMethod,
+        generator: NnxRandom,
+    ) -> npt.NDArray:
+        """Generate a tensor with the method
+
+        A new method needs a DataGenerationMethod member and a vectorized function
+        with the same signature as the ones below. The functions work on NumPy
+        arrays and draw all their random numbers from the generator, so that every
+        backend generates the same data.
+        """
+        Method = NnxTestGenerator.DataGenerationMethod
+        generate = {
+            Method.RANDOM: NnxTestGenerator._generate_random,
+            Method.ONES: NnxTestGenerator._generate_ones,
+            Method.INCREMENTED: NnxTestGenerator._generate_incremented,
+            Method.SPARSE: NnxTestGenerator._generate_sparse,
+            Method.EXTREMES: NnxTestGenerator._generate_extremes,
+            Method.CHANNEL_CONSTANT: NnxTestGenerator._generate_channel_constant,
+            Method.BIT_TOGGLE: NnxTestGenerator._generate_bit_toggle,
+        }[method]
+        return generate(_type, shape, generator)
+
+    @staticmethod
+    def _conf_hash(conf: NnxTestConf) -> str:
+        return NnxCache.key(json.dumps(conf.model_dump(), sort_keys=True))
+
+    @staticmethod
+    def default_seed(conf: NnxTestConf) -> int:
+        """Seed derived from the configuration, used when none is given explicitly
+
+        Every test draws from its own generator seeded with it, so the generated data
+        doesn't depend on which process or thread generates it, nor in which order.
+        """
+        return int(NnxTestGenerator._conf_hash(conf)[:16], 16) >> 1
+
+    @staticmethod
+    def _tensor_digest(tensor: Optional[NnxTensor]) -> str:
+        if tensor is None:
+            return "none"
+        array = np.ascontiguousarray(tensor)
+        return NnxCache.key(str(array.dtype), str(array.shape), array.tobytes())
+
+    @staticmethod
+    def golden_cache_key(
+        conf: NnxTestConf,
+        data_generation_method: DataGenerationMethod,
+        seed: int,
+        **tensors: Optional[NnxTensor],
+    ) -> str:
+        """Key of the generated test in the golden cache
+
+        Covers everything the generated data depends on: the configuration, the seed,
+        the data generation method, the versions of the generator and the functional
+        model, and the tensors that were provided instead of being generated.
+        """
+        return NnxCache.key(
+            json.dumps(conf.model_dump(), sort_keys=True),
+            str(seed),
+            data_generation_method.name,
+            str(NnxTestGenerator.VERSION),
+            str(NeuralEngineFunctionalModelNumpy.VERSION),
+            *(
+                f"{name}:{NnxTestGenerator._tensor_digest(tensor)}"
+                for name, tensor in sorted(tensors.items())
+            ),
+        )
+
+    @staticmethod
+    def stamp(
+        conf: NnxTestConf, data_generation_method: DataGenerationMethod, seed: int
+    ) -> Dict[str, Union[str, int]]:
+        """Record of everything the generated data of the test depends on"""
+        return {
+            "conf_hash": NnxTestGenerator._conf_hash(conf),
+            "seed": seed,
+            "data_generation_method": data_generation_method.name,
+            "generator_version": NnxTestGenerator.VERSION,
+            "model_version": NeuralEngineFunctionalModelNumpy.VERSION,
+        }
+
+    @staticmethod
+    def stamp_method(test: NnxTest) -> DataGenerationMethod:
+        """Data generation method the test was generated with, random if unknown"""
+        stamp = test.stamp
+        try:
+            assert stamp is not None
+            return NnxTestGenerator.DataGenerationMethod[
+                stamp["data_generation_method"]
+            ]
+        except (AssertionError, KeyError, TypeError):
+            return NnxTestGenerator.DataGenerationMethod.RANDOM
+
+    @staticmethod
+    def stamp_seed(test: NnxTest) -> Optional[int]:
+        """Seed the test was generated with, None if unknown
+
+        Seeds of other generator versions are unknown as they don't generate the same
+        data anymore.
+        """
+        stamp = test.stamp
+        if stamp is None or stamp.get("generator_version") != NnxTestGenerator.VERSION:
+            return None
+        seed = stamp.get("seed")
+        return seed if isinstance(seed, int) else None
+
+    @staticmethod
+    def is_stale(test: NnxTest) -> bool:
+        """Whether the test's data would be different if generated now
+
+        Tests without a stamp are considered stale.
+        """
+        seed = NnxTestGenerator.stamp_seed(test)
+        return test.stamp != NnxTestGenerator.stamp(
+            test.conf,
+            NnxTestGenerator.stamp_method(test),
+            NnxTestGenerator.default_seed(test.conf) if seed is None else seed,
+        )
 
     @staticmethod
     def from_conf(
         conf: NnxTestConf,
-        input: Optional[torch.Tensor] = None,
-        weight: Optional[torch.Tensor] = None,
-        scale: Optional[torch.Tensor] = None,
-        bias: Optional[torch.Tensor] = None,
-        global_shift: Optional[torch.Tensor] = None,
+        input: Optional[NnxTensor] = None,
+        weight: Optional[NnxTensor] = None,
+        scale: Optional[NnxTensor] = None,
+        bias: Optional[NnxTensor] = None,
+        global_shift: Optional[NnxTensor] = None,
         data_generation_method: DataGenerationMethod = DataGenerationMethod.RANDOM,
         verbose: bool = False,
+        cache: Optional[NnxCache] = None,
+        seed: Optional[int] = None,
+        backend: NnxBackend = NnxTest.DEFAULT_BACKEND,
     ) -> NnxTest:
-        torch.manual_seed(NnxTestGenerator._DEFAULT_SEED)
+        if seed is None:
+            seed = NnxTestGenerator.default_seed(conf)
+
+        # Verbose generation prints the intermediate results so it always recomputes
+        if cache is None or verbose:
+            return NnxTestGenerator._generate(
+                conf,
+                input,
+                weight,
+                scale,
+                bias,
+                global_shift,
+                data_generation_method,
+                verbose,
+                seed,
+                backend,
+            )
+
+        key = NnxTestGenerator.golden_cache_key(
+            conf,
+            data_generation_method,
+            seed,
+            input=input,
+            weight=weight,
+            scale=scale,
+            bias=bias,
+            global_shift=global_shift,
+        )
+        path = cache.lookup(key)
+        if path is not None:
+            try:
+                # Loaded eagerly since the entry can get evicted at any moment
+                test = NnxTest.load_data(conf, path, lazy=False, backend=backend)
+                test.stamp = NnxTestGenerator.stamp(conf, data_generation_method, seed)
+                return test
+            except (OSError, RuntimeError, EOFError, ImportError):
+                # Entry evicted or corrupted, or saved in the pt format without torch
+                # installed, fall through and regenerate it
+                pass
+
+        test = NnxTestGenerator._generate(
+            conf,
+            input,
+            weight,
+            scale,
+            bias,
+            global_shift,
+            data_generation_method,
+            seed=seed,
+            backend=backend,
+        )
+        cache.store(key, test.save_data)
+        return test
+
+    # Fields of the configuration that the functional model depends on apart from the data
+    _GROUP_FIELDS = {
+        "in_height",
+        "in_width",
+        "in_channel",
+        "out_channel",
+        "padding",
+        "kernel_shape",
+        "depthwise",
+        "stride",
+        "out_type",
+        "bias_type",
+        "has_norm_quant",
+        "has_bias",
+        "has_relu",
+    }
+    DEFAULT_BATCH_SIZE = 32
+
+    @staticmethod
+    def _group_key(conf: NnxTestConf) -> str:
+        """Tests with the same group key can be generated in a single batch"""
+        return json.dumps(
+            conf.model_dump(include=NnxTestGenerator._GROUP_FIELDS), sort_keys=True
+        )
+
+    @staticmethod
+    def from_confs(
+        confs: Sequence[NnxTestConf],
+        data_generation_method: DataGenerationMethod = DataGenerationMethod.RANDOM,
+        cache: Optional[NnxCache] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        seeds: Optional[Sequence[Optional[int]]] = None,
+        backend: NnxBackend = NnxTest.DEFAULT_BACKEND,
+    ) -> List[NnxTest]:
+        """Generate the tests of many configurations
+
+        Same as calling from_conf on each of the configurations, and their seeds if
+        given, but the ones with compatible shapes get evaluated together by the
+        functional model in batches of up to batch_size tests.
+        """
+        assert batch_size > 0, f"Invalid batch size {batch_size}"
+        if seeds is None:
+            seeds = [None] * len(confs)
+        _seeds = [
+            NnxTestGenerator.default_seed(conf) if seed is None else seed
+            for conf, seed in zip(confs, seeds)
+        ]
+
+        tests: List[Optional[NnxTest]] = [None] * len(confs)
+        keys: List[Optional[str]] = [None] * len(confs)
+        groups: Dict[str, List[int]] = {}
+        for i, conf in enumerate(confs):
+            if cache is not None:
+                key = keys[i] = NnxTestGenerator.golden_cache_key(
+                    conf,
+                    data_generation_method,
+                    _seeds[i],
+                    input=None,
+                    weight=None,
+                    scale=None,
+                    bias=None,
+                    global_shift=None,
+                )
+                path = cache.lookup(key)
+                if path is not None:
+                    try:
+                        test = NnxTest.load_data(
+                            conf, path, lazy=False, backend=backend
+                        )
+                        test.stamp = NnxTestGenerator.stamp(
+                            conf, data_generation_method, _seeds[i]
+                        )
+                        tests[i] = test
+                        continue
+                    except (OSError, RuntimeError, EOFError, ImportError):
+                        # Entry unusable, see from_conf
+                        pass
+            groups.setdefault(NnxTestGenerator._group_key(conf), []).append(i)
+
+        for indices in groups.values():
+            for start in range(0, len(indices), batch_size):
+                batch = indices[start : start + batch_size]
+                generated = NnxTestGenerator._generate_group(
+                    [confs[i] for i in batch],
+                    data_generation_method,
+                    [_seeds[i] for i in batch],
+                    backend=backend,
+                )
+                for i, test in zip(batch, generated):
+                    key = keys[i]
+                    if cache is not None and key is not None:
+                        cache.store(key, test.save_data)
+                    tests[i] = test
+
+        return [test for test in tests if test is not None]
+
+    @staticmethod
+    def _generate_tensors(
+        conf: NnxTestConf,
+        input: Optional[npt.NDArray],
+        weight: Optional[npt.NDArray],
+        scale: Optional[npt.NDArray],
+        bias: Optional[npt.NDArray],
+        data_generation_method: DataGenerationMethod,
+        seed: int,
+        backend: NnxBackend,
+    ) -> Tuple[npt.NDArray, npt.NDArray, Optional[npt.NDArray], Optional[npt.NDArray]]:
+        """Generate the input tensors of the test that were not provided"""
+        generator = backend.random(seed)
 
         input_shape = (1, conf.in_channel, conf.in_height, conf.in_width)
         weight_shape = (
@@ -287,6 +881,7 @@ class NnxTestGenerator:
                 _type=conf.in_type,
                 shape=input_shape,
                 method=data_generation_method,
+                generator=generator,
             )
 
         if weight is None:
@@ -294,6 +889,7 @@ class NnxTestGenerator:
                 _type=conf.weight_type,
                 shape=weight_shape,
                 method=data_generation_method,
+                generator=generator,
             )
 
         if conf.has_norm_quant:
@@ -303,6 +899,7 @@ class NnxTestGenerator:
                     conf.scale_type,
                     shape=scale_shape,
                     method=data_generation_method,
+                    generator=generator,
                 )
             if conf.has_bias and bias is None:
                 assert conf.bias_type is not None
@@ -310,50 +907,165 @@ class NnxTestGenerator:
                     conf.bias_type,
                     shape=bias_shape,
                     method=data_generation_method,
-                ).type(torch.int32)
-            if global_shift is None:
-                global_shift = torch.Tensor([0]).type(torch.uint8)
-                conv_kwargs = {
+                    generator=generator,
+                ).astype(np.int32)
+
+        assert input is not None and weight is not None
+        return input, weight, scale, bias
+
+    @staticmethod
+    def _generate(
+        conf: NnxTestConf,
+        input: Optional[NnxTensor] = None,
+        weight: Optional[NnxTensor] = None,
+        scale: Optional[NnxTensor] = None,
+        bias: Optional[NnxTensor] = None,
+        global_shift: Optional[NnxTensor] = None,
+        data_generation_method: DataGenerationMethod = DataGenerationMethod.RANDOM,
+        verbose: bool = False,
+        seed: Optional[int] = None,
+        backend: NnxBackend = NnxTest.DEFAULT_BACKEND,
+    ) -> NnxTest:
+        return NnxTestGenerator._generate_group(
+            [conf],
+            data_generation_method,
+            [NnxTestGenerator.default_seed(conf) if seed is None else seed],
+            [(input, weight, scale, bias, global_shift)],
+            verbose,
+            backend,
+        )[0]
+
+    @staticmethod
+    def _generate_group(
+        confs: Sequence[NnxTestConf],
+        data_generation_method: DataGenerationMethod,
+        seeds: Sequence[int],
+        provided: Optional[Sequence[Tuple[Optional[NnxTensor], ...]]] = None,
+        verbose: bool = False,
+        backend: NnxBackend = NnxTest.DEFAULT_BACKEND,
+    ) -> List[NnxTest]:
+        """Generate tests of the same group in a single functional model evaluation
+
+        The provided tensors are, per test, a tuple of the input, weight, scale, bias,
+        and global shift tensors, each of which gets generated if None.
+        The data is kept in NumPy arrays, and only the random numbers and the functional
+        model come from the backend.
+        """
+        assert (
+            len(set(NnxTestGenerator._group_key(conf) for conf in confs)) == 1
+        ), "Tests of different groups can't be generated together"
+        if provided is None:
+            provided = [(None,) * 5] * len(confs)
+
+        inputs, weights, scales, biases, global_shifts = [], [], [], [], []
+        for conf, seed, tensors in zip(confs, seeds, provided):
+            input, weight, scale, bias, global_shift = (
+                None if tensor is None else np.asarray(tensor) for tensor in tensors
+            )
+            input, weight, scale, bias = NnxTestGenerator._generate_tensors(
+                conf, input, weight, scale, bias, data_generation_method, seed, backend
+            )
+            inputs.append(input)
+            weights.append(weight)
+            scales.append(scale)
+            biases.append(bias)
+            global_shifts.append(global_shift)
+
+        # All the confs of a group are the same as far as the model is concerned
+        conf = confs[0]
+
+        # A weight shared by the whole group makes for a single large matmul
+        if all(np.array_equal(weights[0], weight) for weight in weights[1:]):
+            weight = weights[0]
+        else:
+            weight = np.stack(weights)
+
+        # The accumulator doesn't depend on norm/quant parameters so it's computed once
+        accumulator = backend.accumulate(
+            np.concatenate(inputs), weight, verbose=verbose, **conf.__dict__
+        )
+
+        scale = bias = global_shift = None
+        if conf.has_norm_quant:
+            scale = np.concatenate([_scale for _scale in scales if _scale is not None])
+            if conf.has_bias:
+                bias = np.concatenate([_bias for _bias in biases if _bias is not None])
+            if any(_global_shift is None for _global_shift in global_shifts):
+                requant_kwargs = {
                     **conf.__dict__,
-                    "out_type": NeuralEngineFunctionalModel.ACCUMULATOR_TYPE,
+                    "out_type": NeuralEngineFunctionalModelNumpy.ACCUMULATOR_TYPE,
                 }
-                output = NeuralEngineFunctionalModel().convolution(
-                    input,
-                    weight,
+                output = backend.requantize(
+                    accumulator,
                     scale,
                     bias,
-                    global_shift,
+                    np.zeros(1, dtype=np.uint8),
                     verbose=False,
-                    **conv_kwargs,
+                    **requant_kwargs,
                 )
-                global_shift = NnxTestGenerator._calculate_global_shift(
-                    output, conf.out_type
-                )
-
-        output = NeuralEngineFunctionalModel().convolution(
-            input, weight, scale, bias, global_shift, verbose=verbose, **conf.__dict__
+                global_shifts = [
+                    (
+                        NnxTestGenerator._calculate_global_shift(
+                            output[i : i + 1], _conf.out_type
+                        )
+                        if _global_shift is None
+                        else _global_shift
+                    )
+                    for i, (_conf, _global_shift) in enumerate(
+                        zip(confs, global_shifts)
+                    )
+                ]
+            global_shift = np.stack(
+                [
+                    _global_shift.reshape(())
+                    for _global_shift in global_shifts
+                    if _global_shift is not None
+                ]
+            ).reshape(-1, 1, 1, 1)
+
+        output = backend.requantize(
+            accumulator, scale, bias, global_shift, verbose=verbose, **conf.__dict__
         )
 
-        return NnxTest(
-            conf=conf,
-            input=input,
-            output=output,
-            weight=weight,
-            scale=scale,
-            bias=bias,
-            global_shift=global_shift,
-        )
+        def from_numpy(array: Optional[npt.NDArray]) -> Optional[NnxTensor]:
+            return None if array is None else backend.from_numpy(array)
+
+        tests = []
+        for i, _conf in enumerate(confs):
+            test = NnxTest(
+                conf=_conf,
+                input=from_numpy(inputs[i]),
+                # Copy the slice so it doesn't keep the whole batch alive, or saved
+                output=from_numpy(output[i : i + 1].copy()),
+                weight=from_numpy(weights[i]),
+                scale=from_numpy(scales[i]),
+                bias=from_numpy(biases[i]),
+                global_shift=from_numpy(global_shifts[i]),
+                backend=backend,
+            )
+            test.stamp = NnxTestGenerator.stamp(_conf, data_generation_method, seeds[i])
+            tests.append(test)
+        return tests
 
     TensorName = Literal["input", "output", "weight", "scale", "bias"]
 
     @staticmethod
     def regenerate(
-        test: NnxTest, regen_tensors: Set[NnxTestGenerator.TensorName]
+        test: NnxTest,
+        regen_tensors: Set[NnxTestGenerator.TensorName],
+        cache: Optional[NnxCache] = None,
     ) -> NnxTest:
         test_tensors = set(get_args(NnxTestGenerator.TensorName))
         load_tensors = test_tensors - regen_tensors
         kwargs = {tensor: getattr(test, tensor) for tensor in load_tensors}
-        return NnxTestGenerator.from_conf(test.conf, **kwargs)
+        return NnxTestGenerator.from_conf(
+            test.conf,
+            **kwargs,
+            data_generation_method=NnxTestGenerator.stamp_method(test),
+            cache=cache,
+            seed=NnxTestGenerator.stamp_seed(test),
+            backend=test.backend,
+        )
 
 
 class NnxWeight(ABC):
@@ -397,144 +1109,458 @@ class NnxWeight(ABC):
         """Reverse of encode"""
         ...
 
+    @abstractmethod
+    def section(self) -> str:
+        """Returns the section of the weight vector the accelerator reads from"""
+        ...
+
     @abstractmethod
     def source_generate(
         self, init: npt.NDArray[np.uint8], header_writer: HeaderWriter
-    ) -> None:
-        """Function implementing generation of weight's sources"""
+    ) -> Optional[str]:
+        """Function implementing generation of weight's sources
+
+        Returns the name of the vector that has to be copied into the weight
+        vector before the layer executes, or None if it is initialized in place.
+        """
         ...
 
 
+class NnxLayerImage:
+    """Binary image of layers loaded at runtime by the app built for it
+
+    The layout has to match app/inc/layer_image.h. The image starts with a header,
+    followed by an entry per layer, followed by the data the entries point to.
+    """
+
+    MAGIC = 0x4C584E4E  # "NNXL"
+    VERSION = 2
+    FILENAME = "layers.bin"
+    # Vectors in the order of the entry fields
+    VECTORS = ["input", "weight", "scale", "bias", "golden_output", "golden_output_crc"]
+    CONF_FIELDS = 30
+    _HEADER = struct.Struct("<4I")
+    _ENTRY = struct.Struct(f"<2I{CONF_FIELDS}i{2 * len(VECTORS)}I")
+    _ALIGNMENT = 4
+
+    @staticmethod
+    def _flatten(conf: Dict) -> List[int]:
+        retval = []
+        for value in conf.values():
+            if isinstance(value, dict):
+                retval.extend(NnxLayerImage._flatten(value))
+            else:
+                retval.append(int(value))
+        return retval
+
+    @staticmethod
+    def encode(layers: Sequence[Tuple[str, Dict, Dict[str, bytes]]]) -> bytes:
+        """Encode the layers given as (name, conf, vectors) tuples"""
+        data = bytearray()
+        data_offset = (
+            NnxLayerImage._HEADER.size + len(layers) * NnxLayerImage._ENTRY.size
+        )
+
+        def append(blob: bytes) -> Tuple[int, int]:
+            data.extend(b"\0" * (-len(data) % NnxLayerImage._ALIGNMENT))
+            offset = data_offset + len(data)
+            data.extend(blob)
+            return offset, len(blob)
+
+        entries = b""
+        for name, conf, vectors in layers:
+            fields = NnxLayerImage._flatten(conf)
+            assert (
+                len(fields) == NnxLayerImage.CONF_FIELDS
+            ), f"Expected {NnxLayerImage.CONF_FIELDS} conf fields, got {len(fields)}"
+            entry = [*append(name.encode() + b"\0"), *fields]
+            for vector in NnxLayerImage.VECTORS:
+                entry.extend(append(vectors[vector]) if vector in vectors else (0, 0))
+            entries += NnxLayerImage._ENTRY.pack(*entry)
+
+        size = data_offset + len(data)
+        header = NnxLayerImage._HEADER.pack(
+            NnxLayerImage.MAGIC, NnxLayerImage.VERSION, len(layers), size
+        )
+        return header + entries + bytes(data)
+
+
 class NnxTestHeaderGenerator:
     DEFAULT_HEADERS_DIR = "app/gen"
+    # Size of the weight memory vector of the app loading a layer image
+    IMAGE_WEIGHT_MEM_CAPACITY = 1 << 18
 
     def __init__(
         self,
         nnxWeight: NnxWeight,
         headers_dir: Optional[Union[str, os.PathLike]] = None,
+        binary: bool = False,
+        output_check: NnxOutputCheck = NnxOutputCheck.golden,
     ):
         if headers_dir is None:
             headers_dir = NnxTestHeaderGenerator.DEFAULT_HEADERS_DIR
-        self.header_writer = HeaderWriter(headers_dir)
+        self.headers_dir = headers_dir
+        self.header_writer = HeaderWriter(headers_dir, binary=binary)
+        self.output_check = output_check
         # function that takes the weights in CoutCinK format, bitwidth, and a depthwise flag,
         # and returns a numpy array of dtype=np.uint8 of data in a layout correct for the accelerator
         self.nnxWeight = nnxWeight
 
-    def generate(self, test_name: str, test: NnxTest):
+    def generate(self, test_name: str, test: NnxTest) -> List[str]:
+        """Generate the test sources and return the files that changed"""
+        return self.generate_batch([(test_name, test)])
+
+    def generate_batch(self, tests: Sequence[Tuple[str, NnxTest]]) -> List[str]:
+        """Generate the sources of an app executing all the tests one after another
+
+        A single test has its data initialized in place. With more tests, the data
+        of every test is kept in L2 and copied into vectors shared by all the tests
+        right before its layer executes, so the tests only have to fit into L1 one
+        at a time.
+        Returns the files that changed.
+        """
+        assert len(tests) > 0, "Nothing to generate"
+        self.header_writer.changed_files = []
+        self.header_writer.generated_files = set()
+
+        staged = len(tests) > 1
+        layers = []
+        for i, (test_name, test) in enumerate(tests):
+            prefix = f"layer{i}_" if staged else ""
+            layers.append(
+                (test_name, test, self._generate_layer_data(prefix, test, staged))
+            )
+
+        shared_vectors = self._generate_shared_vectors(layers) if staged else {}
+
+        test_name = tests[0][0] if not staged else f"batch of {len(tests)} tests"
+        self.header_writer.generate_defines_header(
+            "layer_conf",
+            {
+                "test_name": test_name,
+                "num_layers": len(tests),
+                f"wmem_{self.nnxWeight.wmem}": None,
+            },
+        )
+
+        self._generate_layer_table(layers, shared_vectors)
+
+        self.header_writer.remove_stale_files()
+
+        return self.header_writer.changed_files
+
+    def generate_image(self, tests: Sequence[Tuple[str, NnxTest]]) -> List[str]:
+        """Generate the sources of an app loading the tests from a layer image
+
+        The sources don't depend on the tests so the app gets built only once,
+        while the tests go into the layer image next to the generated sources.
+        Returns the sources that changed.
+        """
+        assert len(tests) > 0, "Nothing to generate"
+        self.header_writer.changed_files = []
+        self.header_writer.generated_files = set()
+
+        layers = []
+        for test_name, test in tests:
+            vectors = {
+                name: HeaderWriter.binary_data(ctype, data)
+                for name, (ctype, data) in self._layer_vectors(test).items()
+            }
+            if self.nnxWeight.wmem != NnxWmem.tcdm:
+                assert (
+                    len(vectors["weight"])
+                    <= NnxTestHeaderGenerator.IMAGE_WEIGHT_MEM_CAPACITY
+                ), f"Weights of test {test_name} don't fit into the weight memory"
+            layers.append((test_name, self._layer_conf(test), vectors))
+
+        image_path = os.path.abspath(
+            os.path.join(self.headers_dir, NnxLayerImage.FILENAME)
+        )
+        self.header_writer.generate_image(image_path, NnxLayerImage.encode(layers))
+
+        # Only the sources are part of the build
+        self.header_writer.changed_files = []
+        self.header_writer.generate_defines_header(
+            "layer_conf",
+            {
+                "test_name": "layer image",
+                "layer_image": None,
+                "layer_image_path": image_path,
+                "layer_image_weight_mem_capacity": NnxTestHeaderGenerator.IMAGE_WEIGHT_MEM_CAPACITY,
+                f"wmem_{self.nnxWeight.wmem}": None,
+            },
+        )
+
+        self.header_writer.remove_stale_files()
+
+        return self.header_writer.changed_files
+
+    @staticmethod
+    def _ctype_size(ctype: Optional[str]) -> int:
+        assert ctype is not None
+        return np.dtype(ctype.removesuffix("_t")).itemsize
+
+    @staticmethod
+    def output_row_crcs(output: NnxTensor, out_ctype: str) -> npt.NDArray[np.uint32]:
+        """CRC32 digests of the output rows as laid out in memory
+
+        Matches the digests the app computes in app/inc/layer_util.h.
+        """
+        # Rows of the height dimension, in HWC order
+        rows = np.asarray(output).transpose(0, 2, 3, 1).reshape(output.shape[2], -1)
+        return np.array(
+            [zlib.crc32(HeaderWriter.binary_data(out_ctype, row)) for row in rows],
+            dtype=np.uint32,
+        )
+
+    def _layer_vectors(self, test: NnxTest) -> Dict[str, Tuple[str, npt.NDArray]]:
+        """Returns the C type and the data in memory order of the test's vectors"""
         assert test.input is not None and test.output is not None
-        _, in_channel, in_height, in_width = test.input.shape
-        _, out_channel, out_height, out_width = test.output.shape
+        vectors: Dict[str, Tuple[str, npt.NDArray]] = {}
 
-        # Render input
         in_ctype = test.conf.in_type.ctype()
-        in_signed = test.conf.in_type._signed
-        in_data = test.input.permute(0, 2, 3, 1).ravel()
-        self.header_writer.generate_vector_files(
-            "input", _type=in_ctype, size=in_data.numel(), init=in_data
+        assert in_ctype is not None
+        vectors["input"] = (
+            in_ctype,
+            np.asarray(test.input).transpose(0, 2, 3, 1).ravel(),
         )
 
-        # Render output
         out_ctype = test.conf.out_type.ctype()
-        out_signed = test.conf.out_type._signed
-        out_data_golden = test.output.permute(0, 2, 3, 1).ravel()
-        self.header_writer.generate_vector_files(
-            "output",
-            _type=out_ctype,
-            size=out_data_golden.numel(),
-            golden=out_data_golden,
-        )
+        assert out_ctype is not None
+        if self.output_check == NnxOutputCheck.crc32:
+            vectors["golden_output_crc"] = (
+                "uint32_t",
+                NnxTestHeaderGenerator.output_row_crcs(test.output, out_ctype),
+            )
+        else:
+            vectors["golden_output"] = (
+                out_ctype,
+                np.asarray(test.output).transpose(0, 2, 3, 1).ravel(),
+            )
 
-        # Render weights
         assert test.weight is not None
         weight_type = test.conf.weight_type
         weight_bits = weight_type._bits
         assert weight_bits > 1 and weight_bits <= 8
         weight_offset = -(2 ** (weight_bits - 1))
-        weight_out_ch, weight_in_ch, weight_ks_h, weight_ks_w = test.weight.shape
-        weight_data: np.ndarray = test.weight.numpy() - weight_offset
+        weight_data: np.ndarray = np.asarray(test.weight) - weight_offset
         weight_init = self.nnxWeight.encode(
             weight_data.astype(np.uint8),
             weight_type._bits,
             test.conf.depthwise,
         )
+        vectors["weight"] = ("uint8_t", weight_init)
 
-        self.nnxWeight.source_generate(weight_init, self.header_writer)
-
-        # Render scale
         if test.scale is not None:
             assert test.conf.scale_type is not None
             scale_ctype = test.conf.scale_type.ctype()
-            self.header_writer.generate_vector_files(
-                "scale",
-                _type=scale_ctype,
-                size=test.scale.numel(),
-                init=test.scale.ravel(),
-            )
+            assert scale_ctype is not None
+            vectors["scale"] = (scale_ctype, np.asarray(test.scale).ravel())
 
-        # Render bias
         if test.bias is not None:
             assert test.conf.bias_type is not None
             bias_ctype = test.conf.bias_type.ctype()
+            assert bias_ctype is not None
+            vectors["bias"] = (bias_ctype, np.asarray(test.bias).ravel())
+
+        return vectors
+
+    def _generate_layer_data(
+        self, prefix: str, test: NnxTest, staged: bool
+    ) -> Dict[str, Tuple[Optional[str], int]]:
+        """Generate the data vectors of a test
+
+        Returns the vector holding the initial value of each of the layer's
+        vectors together with its size in bytes. A missing initial value (None)
+        means the vector is initialized in place.
+        """
+        section = "PI_L2" if staged else "PI_L1"
+        vectors: Dict[str, Tuple[Optional[str], int]] = {}
+
+        assert test.output is not None
+        out_ctype = test.conf.out_type.ctype()
+        out_size = int(np.prod(test.output.shape))
+        for name, (ctype, data) in self._layer_vectors(test).items():
+            size = data.size
+            nbytes = size * self._ctype_size(ctype)
+
+            if name in ["golden_output", "golden_output_crc"]:
+                # The accelerator writes into the output, the golden one stays in L2
+                if not staged:
+                    self.header_writer.generate_vector_files(
+                        "output", _type=out_ctype, size=out_size
+                    )
+                self.header_writer.generate_vector_files(
+                    f"{prefix}{name}",
+                    _type=ctype,
+                    size=size,
+                    init=data,
+                    section="PI_L2",
+                )
+                vectors["output"] = (None, out_size * self._ctype_size(out_ctype))
+            elif name == "weight" and not staged:
+                assert isinstance(data, np.ndarray)
+                weight_src = self.nnxWeight.source_generate(data, self.header_writer)
+                vectors[name] = (weight_src, nbytes)
+            else:
+                self.header_writer.generate_vector_files(
+                    f"{prefix}{name}",
+                    _type=ctype,
+                    size=size,
+                    init=data,
+                    section=section,
+                )
+                vectors[name] = (f"{prefix}{name}" if staged else None, nbytes)
+
+        return vectors
+
+    def _generate_shared_vectors(
+        self, layers: List[Tuple[str, NnxTest, Dict[str, Tuple[Optional[str], int]]]]
+    ) -> Dict[str, int]:
+        """Generate the vectors big enough for any of the layers
+
+        Returns the size in bytes of each generated vector.
+        """
+        sections = {
+            "input": "PI_L1",
+            "output": "PI_L1",
+            "weight": self.nnxWeight.section(),
+            "scale": "PI_L1",
+            "bias": "PI_L1",
+        }
+        shared_vectors: Dict[str, int] = {}
+        for name, section in sections.items():
+            sizes = [vectors[name][1] for _, _, vectors in layers if name in vectors]
+            if len(sizes) == 0:
+                continue
+            size = max(sizes)
+            # Words keep the vector aligned for any of the element types
             self.header_writer.generate_vector_files(
-                "bias", _type=bias_ctype, size=test.bias.numel(), init=test.bias.ravel()
+                name, _type="uint32_t", size=(size + 3) // 4, section=section
             )
+            shared_vectors[name] = size
+        return shared_vectors
 
+    def _layer_conf(self, test: NnxTest) -> Dict:
+        assert test.input is not None and test.output is not None
+        assert test.weight is not None
+        _, in_channel, in_height, in_width = test.input.shape
+        _, out_channel, out_height, out_width = test.output.shape
+        weight_out_ch, weight_in_ch, weight_ks_h, weight_ks_w = test.weight.shape
+        weight_bits = test.conf.weight_type._bits
         global_shift = 0 if test.global_shift is None else int(test.global_shift.item())
 
-        # Render layer conf
-        self.header_writer.generate_defines_header(
-            "layer_conf",
-            {
-                "test_name": test_name,
-                "input": {
-                    "height": in_height,
-                    "width": in_width,
-                    "channel": in_channel,
-                    "signed": in_signed,
-                    "bits": test.conf.in_type._bits,
-                },
-                "output": {
-                    "height": out_height,
-                    "width": out_width,
-                    "channel": out_channel,
-                    "signed": out_signed,
-                    "bits": test.conf.out_type._bits,
-                },
-                "weight": {
-                    "height": weight_ks_h,
-                    "width": weight_ks_w,
-                    "channel_in": weight_in_ch,
-                    "channel_out": weight_out_ch,
-                    "bits": weight_bits,
-                    "offset": weight_offset,
-                },
-                "scale": {
-                    "bits": (
-                        test.conf.scale_type._bits
-                        if test.conf.scale_type is not None
-                        else 0
-                    )
-                },
-                "bias": {
-                    "bits": (
-                        test.conf.bias_type._bits
-                        if test.conf.bias_type is not None
-                        else 0
-                    )
-                },
-                "padding": {
-                    "top": test.conf.padding.top,
-                    "bottom": test.conf.padding.bottom,
-                    "left": test.conf.padding.left,
-                    "right": test.conf.padding.right,
-                    "value": 0,
-                },
-                "stride": test.conf.stride.model_dump(),
-                "groups": test.conf.in_channel if test.conf.depthwise else 1,
-                "outshift": global_shift,
-                "has_norm_quant": test.conf.has_norm_quant,
-                "has_bias": test.conf.has_bias,
-                "has_relu": test.conf.has_relu,
-                f"wmem_{self.nnxWeight.wmem}": None,
+        return {
+            "input": {
+                "height": in_height,
+                "width": in_width,
+                "channel": in_channel,
+                "signed": test.conf.in_type._signed,
+                "bits": test.conf.in_type._bits,
             },
+            "output": {
+                "height": out_height,
+                "width": out_width,
+                "channel": out_channel,
+                "signed": test.conf.out_type._signed,
+                "bits": test.conf.out_type._bits,
+            },
+            "weight": {
+                "height": weight_ks_h,
+                "width": weight_ks_w,
+                "channel_in": weight_in_ch,
+                "channel_out": weight_out_ch,
+                "bits": weight_bits,
+                "offset": -(2 ** (weight_bits - 1)),
+            },
+            "scale": {
+                "bits": (
+                    test.conf.scale_type._bits
+                    if test.conf.scale_type is not None
+                    else 0
+                )
+            },
+            "bias": {
+                "bits": (
+                    test.conf.bias_type._bits if test.conf.bias_type is not None else 0
+                )
+            },
+            "padding": {
+                "top": test.conf.padding.top,
+                "bottom": test.conf.padding.bottom,
+                "left": test.conf.padding.left,
+                "right": test.conf.padding.right,
+                "value": 0,
+            },
+            "stride": test.conf.stride.model_dump(),
+            "groups": test.conf.in_channel if test.conf.depthwise else 1,
+            "outshift": global_shift,
+            "has_norm_quant": test.conf.has_norm_quant,
+            "has_bias": test.conf.has_bias,
+            "has_relu": test.conf.has_relu,
+        }
+
+    def _generate_layer_table(
+        self,
+        layers: List[Tuple[str, NnxTest, Dict[str, Tuple[Optional[str], int]]]],
+        shared_vectors: Dict[str, int],
+    ) -> None:
+        includes = {"output"}
+        golden_name = (
+            "golden_output_crc"
+            if self.output_check == NnxOutputCheck.crc32
+            else "golden_output"
+        )
+        entries = ""
+        for i, (test_name, test, vectors) in enumerate(layers):
+            prefix = f"layer{i}_" if len(shared_vectors) > 0 else ""
+            includes.add(f"{prefix}{golden_name}")
+
+            fields = {}
+            for name in ["input", "weight", "scale", "bias"]:
+                if name not in vectors:
+                    fields[name] = "{.data = NULL, .src = NULL, .size = 0}"
+                    continue
+                src, size = vectors[name]
+                includes.add(name)
+                if src is None:
+                    fields[name] = f"{{.data = {name}, .src = NULL, .size = 0}}"
+                else:
+                    includes.add(src)
+                    fields[name] = (
+                        f"{{.data = {name}, .src = {src}, .size = sizeof({src})}}"
+                    )
+            fields["output"] = "output"
+            fields["golden_output"] = "NULL"
+            fields["golden_output_crc"] = "NULL"
+            fields[golden_name] = f"{prefix}{golden_name}"
+
+            entries += (
+                " " * self.header_writer.tabwidth
+                + "{\n"
+                + self.header_writer.render_grouped_fields(
+                    {"name": f'"{test_name}"'}, indent=2
+                )
+                # The layer's conf gets flattened while the vectors are structs
+                + self.header_writer.render_grouped_fields(
+                    self._layer_conf(test), indent=2
+                )
+                + self.header_writer.render_grouped_fields(fields, indent=2)
+                + " " * self.header_writer.tabwidth
+                + "},\n"
+            )
+
+        self.header_writer.generate_header(
+            "layers",
+            '#include "layer_conf.h"\n'
+            + '#include "nnx_layer.h"\n\n'
+            + "extern const layer_t layers[NUM_LAYERS];\n\n",
+        )
+        self.header_writer.generate_source(
+            "layers",
+            '#include "layers.h"\n\n'
+            + "".join(f'#include "{name}.h"\n' for name in sorted(includes))
+            + "\nconst layer_t layers[NUM_LAYERS] = {\n"
+            + entries
+            + "};\n",
         )
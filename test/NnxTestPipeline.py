@@ -0,0 +1,105 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from NnxBuildFlow import NnxBuildFlow
+
+# Generates the sources of a batch of tests inside of the workdir and builds them
+NnxBuildStage = Callable[[List[str], str], NnxBuildFlow]
+# Simulates a built batch and returns its output
+NnxSimulateStage = Callable[[NnxBuildFlow], str]
+
+
+class NnxTestPipeline:
+    """Builds the next batches of tests while the current one simulates
+
+    A builder thread generates and builds the batches in the order they are going
+    to run, each in a workdir of its own, and hands them over to a simulator thread
+    through a queue of at most depth built batches. A workdir is reused once its
+    batch got simulated, so depth + 2 of them cover the batch being built, the
+    queued ones, and the one being simulated.
+    """
+
+    def __init__(
+        self, batches: Sequence[List[str]], depth: int, workdir_prefix: str
+    ) -> None:
+        assert depth > 0, f"Invalid pipeline depth {depth}"
+        self.workdir_prefix = workdir_prefix
+        self._batches = [(list(batch), Future()) for batch in batches]
+        self._pending: Dict[Tuple[str, ...], Future] = {
+            tuple(batch): future for batch, future in self._batches
+        }
+        self._built: queue.Queue = queue.Queue(maxsize=depth)
+        self._free_workdirs: queue.Queue = queue.Queue()
+        for i in range(depth + 2):
+            self._free_workdirs.put(f"{workdir_prefix}{i}")
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _build_all(self, build: NnxBuildStage) -> None:
+        for batch, future in self._batches:
+            workdir = self._free_workdirs.get()
+            if self._stop.is_set():
+                break
+            try:
+                buildFlow = build(batch, workdir)
+            except Exception as e:
+                future.set_exception(e)
+                self._free_workdirs.put(workdir)
+                continue
+            self._built.put((future, workdir, buildFlow))
+        self._built.put(None)
+
+    def _simulate_all(self, simulate: NnxSimulateStage) -> None:
+        while (item := self._built.get()) is not None:
+            future, workdir, buildFlow = item
+            if self._stop.is_set():
+                future.cancel()
+            else:
+                try:
+                    future.set_result(simulate(buildFlow))
+                except Exception as e:
+                    future.set_exception(e)
+            self._free_workdirs.put(workdir)
+
+    def _start(self, build: NnxBuildStage, simulate: NnxSimulateStage) -> None:
+        self._threads = [
+            threading.Thread(target=self._build_all, args=(build,), daemon=True),
+            threading.Thread(target=self._simulate_all, args=(simulate,), daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def result(
+        self, batch: List[str], build: NnxBuildStage, simulate: NnxSimulateStage
+    ) -> Union[str, Exception]:
+        """Output of the batch's simulation, or the error that stopped it
+
+        The stages depend on the tests' fixtures, so the first call starts the
+        pipeline with them. A batch the pipeline didn't plan for, or one that's
+        requested again, gets built and simulated on the spot.
+        """
+        future: Optional[Future] = self._pending.pop(tuple(batch), None)
+        if future is None:
+            try:
+                return simulate(build(batch, f"{self.workdir_prefix}sync"))
+            except Exception as e:
+                return e
+
+        if len(self._threads) == 0:
+            self._start(build, simulate)
+        exception = future.exception()
+        if exception is not None:
+            assert isinstance(exception, Exception)
+            return exception
+        return future.result()
+
+    def close(self) -> None:
+        """Cancel the batches that didn't start yet and wait for the running stages"""
+        self._stop.set()
+        # Wakes up the builder if it's waiting for a free workdir
+        self._free_workdirs.put(os.devnull)
+        for thread in self._threads:
+            thread.join()
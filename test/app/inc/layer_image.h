@@ -0,0 +1,68 @@
+/*
+ * Luka Macan <luka.macan@unibo.it>
+ *
+ * Copyright 2023 ETH Zurich and University of Bologna
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+#ifndef __LAYER_IMAGE_H__
+#define __LAYER_IMAGE_H__
+
+#include "nnx_layer.h"
+#include <pmsis.h>
+
+// Layout of the layer image, has to match NnxLayerImage in NnxTestClasses.py.
+// All the fields are little-endian 32-bit words and all the offsets are
+// relative to the start of the image.
+#define LAYER_IMAGE_MAGIC (0x4c584e4e) // "NNXL"
+#define LAYER_IMAGE_VERSION (2)
+
+typedef struct {
+  uint32_t magic;
+  uint32_t version;
+  uint32_t num_layers;
+  // Size of the whole image in bytes
+  uint32_t size;
+} layer_image_header_t;
+
+typedef struct {
+  uint32_t offset;
+  // In bytes, 0 if the layer doesn't have the vector
+  uint32_t size;
+} layer_image_vector_t;
+
+// The configuration fields of layer_t from input_height to has_relu
+#define LAYER_IMAGE_CONF_FIELDS (30)
+
+typedef struct {
+  // Zero terminated
+  layer_image_vector_t name;
+  uint32_t conf[LAYER_IMAGE_CONF_FIELDS];
+  layer_image_vector_t input;
+  layer_image_vector_t weight;
+  layer_image_vector_t scale;
+  layer_image_vector_t bias;
+  layer_image_vector_t golden_output;
+  layer_image_vector_t golden_output_crc;
+} layer_image_entry_t;
+
+// Load the layers from the image at LAYER_IMAGE_PATH. The data of the layers
+// stays in L2 and gets staged into vectors shared by all the layers.
+// Returns 0 on success.
+int layer_image_load(struct pi_device *cl_dev, layer_t **layers,
+                     uint32_t *num_layers);
+
+#endif // __LAYER_IMAGE_H__
@@ -21,20 +21,101 @@
 #ifndef __LAYER_UTIL_H__
 #define __LAYER_UTIL_H__
 
-#include "layer_conf.h"
+#include "nnx_layer.h"
 #include <pmsis.h>
 
-static void layer_info() {
+static void layer_info(const layer_t *layer) {
   printf("Layer info:\n"
          " - input: (%dx%dx%d)\n"
          " - output: (%dx%dx%d)\n"
          " - weight: (%dx%dx%dx%d)\n"
          " - stride: (%dx%d)\n"
          " - padding: (%dx%dx%dx%d)\n",
-         INPUT_HEIGHT, INPUT_WIDTH, INPUT_CHANNEL, OUTPUT_HEIGHT, OUTPUT_WIDTH,
-         OUTPUT_CHANNEL, WEIGHT_CHANNEL_OUT, WEIGHT_HEIGHT, WEIGHT_WIDTH,
-         WEIGHT_CHANNEL_IN, STRIDE_HEIGHT, STRIDE_WIDTH, PADDING_TOP,
-         PADDING_BOTTOM, PADDING_LEFT, PADDING_RIGHT);
+         layer->input_height, layer->input_width, layer->input_channel,
+         layer->output_height, layer->output_width, layer->output_channel,
+         layer->weight_channel_out, layer->weight_height, layer->weight_width,
+         layer->weight_channel_in, layer->stride_height, layer->stride_width,
+         layer->padding_top, layer->padding_bottom, layer->padding_left,
+         layer->padding_right);
+}
+
+static int32_t output_element(const layer_t *layer, const void *vector, int i) {
+  if (layer->output_bits == 32) {
+    return ((const int32_t *)vector)[i];
+  } else if (layer->output_signed) {
+    return ((const int8_t *)vector)[i];
+  } else {
+    return ((const uint8_t *)vector)[i];
+  }
+}
+
+// CRC-32 as computed by zlib, a nibble at a time to keep the table small
+static uint32_t crc32(const uint8_t *data, uint32_t size) {
+  static const uint32_t table[16] = {
+      0x00000000, 0x1db71064, 0x3b6e20c8, 0x26d930ac, 0x76dc4190, 0x6b6b51f4,
+      0x4db26158, 0x5005713c, 0xedb88320, 0xf00f9344, 0xd6d6a3e8, 0xcb61b38c,
+      0x9b64c2b0, 0x86d3d2d4, 0xa00ae278, 0xbdbdf21c};
+  uint32_t crc = 0xffffffff;
+  for (uint32_t i = 0; i < size; i++) {
+    crc ^= data[i];
+    crc = (crc >> 4) ^ table[crc & 0xf];
+    crc = (crc >> 4) ^ table[crc & 0xf];
+  }
+  return ~crc;
+}
+
+// Returns the number of wrong rows
+static int check_output_crc(const layer_t *layer) {
+  printf("Checking the output vector rows:\n");
+
+  const uint32_t row_size = layer_output_size(layer) / layer->output_height;
+  int n_err = 0;
+  for (uint32_t i = 0; i < layer->output_height; i++) {
+    const uint32_t value =
+        crc32((const uint8_t *)layer->output + i * row_size, row_size);
+    if (value != layer->golden_output_crc[i]) {
+      printf("ERROR: wrong checksum of output row %d: 0x%08x vs. golden: "
+             "0x%08x\n",
+             i, value, layer->golden_output_crc[i]);
+      n_err++;
+    }
+  }
+
+  if (n_err == 0)
+    printf("> Success! No errors found.\n");
+  else
+    printf("> Failure! Found %d/%d errors.\n", n_err, layer->output_height);
+
+  return n_err;
+}
+
+// Returns the number of errors
+static int check_output(const layer_t *layer) {
+  if (layer->golden_output_crc != NULL) {
+    return check_output_crc(layer);
+  }
+
+  printf("Checking the output vector:\n");
+
+  const int size =
+      layer->output_height * layer->output_width * layer->output_channel;
+  int n_err = 0;
+  for (int i = 0; i < size; i++) {
+    const int32_t value = output_element(layer, layer->output, i);
+    const int32_t golden = output_element(layer, layer->golden_output, i);
+    if (value != golden) {
+      printf("ERROR: wrong value of output @ %d: %d vs. golden: %d\n", i, value,
+             golden);
+      n_err++;
+    }
+  }
+
+  if (n_err == 0)
+    printf("> Success! No errors found.\n");
+  else
+    printf("> Failure! Found %d/%d errors.\n", n_err, size);
+
+  return n_err;
 }
 
 #endif // __LAYER_UTIL_H__
@@ -21,6 +21,78 @@
 #ifndef __NNX_LAYER_H__
 #define __NNX_LAYER_H__
 
-void execute_nnx_layer(void *unused_args);
+#include <stdint.h>
+
+typedef struct {
+  // Vector accessed by the accelerator
+  void *data;
+  // Initial value copied into data before the layer executes,
+  // NULL if data is initialized in place
+  const void *src;
+  // Size of src in bytes
+  uint32_t size;
+} layer_vector_t;
+
+typedef struct {
+  const char *name;
+
+  uint32_t input_height;
+  uint32_t input_width;
+  uint32_t input_channel;
+  uint32_t input_signed;
+  uint32_t input_bits;
+
+  uint32_t output_height;
+  uint32_t output_width;
+  uint32_t output_channel;
+  uint32_t output_signed;
+  uint32_t output_bits;
+
+  uint32_t weight_height;
+  uint32_t weight_width;
+  uint32_t weight_channel_in;
+  uint32_t weight_channel_out;
+  uint32_t weight_bits;
+  int32_t weight_offset;
+
+  uint32_t scale_bits;
+  uint32_t bias_bits;
+
+  uint32_t padding_top;
+  uint32_t padding_bottom;
+  uint32_t padding_left;
+  uint32_t padding_right;
+  uint32_t padding_value;
+
+  uint32_t stride_height;
+  uint32_t stride_width;
+
+  uint32_t groups;
+  uint32_t outshift;
+  uint32_t has_norm_quant;
+  uint32_t has_bias;
+  uint32_t has_relu;
+
+  layer_vector_t input;
+  layer_vector_t weight;
+  layer_vector_t scale;
+  layer_vector_t bias;
+  void *output;
+  // Either the whole golden output, or the CRC32 digest of every output row
+  // with the other one NULL
+  const void *golden_output;
+  const uint32_t *golden_output_crc;
+} layer_t;
+
+static inline uint32_t layer_output_size(const layer_t *layer) {
+  return layer->output_height * layer->output_width * layer->output_channel *
+         layer->output_bits / 8;
+}
+
+// Copy the staged vectors of the layer into place and clear its output
+void load_nnx_layer(const layer_t *layer);
+
+// Expects a pointer to the layer_t to execute
+void execute_nnx_layer(void *layer);
 
 #endif // __NNX_LAYER_H__
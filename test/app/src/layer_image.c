@@ -0,0 +1,206 @@
+/*
+ * Luka Macan <luka.macan@unibo.it>
+ *
+ * Copyright 2023 ETH Zurich and University of Bologna
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+#include "layer_conf.h"
+
+// Only part of the app built with --layer-image
+#ifdef LAYER_IMAGE
+
+#include "layer_image.h"
+#include <bsp/fs.h>
+#include <bsp/fs/hostfs.h>
+#include <stddef.h>
+#include <string.h>
+
+_Static_assert(offsetof(layer_t, has_relu) - offsetof(layer_t, input_height) ==
+                   (LAYER_IMAGE_CONF_FIELDS - 1) * sizeof(uint32_t),
+               "The layer image conf doesn't match layer_t");
+
+#if defined WMEM_SRAM
+static __attribute__((section(
+    ".weightmem_sram"))) uint8_t weight_mem[LAYER_IMAGE_WEIGHT_MEM_CAPACITY];
+#elif defined WMEM_MRAM
+static __attribute__((section(
+    ".weightmem_mram"))) uint8_t weight_mem[LAYER_IMAGE_WEIGHT_MEM_CAPACITY];
+#endif
+
+static int image_read(uint8_t **image) {
+  struct pi_device fs;
+  struct pi_hostfs_conf conf;
+  pi_hostfs_conf_init(&conf);
+  pi_open_from_conf(&fs, &conf);
+  if (pi_fs_mount(&fs)) {
+    printf("ERROR: Failed to mount the host filesystem.\n");
+    return -1;
+  }
+
+  int status = -1;
+  pi_fs_file_t *file = pi_fs_open(&fs, LAYER_IMAGE_PATH, PI_FS_FLAGS_READ);
+  if (file == NULL) {
+    printf("ERROR: Failed to open the layer image " LAYER_IMAGE_PATH ".\n");
+    goto unmount;
+  }
+
+  layer_image_header_t header;
+  if (pi_fs_read(file, &header, sizeof(header)) != sizeof(header) ||
+      header.magic != LAYER_IMAGE_MAGIC ||
+      header.version != LAYER_IMAGE_VERSION) {
+    printf("ERROR: Invalid layer image header.\n");
+    goto close;
+  }
+
+  *image = pi_l2_malloc(header.size);
+  if (*image == NULL) {
+    printf("ERROR: Failed to allocate %d bytes for the layer image.\n",
+           header.size);
+    goto close;
+  }
+  memcpy(*image, &header, sizeof(header));
+  const uint32_t rest = header.size - sizeof(header);
+  if (pi_fs_read(file, *image + sizeof(header), rest) != rest) {
+    printf("ERROR: Truncated layer image.\n");
+    pi_l2_free(*image, header.size);
+    goto close;
+  }
+  status = 0;
+
+close:
+  pi_fs_close(file);
+unmount:
+  pi_fs_unmount(&fs);
+  return status;
+}
+
+static uint32_t max_size(const layer_image_entry_t *entries,
+                         uint32_t num_layers, size_t field) {
+  uint32_t retval = 0;
+  for (uint32_t i = 0; i < num_layers; i++) {
+    const layer_image_vector_t *vector =
+        (const layer_image_vector_t *)((const uint8_t *)&entries[i] + field);
+    if (vector->size > retval) {
+      retval = vector->size;
+    }
+  }
+  return retval;
+}
+
+static int shared_l1_malloc(struct pi_device *cl_dev, uint32_t size,
+                            void **vector) {
+  *vector = NULL;
+  if (size > 0 && (*vector = pi_cl_l1_malloc(cl_dev, size)) == NULL) {
+    printf("ERROR: Failed to allocate %d bytes of L1.\n", size);
+    return -1;
+  }
+  return 0;
+}
+
+static const void *golden_decode(const uint8_t *image,
+                                 const layer_image_vector_t *vector) {
+  return vector->size == 0 ? NULL : image + vector->offset;
+}
+
+static layer_vector_t vector_decode(const uint8_t *image,
+                                    const layer_image_vector_t *vector,
+                                    void *data) {
+  if (vector->size == 0) {
+    return (layer_vector_t){.data = NULL, .src = NULL, .size = 0};
+  }
+  return (layer_vector_t){
+      .data = data, .src = image + vector->offset, .size = vector->size};
+}
+
+int layer_image_load(struct pi_device *cl_dev, layer_t **layers,
+                     uint32_t *num_layers) {
+  uint8_t *image;
+  if (image_read(&image)) {
+    return -1;
+  }
+
+  const layer_image_header_t *header = (const layer_image_header_t *)image;
+  const layer_image_entry_t *entries =
+      (const layer_image_entry_t *)(image + sizeof(layer_image_header_t));
+  *num_layers = header->num_layers;
+
+  *layers = pi_l2_malloc(*num_layers * sizeof(layer_t));
+  if (*layers == NULL) {
+    printf("ERROR: Failed to allocate the layers.\n");
+    return -1;
+  }
+
+  // The golden output might only be there as row digests
+  uint32_t output_size = 0;
+  for (uint32_t i = 0; i < *num_layers; i++) {
+    layer_t *layer = &(*layers)[i];
+    memcpy(&layer->input_height, entries[i].conf, sizeof(entries[i].conf));
+    if (layer_output_size(layer) > output_size) {
+      output_size = layer_output_size(layer);
+    }
+  }
+
+  // Vectors big enough for any of the layers
+  void *input, *output, *weight, *scale, *bias;
+  if (shared_l1_malloc(
+          cl_dev,
+          max_size(entries, *num_layers, offsetof(layer_image_entry_t, input)),
+          &input) ||
+      shared_l1_malloc(cl_dev, output_size, &output) ||
+      shared_l1_malloc(
+          cl_dev,
+          max_size(entries, *num_layers, offsetof(layer_image_entry_t, scale)),
+          &scale) ||
+      shared_l1_malloc(
+          cl_dev,
+          max_size(entries, *num_layers, offsetof(layer_image_entry_t, bias)),
+          &bias)) {
+    return -1;
+  }
+
+  const uint32_t weight_size =
+      max_size(entries, *num_layers, offsetof(layer_image_entry_t, weight));
+#if defined WMEM_SRAM || defined WMEM_MRAM
+  if (weight_size > LAYER_IMAGE_WEIGHT_MEM_CAPACITY) {
+    printf("ERROR: The weights don't fit into the weight memory.\n");
+    return -1;
+  }
+  weight = weight_mem;
+#else
+  if (shared_l1_malloc(cl_dev, weight_size, &weight)) {
+    return -1;
+  }
+#endif
+
+  for (uint32_t i = 0; i < *num_layers; i++) {
+    const layer_image_entry_t *entry = &entries[i];
+    layer_t *layer = &(*layers)[i];
+
+    layer->name = (const char *)(image + entry->name.offset);
+    layer->input = vector_decode(image, &entry->input, input);
+    layer->weight = vector_decode(image, &entry->weight, weight);
+    layer->scale = vector_decode(image, &entry->scale, scale);
+    layer->bias = vector_decode(image, &entry->bias, bias);
+    layer->output = output;
+    layer->golden_output = golden_decode(image, &entry->golden_output);
+    layer->golden_output_crc = golden_decode(image, &entry->golden_output_crc);
+  }
+
+  return 0;
+}
+
+#endif // LAYER_IMAGE
@@ -20,13 +20,13 @@
 
 #include <pmsis.h>
 
+#include "layer_conf.h"
 #include "layer_util.h"
 #include "nnx_layer.h"
-#include "output.h"
-#ifdef NNX_NEUREKA_V2
-#include "string.h"
-#include "weight.h"
-#include "weight_l2.h"
+#ifdef LAYER_IMAGE
+#include "layer_image.h"
+#else
+#include "layers.h"
 #endif
 
 int main() {
@@ -38,25 +38,42 @@ int main() {
 
   printf("\nAccelerator: " NNX_ACCELERATOR "\n");
 
-  printf("\n");
-  layer_info();
-
-#ifdef NNX_NEUREKA_V2
-  // We have to initialize the mram/sram weight memory from l2
-  memcpy((void *)weight, (void *)weight_l2, WEIGHT_SIZE);
-#endif
-
   pi_cluster_conf_init(&cl_conf);
   pi_open_from_conf(&cl_dev, &cl_conf);
   if (pi_cluster_open(&cl_dev)) {
     printf("ERROR: Failed to open cluster.\n");
     pmsis_exit(-1);
   }
-  pi_cluster_send_task_to_cl(
-      &cl_dev, pi_cluster_task(&cl_task, execute_nnx_layer, NULL));
 
-  printf("\n");
-  check_output();
+#ifdef LAYER_IMAGE
+  layer_t *layers;
+  uint32_t num_layers;
+  if (layer_image_load(&cl_dev, &layers, &num_layers)) {
+    printf("ERROR: Failed to load the layer image.\n");
+    pmsis_exit(-1);
+  }
+#else
+  const uint32_t num_layers = NUM_LAYERS;
+#endif
+
+  // The markers delimit the output of each layer for the test scripts
+  for (uint32_t i = 0; i < num_layers; i++) {
+    const layer_t *layer = &layers[i];
+
+    printf("\nLayer %s starting\n", layer->name);
+
+    printf("\n");
+    layer_info(layer);
+
+    load_nnx_layer(layer);
+    pi_cluster_send_task_to_cl(
+        &cl_dev, pi_cluster_task(&cl_task, execute_nnx_layer, (void *)layer));
+
+    printf("\n");
+    check_output(layer);
+
+    printf("\nLayer %s finished\n", layer->name);
+  }
 
   pi_cluster_close(&cl_dev);
 
@@ -151,42 +151,35 @@ typedef neureka_v2_task_flag_e nnx_task_flag_e;
 
 #endif // NNX_NE16 || NNX_NEUREKA || NNX_NEUREKA_V2
 
-// Generated headers
-#include "input.h"
-#include "output.h"
-#include "weight.h"
-
+// Generated header
 #include "layer_conf.h"
 
-// The HAS_NORM_QUANT and HAS_BIAS are defined in layer_conf.h
-#if HAS_NORM_QUANT != 0
-#include "scale.h"
-#if HAS_BIAS != 0
-#include "bias.h"
-#endif
-#endif
+#include <string.h>
 
-static void task_prepare(nnx_task_t *task) {
+static void task_prepare(nnx_task_t *task, const layer_t *layer) {
   nnx_task_init(task);
 #if defined NNX_NEUREKA || defined NNX_NEUREKA_V2
-  nnx_task_set_op_to_conv(task, WEIGHT_HEIGHT, GROUPS > 1);
+  nnx_task_set_op_to_conv(task, layer->weight_height, layer->groups > 1);
 #else
-  nnx_task_set_op_to_conv(task, WEIGHT_HEIGHT, GROUPS > 1, STRIDE_HEIGHT);
+  nnx_task_set_op_to_conv(task, layer->weight_height, layer->groups > 1,
+                          layer->stride_height);
 #endif
-  nnx_task_set_bits(task, INPUT_BITS, OUTPUT_BITS, WEIGHT_BITS);
+  nnx_task_set_bits(task, layer->input_bits, layer->output_bits,
+                    layer->weight_bits);
 
 #if defined NNX_NE16 || defined NNX_NEUREKA
-  nnx_task_set_weight_offset(task, weightOffsetModeLayerWise, WEIGHT_OFFSET);
+  nnx_task_set_weight_offset(task, weightOffsetModeLayerWise,
+                             layer->weight_offset);
 #elif defined NNX_NEUREKA_V2
-  nnx_task_set_weight_offset(task, WEIGHT_OFFSET);
+  nnx_task_set_weight_offset(task, layer->weight_offset);
 #endif
 
 #ifdef NNX_NEUREKA
-#if INPUT_SIGNED == 1
-  neureka_task_set_input_signed(task);
-#else
-  neureka_task_set_input_unsigned(task);
-#endif
+  if (layer->input_signed) {
+    neureka_task_set_input_signed(task);
+  } else {
+    neureka_task_set_input_unsigned(task);
+  }
 #if defined WMEM_SRAM || defined WMEM_MRAM
   neureka_task_set_weight_source(task, neurekaWeightSourceWmem);
 #else
@@ -195,16 +188,16 @@ static void task_prepare(nnx_task_t *task) {
 #endif
 
 #ifdef NNX_NEUREKA_V2
-#if INPUT_SIGNED == 1
-  neureka_v2_task_set_activation_signed(task);
-#else
-  neureka_v2_task_set_activation_unsigned(task);
-#endif
-#if OUTPUT_SIGNED == 1
-  neureka_v2_task_set_outfeat_signed(task);
-#else
-  neureka_v2_task_set_outfeat_unsigned(task);
-#endif
+  if (layer->input_signed) {
+    neureka_v2_task_set_activation_signed(task);
+  } else {
+    neureka_v2_task_set_activation_unsigned(task);
+  }
+  if (layer->output_signed) {
+    neureka_v2_task_set_outfeat_signed(task);
+  } else {
+    neureka_v2_task_set_outfeat_unsigned(task);
+  }
 #if defined WMEM_SRAM || defined WMEM_MRAM
   neureka_v2_task_set_weight_source(task, neurekaV2WeightSourceWmem);
 #else
@@ -212,60 +205,59 @@ static void task_prepare(nnx_task_t *task) {
 #endif
 #endif
 
-  const uint32_t w_in_stride = INPUT_CHANNEL * INPUT_BITS / 8;
-  const uint32_t h_in_stride = INPUT_WIDTH * w_in_stride;
-  const uint32_t w_out_stride = OUTPUT_CHANNEL * OUTPUT_BITS / 8;
-  const uint32_t h_out_stride = OUTPUT_WIDTH * w_out_stride;
-
-#if STRIDE_HEIGHT == 2 && STRIDE_WIDTH == 2
-  nnx_task_set_dims_stride2x2(
-      task, INPUT_HEIGHT, INPUT_WIDTH, INPUT_CHANNEL, h_in_stride, w_in_stride,
-      OUTPUT_HEIGHT, OUTPUT_WIDTH, OUTPUT_CHANNEL, h_out_stride, w_out_stride,
-      WEIGHT_HEIGHT, WEIGHT_WIDTH, PADDING_TOP, PADDING_BOTTOM, PADDING_LEFT,
-      PADDING_RIGHT);
-#else
-  nnx_task_set_dims(task, INPUT_WIDTH, INPUT_CHANNEL, h_in_stride, w_in_stride,
-                    OUTPUT_HEIGHT, OUTPUT_WIDTH, OUTPUT_CHANNEL, h_out_stride,
-                    w_out_stride, PADDING_TOP, PADDING_BOTTOM, PADDING_LEFT,
-                    PADDING_RIGHT);
-#endif
-
-  nnx_task_set_addr_conv(task, (uint32_t)input, INPUT_WIDTH, w_in_stride,
-                         PADDING_TOP, PADDING_LEFT, (uint32_t)output,
-                         (uint32_t)weight);
+  const uint32_t w_in_stride = layer->input_channel * layer->input_bits / 8;
+  const uint32_t h_in_stride = layer->input_width * w_in_stride;
+  const uint32_t w_out_stride = layer->output_channel * layer->output_bits / 8;
+  const uint32_t h_out_stride = layer->output_width * w_out_stride;
 
-#if HAS_NORM_QUANT == 1
-#if SCALE_BITS == 8
-  const nnx_norm_mode_e normMode = normMode8Bit;
-#elif SCALE_BITS == 32
-  const nnx_norm_mode_e normMode = normMode32Bit;
-#endif
-
-  const nnx_task_flag_e flag_bias =
-      HAS_BIAS ? nnxTaskFlagTrue : nnxTaskFlagFalse;
-#if HAS_BIAS == 1
-  const uint32_t bias_addr = (uint32_t)bias;
-#else
-  const uint32_t bias_addr = (uint32_t)NULL;
+#ifdef NNX_NE16
+  if (layer->stride_height == 2 && layer->stride_width == 2) {
+    nnx_task_set_dims_stride2x2(
+        task, layer->input_height, layer->input_width, layer->input_channel,
+        h_in_stride, w_in_stride, layer->output_height, layer->output_width,
+        layer->output_channel, h_out_stride, w_out_stride, layer->weight_height,
+        layer->weight_width, layer->padding_top, layer->padding_bottom,
+        layer->padding_left, layer->padding_right);
+  } else
 #endif
-
-  nnx_quant_function_e quant_function =
-      HAS_RELU ? quantFunctionRelu : quantFunctionIdentity;
-
-  nnx_task_set_norm_quant(task,
-                          (nnx_quant_t){.shift_amount = OUTSHIFT,
-                                        .function = quant_function,
-                                        .flag_rounding = nnxTaskFlagFalse},
-                          (nnx_norm_t){.mode = normMode,
-                                       .flag_bias = flag_bias,
-                                       .flag_shift = nnxTaskFlagFalse});
-
-  nnx_task_set_addr_norm_quant(task, (uint32_t)scale, (uint32_t)NULL,
-                               bias_addr);
-#endif // HAS_NORM_QUANT
+  {
+    nnx_task_set_dims(task, layer->input_width, layer->input_channel,
+                      h_in_stride, w_in_stride, layer->output_height,
+                      layer->output_width, layer->output_channel, h_out_stride,
+                      w_out_stride, layer->padding_top, layer->padding_bottom,
+                      layer->padding_left, layer->padding_right);
+  }
+
+  nnx_task_set_addr_conv(task, (uint32_t)layer->input.data, layer->input_width,
+                         w_in_stride, layer->padding_top, layer->padding_left,
+                         (uint32_t)layer->output, (uint32_t)layer->weight.data);
+
+  if (layer->has_norm_quant) {
+    const nnx_norm_mode_e normMode =
+        layer->scale_bits == 32 ? normMode32Bit : normMode8Bit;
+
+    const nnx_task_flag_e flag_bias =
+        layer->has_bias ? nnxTaskFlagTrue : nnxTaskFlagFalse;
+    const uint32_t bias_addr =
+        layer->has_bias ? (uint32_t)layer->bias.data : (uint32_t)NULL;
+
+    nnx_quant_function_e quant_function =
+        layer->has_relu ? quantFunctionRelu : quantFunctionIdentity;
+
+    nnx_task_set_norm_quant(task,
+                            (nnx_quant_t){.shift_amount = layer->outshift,
+                                          .function = quant_function,
+                                          .flag_rounding = nnxTaskFlagFalse},
+                            (nnx_norm_t){.mode = normMode,
+                                         .flag_bias = flag_bias,
+                                         .flag_shift = nnxTaskFlagFalse});
+
+    nnx_task_set_addr_norm_quant(task, (uint32_t)layer->scale.data,
+                                 (uint32_t)NULL, bias_addr);
+  }
 }
 
-static void task_execute(nnx_task_t *task) {
+static void task_execute(nnx_task_t *task, const layer_t *layer) {
   const nnx_dev_t *dev = nnx_bsp_get_dev();
 
 #if __PLATFORM__ == ARCHI_PLATFORM_GVSOC
@@ -277,13 +269,17 @@ static void task_execute(nnx_task_t *task) {
 
   nnx_dispatch_wait(dev);
 
-#if STRIDE_HEIGHT == 2 && STRIDE_WIDTH == 2
-  nnx_dispatch_stride2x2(dev, task, INPUT_WIDTH, INPUT_CHANNEL, OUTPUT_HEIGHT,
-                         OUTPUT_WIDTH, OUTPUT_CHANNEL, WEIGHT_HEIGHT,
-                         WEIGHT_WIDTH);
-#else
-  nnx_dispatch(dev, task);
+#ifdef NNX_NE16
+  if (layer->stride_height == 2 && layer->stride_width == 2) {
+    nnx_dispatch_stride2x2(dev, task, layer->input_width, layer->input_channel,
+                           layer->output_height, layer->output_width,
+                           layer->output_channel, layer->weight_height,
+                           layer->weight_width);
+  } else
 #endif
+  {
+    nnx_dispatch(dev, task);
+  }
 
   nnx_resolve_wait(dev, task);
 
@@ -294,8 +290,23 @@ static void task_execute(nnx_task_t *task) {
 #endif
 }
 
-void execute_nnx_layer(void *args) {
+static void vector_load(const layer_vector_t *vector) {
+  if (vector->src != NULL) {
+    memcpy(vector->data, vector->src, vector->size);
+  }
+}
+
+void load_nnx_layer(const layer_t *layer) {
+  vector_load(&layer->input);
+  vector_load(&layer->weight);
+  vector_load(&layer->scale);
+  vector_load(&layer->bias);
+  // Don't let the output of a previous layer pass the check
+  memset(layer->output, 0, layer_output_size(layer));
+}
+
+void execute_nnx_layer(void *layer) {
   nnx_task_t task;
-  task_prepare(&task);
-  task_execute(&task);
+  task_prepare(&task, (const layer_t *)layer);
+  task_execute(&task, (const layer_t *)layer);
 }
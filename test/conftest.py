@@ -17,14 +17,22 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import os
-from typing import Union
+from typing import Dict, Iterator, List, Optional, Union
 
-import pydantic
 import pytest
 
-from NnxBuildFlow import CmakeBuildFlow, NnxBuildFlowName
+from NnxBackend import NnxBackend
+from NnxBuildFlow import (
+    CmakeBuildFlow,
+    NnxBuildFlow,
+    NnxBuildFlowName,
+    NnxRunWatchdog,
+)
+from NnxCache import NnxCache
+from NnxCollectionCache import NnxCollectionCache
 from NnxMapping import NnxMapping, NnxName
-from NnxTestClasses import NnxTest, NnxTestGenerator, NnxWmem
+from NnxTestClasses import NnxOutputCheck, NnxTest, NnxTestGenerator, NnxWmem
+from NnxTestPipeline import NnxTestPipeline
 from TestClasses import implies
 
 
@@ -60,6 +68,86 @@ def pytest_addoption(parser):
         default=False,
         help="Save the generated test data to their respective folders.",
     )
+    parser.addoption(
+        "--regenerate-stale",
+        dest="regenerate_stale",
+        action="store_true",
+        default=False,
+        help="Only regenerate the tests whose data was generated by other versions "
+        "of the generator or the functional model, or from another configuration.",
+    )
+    parser.addoption(
+        "--backend",
+        dest="backend",
+        type=NnxBackend,
+        choices=list(NnxBackend),
+        default=NnxTest.DEFAULT_BACKEND,
+        help="Array library that generates and loads the test data. "
+        "The numpy backend generates the same data without torch. "
+        f"Default: {NnxTest.DEFAULT_BACKEND}",
+    )
+    parser.addoption(
+        "--golden-cache",
+        dest="golden_cache",
+        type=str,
+        default=NnxTestGenerator.GOLDEN_CACHE_DIR,
+        help=f"Path to the golden cache directory. Default: {NnxTestGenerator.GOLDEN_CACHE_DIR}",
+    )
+    parser.addoption(
+        "--no-golden-cache",
+        dest="no_golden_cache",
+        action="store_true",
+        default=False,
+        help="Always recompute the test data instead of using the golden cache.",
+    )
+    parser.addoption(
+        "--collection-cache",
+        dest="collection_cache",
+        type=str,
+        default=NnxCollectionCache.DEFAULT_DIR,
+        help="Path to the directory of the cached test collections, one per test directory. "
+        f"Default: {NnxCollectionCache.DEFAULT_DIR}",
+    )
+    parser.addoption(
+        "--no-collection-cache",
+        dest="no_collection_cache",
+        action="store_true",
+        default=False,
+        help="Always load every test on collection instead of only the changed ones.",
+    )
+    parser.addoption(
+        "--build-cache",
+        dest="build_cache",
+        type=str,
+        default=NnxBuildFlow.ARTIFACT_CACHE_DIR,
+        help="Path to the directory of the cached build outputs, keyed by the generated sources, "
+        f"the accelerator, the build flow, and the toolchain. Default: {NnxBuildFlow.ARTIFACT_CACHE_DIR}",
+    )
+    parser.addoption(
+        "--build-cache-max-size",
+        dest="build_cache_max_size",
+        type=int,
+        default=NnxCache.DEFAULT_MAX_SIZE >> 20,
+        help="Size in MiB over which the least recently used build outputs get evicted. "
+        f"Default: {NnxCache.DEFAULT_MAX_SIZE >> 20}",
+    )
+    parser.addoption(
+        "--no-build-cache",
+        dest="no_build_cache",
+        action="store_true",
+        default=False,
+        help="Always build the app instead of restoring it from the build cache.",
+    )
+    parser.addoption(
+        "--result-cache",
+        dest="result_cache",
+        nargs="?",
+        const=NnxBuildFlow.RESULT_CACHE_DIR,
+        default=None,
+        help="Reuse the outputs of earlier simulations of the same app, simulator, command, "
+        "and runtime data instead of simulating again, and save the new ones in the given directory. "
+        f"Default: {NnxBuildFlow.RESULT_CACHE_DIR}",
+    )
     parser.addoption(
         "--build-flow",
         dest="buildFlowName",
@@ -68,6 +156,71 @@ def pytest_addoption(parser):
         default=NnxBuildFlowName.make,
         help="Choose the build flow. Default: make",
     )
+    parser.addoption(
+        "--binary-data",
+        dest="binary_data",
+        action="store_true",
+        default=False,
+        help="Emit the test data as binary files included by an assembler stub instead of C initializers.",
+    )
+    parser.addoption(
+        "--output-check",
+        dest="output_check",
+        type=NnxOutputCheck,
+        choices=list(NnxOutputCheck),
+        default=NnxOutputCheck.golden,
+        help="Check the output against a golden copy, or against CRC32 digests of its rows "
+        "which take less L2 but only tell the wrong rows. Default: golden",
+    )
+    parser.addoption(
+        "--layer-image",
+        dest="layer_image",
+        action="store_true",
+        default=False,
+        help="Build a generic app once and load the tests' layers from a binary image at runtime.",
+    )
+    parser.addoption(
+        "--batch-size",
+        dest="batch_size",
+        type=int,
+        default=1,
+        help="Number of tests built into a single app and run with a single simulation. "
+        "With pytest-xdist, use --dist loadgroup to run a batch on a single worker. Default: 1",
+    )
+    parser.addoption(
+        "--pipeline-depth",
+        dest="pipeline_depth",
+        type=int,
+        default=0,
+        help="Generate and build up to this many of the next batches of tests, each in its own "
+        "app/build_pipeline_<i> directory, while the current one simulates. "
+        "Not supported with pytest-xdist. Default: 0, build and simulate in sequence",
+    )
+    parser.addoption(
+        "--sim-timeout",
+        dest="sim_timeout",
+        type=float,
+        default=None,
+        help="Time limit of a simulation in seconds, after which it gets killed and its tests fail. "
+        "Default: no limit",
+    )
+    parser.addoption(
+        "--sim-error-limit",
+        dest="sim_error_limit",
+        type=int,
+        default=NnxRunWatchdog.DEFAULT_ERROR_LIMIT,
+        help="Number of errors printed by a simulation after which it gets stopped. "
+        f"Default: {NnxRunWatchdog.DEFAULT_ERROR_LIMIT}",
+    )
+    parser.addoption(
+        "--no-early-stop",
+        dest="no_early_stop",
+        action="store_true",
+        default=False,
+        help="Let the simulations run to the end instead of stopping them as soon as a check fails "
+        "or the error limit is reached. With --batch-size, only the error limit stops a simulation, "
+        "which skips the batch's remaining tests.",
+    )
     parser.addoption(
         "--wmem",
         dest="wmem",
@@ -78,13 +231,27 @@ def pytest_addoption(parser):
     )
 
 
+_nnx_batches_key = pytest.StashKey[Dict[str, List[str]]]()
+# Batches of the collected tests in the order they run
+_nnx_run_batches_key = pytest.StashKey[List[List[str]]]()
+
+
 @pytest.fixture
 def nnxName(request) -> NnxName:
     return request.config.getoption("--accelerator")
 
 
 @pytest.fixture
-def buildFlowName(request) -> NnxBuildFlowName:
+def workdir() -> Optional[str]:
+    """Private build tree of the pytest-xdist worker, None when not distributed"""
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker is None:
+        return None
+    return os.path.join("app", f"build_{worker}")
+
+
+@pytest.fixture
+def buildFlowName(request, workdir: Optional[str]) -> NnxBuildFlowName:
     nnxName = request.config.getoption("--accelerator")
     buildFlowName = request.config.getoption("buildFlowName")
 
@@ -93,11 +260,27 @@ def buildFlowName(request) -> NnxBuildFlowName:
     ), "The cmake build flow has been tested only with the neureka_v2 accelerator"
 
     if buildFlowName == NnxBuildFlowName.cmake:
-        CmakeBuildFlow(nnxName).prepare()
+        CmakeBuildFlow(nnxName, workdir).prepare()
 
     return buildFlowName
 
 
+@pytest.fixture
+def buildCache(request) -> Optional[NnxCache]:
+    if request.config.getoption("no_build_cache"):
+        return None
+    return NnxCache(
+        request.config.getoption("build_cache"),
+        max_size=request.config.getoption("build_cache_max_size") << 20,
+    )
+
+
+@pytest.fixture
+def resultCache(request) -> Optional[NnxCache]:
+    result_cache = request.config.getoption("result_cache")
+    return None if result_cache is None else NnxCache(result_cache)
+
+
 @pytest.fixture
 def wmem(request) -> NnxWmem:
     _wmem = request.config.getoption("wmem")
@@ -109,6 +292,75 @@ def wmem(request) -> NnxWmem:
     return _wmem
 
 
+@pytest.fixture
+def backend(request) -> NnxBackend:
+    return request.config.getoption("backend")
+
+
+@pytest.fixture
+def binaryData(request) -> bool:
+    return request.config.getoption("binary_data")
+
+
+@pytest.fixture
+def outputCheck(request) -> NnxOutputCheck:
+    return request.config.getoption("output_check")
+
+
+@pytest.fixture
+def nnxBatch(request, nnxTestName: str) -> List[str]:
+    """Tests that get built and run together with the nnxTestName"""
+    return request.config.stash[_nnx_batches_key].get(nnxTestName, [nnxTestName])
+
+
+@pytest.fixture(scope="session")
+def batchResults() -> Dict[str, Union[str, Exception]]:
+    """Outputs of the runs, or their errors, of tests whose batch already ran"""
+    return {}
+
+
+@pytest.fixture(scope="session")
+def nnxPipeline(request) -> Iterator[Optional[NnxTestPipeline]]:
+    depth = request.config.getoption("pipeline_depth")
+    assert depth >= 0, f"Invalid pipeline depth {depth}"
+    if depth == 0:
+        yield None
+        return
+
+    assert (
+        "PYTEST_XDIST_WORKER" not in os.environ
+    ), "The pipeline doesn't know which tests a pytest-xdist worker runs"
+    pipeline = NnxTestPipeline(
+        request.config.stash.get(_nnx_run_batches_key, []),
+        depth,
+        os.path.join("app", "build_pipeline_"),
+    )
+    yield pipeline
+    pipeline.close()
+
+
+@pytest.fixture
+def layerImage(request) -> bool:
+    return request.config.getoption("layer_image")
+
+
+@pytest.fixture
+def simTimeout(request) -> Optional[float]:
+    return request.config.getoption("sim_timeout")
+
+
+@pytest.fixture
+def runWatchdog(request) -> Optional[NnxRunWatchdog]:
+    if request.config.getoption("no_early_stop"):
+        return None
+    # A failed check of a batch's layer doesn't stop the simulation, so that the
+    # following layers of the batch still get checked
+    return NnxRunWatchdog(
+        error_limit=request.config.getoption("sim_error_limit"),
+        stop_on_failure=request.config.getoption("batch_size") == 1,
+    )
+
+
 def _find_test_dirs(path: Union[str, os.PathLike]):
     return [dirpath for dirpath, _, _ in os.walk(path) if NnxTest.is_test_dir(dirpath)]
 
@@ -117,37 +369,122 @@ def pytest_generate_tests(metafunc):
     test_dirs = metafunc.config.getoption("test_dirs")
     recursive = metafunc.config.getoption("recursive")
     regenerate = metafunc.config.getoption("regenerate")
+    regenerate_stale = metafunc.config.getoption("regenerate_stale")
     nnxName = metafunc.config.getoption("accelerator")
+    backend = metafunc.config.getoption("backend")
+    golden_cache = (
+        None
+        if metafunc.config.getoption("no_golden_cache")
+        else NnxCache(metafunc.config.getoption("golden_cache"))
+    )
+
+    nnxTestConfCls = NnxMapping[nnxName].testConfCls
+    collection_caches: Dict[str, NnxCollectionCache] = {}
+    if not metafunc.config.getoption("no_collection_cache"):
+        collection_caches = {
+            root: NnxCollectionCache(
+                metafunc.config.getoption("collection_cache"), root, nnxTestConfCls
+            )
+            for root in test_dirs
+        }
 
     if recursive:
         tests_dirs = test_dirs
         test_dirs = []
         for tests_dir in tests_dirs:
-            test_dirs.extend(_find_test_dirs(tests_dir))
+            if tests_dir in collection_caches:
+                found = collection_caches[tests_dir].find_test_dirs()
+            else:
+                found = _find_test_dirs(tests_dir)
+            test_dirs.extend((tests_dir, test_dir) for test_dir in found)
+    else:
+        test_dirs = [(test_dir, test_dir) for test_dir in test_dirs]
 
     # Load valid tests
     nnxTestNames = []
-    nnxTestConfCls = NnxMapping[nnxName].testConfCls
-    for test_dir in test_dirs:
-        try:
-            test = NnxTest.load(nnxTestConfCls, test_dir)
-            # (Re)generate data
-            if not test.is_valid() or regenerate:
-                test = NnxTestGenerator.from_conf(test.conf)
-                test.save_data(test_dir)
-            nnxTestNames.append(test_dir)
-        except pydantic.ValidationError as e:
-            for error in e.errors():
-                if error["type"] == "missing":
-                    raise e
+    regen_tests = []
+    for root, test_dir in test_dirs:
+        if root in collection_caches:
+            valid, error = collection_caches[root].check(test_dir)
+        else:
+            valid, error = NnxCollectionCache.check_uncached(nnxTestConfCls, test_dir)
 
+        if error is not None:
             nnxTestNames.append(
                 pytest.param(
                     test_dir,
                     marks=pytest.mark.skipif(
-                        True, reason=f"Invalid test {test_dir}: {e.errors}"
+                        True, reason=f"Invalid test {test_dir}: {error}"
                     ),
                 )
             )
+            continue
+
+        if not valid or regenerate:
+            regen_tests.append(
+                (test_dir, NnxTest.load(nnxTestConfCls, test_dir, backend))
+            )
+        elif regenerate_stale:
+            test = NnxTest.load(nnxTestConfCls, test_dir, backend)
+            if NnxTestGenerator.is_stale(test):
+                regen_tests.append((test_dir, test))
+        nnxTestNames.append(test_dir)
+
+    for collection_cache in collection_caches.values():
+        collection_cache.save()
+
+    # (Re)generate data with the method and seed each test was generated with
+    regen_groups: Dict[NnxTestGenerator.DataGenerationMethod, List] = {}
+    for test_dir, test in regen_tests:
+        method = NnxTestGenerator.stamp_method(test)
+        regen_groups.setdefault(method, []).append((test_dir, test))
+    for method, group in regen_groups.items():
+        generated = NnxTestGenerator.from_confs(
+            [test.conf for _, test in group],
+            data_generation_method=method,
+            cache=golden_cache,
+            seeds=[NnxTestGenerator.stamp_seed(test) for _, test in group],
+            backend=backend,
+        )
+        for (test_dir, _), test in zip(group, generated):
+            test.save_data(test_dir)
+
+    batch_size = metafunc.config.getoption("batch_size")
+    assert batch_size > 0, f"Invalid batch size {batch_size}"
+    validNnxTestNames = [name for name in nnxTestNames if isinstance(name, str)]
+    batches = {}
+    for i in range(0, len(validNnxTestNames), batch_size):
+        batch = validNnxTestNames[i : i + batch_size]
+        for name in batch:
+            batches[name] = batch
+    metafunc.config.stash[_nnx_batches_key] = batches
+
+    if batch_size > 1:
+        # Keep the tests of a batch on the same pytest-xdist worker
+        nnxTestNames = [
+            (
+                pytest.param(name, marks=pytest.mark.xdist_group(batches[name][0]))
+                if isinstance(name, str)
+                else name
+            )
+            for name in nnxTestNames
+        ]
 
     metafunc.parametrize("nnxTestName", nnxTestNames)
+
+
+def pytest_collection_finish(session):
+    # Only the tests left after deselection get their batches built
+    batches = session.config.stash.get(_nnx_batches_key, {})
+    run_batches: List[List[str]] = []
+    seen = set()
+    for item in session.items:
+        callspec = getattr(item, "callspec", None)
+        if callspec is None:
+            continue
+        name = callspec.params.get("nnxTestName")
+        if name not in batches or batches[name][0] in seen:
+            continue
+        seen.add(batches[name][0])
+        run_batches.append(batches[name])
+    session.config.stash[_nnx_run_batches_key] = run_batches
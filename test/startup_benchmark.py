@@ -0,0 +1,139 @@
+# Luka Macan <luka.macan@unibo.it>
+#
+# Copyright 2023 ETH Zurich and University of Bologna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+TESTGEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testgen.py")
+
+
+def _time(cmd: List[str], repeat: int, cwd: str) -> float:
+    """Best wall clock time out of repeat runs of the command"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(args) -> bool:
+    """Returns False if any of the commands exceeded its budget"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_dir = os.path.join(tmpdir, "test")
+        # The headers get generated inside app/gen of the working directory
+        subprocess.run(
+            [
+                sys.executable,
+                TESTGEN,
+                "test",
+                "-c",
+                os.path.abspath(args.conf),
+                "-t",
+                test_dir,
+                "-a",
+                args.accelerator,
+                "--backend",
+                "numpy",
+                "--tensor-format",
+                "npy",
+                "--no-golden-cache",
+            ],
+            cwd=tmpdir,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+        commands = [
+            (
+                "testgen.py --help",
+                [sys.executable, TESTGEN, "--help"],
+                args.help_budget,
+            ),
+            (
+                "testgen.py headers",
+                [
+                    sys.executable,
+                    TESTGEN,
+                    "headers",
+                    "-t",
+                    test_dir,
+                    "-a",
+                    args.accelerator,
+                ],
+                args.headers_budget,
+            ),
+        ]
+
+        ok = True
+        for name, cmd, budget in commands:
+            elapsed = _time(cmd, args.repeat, tmpdir)
+            status = "OK" if elapsed <= budget else "OVER BUDGET"
+            print(f"{name}: {elapsed:.3f}s (budget {budget:.3f}s) {status}")
+            ok = ok and elapsed <= budget
+        return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the startup time of testgen.py against a time budget."
+    )
+    parser.add_argument(
+        "-c",
+        "--conf",
+        type=str,
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "conf.toml"),
+        help="Path to the configuration of the test used by the headers command. Default: conf.toml",
+    )
+    parser.add_argument(
+        "-a",
+        "--accelerator",
+        type=str,
+        default="ne16",
+        help="Accelerator of the test used by the headers command. Default: ne16",
+    )
+    parser.add_argument(
+        "-n",
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of runs of each command, the best one is reported. Default: 5",
+    )
+    parser.add_argument(
+        "--help-budget",
+        type=float,
+        dest="help_budget",
+        default=0.2,
+        help="Time budget of testgen.py --help in seconds. Default: 0.2",
+    )
+    parser.add_argument(
+        "--headers-budget",
+        type=float,
+        dest="headers_budget",
+        default=1.0,
+        help="Time budget of testgen.py headers in seconds. Default: 1.0",
+    )
+    args = parser.parse_args()
+
+    if not benchmark(args):
+        exit(-1)
@@ -17,10 +17,24 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import re
+import subprocess
+from typing import Dict, List, Optional, Union
 
-from NnxBuildFlow import NnxBuildFlowClsMapping, NnxBuildFlowName
+import pytest
+
+from NnxBackend import NnxBackend
+from NnxBuildFlow import (
+    CmakeBuildFlow,
+    NnxBuildFlow,
+    NnxBuildFlowClsMapping,
+    NnxBuildFlowName,
+    NnxRunStopped,
+    NnxRunWatchdog,
+)
+from NnxCache import NnxCache
 from NnxMapping import NnxMapping, NnxName
-from NnxTestClasses import NnxTest, NnxTestHeaderGenerator, NnxWmem
+from NnxTestClasses import NnxOutputCheck, NnxTest, NnxTestHeaderGenerator, NnxWmem
+from NnxTestPipeline import NnxTestPipeline
 
 HORIZONTAL_LINE = "\n" + "-" * 100 + "\n"
 
@@ -33,32 +47,218 @@ def assert_message(msg: str, test_name: str, stdout: str):
     )
 
 
+def layer_stdout(stdout: str, test_name: str) -> Optional[str]:
+    """Extract the output of the test's layer, None if the layer didn't finish"""
+    name = re.escape(test_name)
+    match = re.search(
+        rf"^Layer {name} starting$.*?^Layer {name} finished$",
+        stdout,
+        re.MULTILINE | re.DOTALL,
+    )
+    return match.group(0) if match else None
+
+
+def wrong_output_rows(stdout: str) -> List[int]:
+    """Rows of the output whose checksum didn't match"""
+    return [
+        int(row)
+        for row in re.findall(
+            r"^ERROR: wrong checksum of output row (\d+):", stdout, re.MULTILINE
+        )
+    ]
+
+
+def layer_started(stdout: str, test_name: str) -> bool:
+    name = re.escape(test_name)
+    return re.search(rf"^Layer {name} starting$", stdout, re.MULTILINE) is not None
+
+
+def build(
+    nnxName: NnxName,
+    buildFlowName: NnxBuildFlowName,
+    wmem: NnxWmem,
+    backend: NnxBackend,
+    binaryData: bool,
+    outputCheck: NnxOutputCheck,
+    layerImage: bool,
+    buildCache: Optional[NnxCache],
+    workdir: Optional[str],
+    nnxTestNames: List[str],
+) -> NnxBuildFlow:
+    testConfCls, weightCls = NnxMapping[nnxName]
+
+    # conftest.py makes sure the tests are valid and generated
+    nnxTests = [
+        (name, NnxTest.load(testConfCls, name, backend)) for name in nnxTestNames
+    ]
+
+    buildFlow = NnxBuildFlowClsMapping[buildFlowName](nnxName, workdir)
+    if isinstance(buildFlow, CmakeBuildFlow) and not buildFlow.is_prepared():
+        buildFlow.prepare()
+
+    generator = NnxTestHeaderGenerator(
+        weightCls(wmem), buildFlow.gen_dir, binary=binaryData, output_check=outputCheck
+    )
+    if layerImage:
+        changed_files = generator.generate_image(nnxTests)
+    else:
+        changed_files = generator.generate_batch(nnxTests)
+
+    # Nothing to rebuild if the sources are the same as the last successful build
+    if len(changed_files) > 0 or not buildFlow.is_built():
+        buildFlow.build(buildCache)
+    return buildFlow
+
+
+def run(
+    nnxName: NnxName,
+    buildFlowName: NnxBuildFlowName,
+    wmem: NnxWmem,
+    backend: NnxBackend,
+    binaryData: bool,
+    outputCheck: NnxOutputCheck,
+    layerImage: bool,
+    buildCache: Optional[NnxCache],
+    workdir: Optional[str],
+    simTimeout: Optional[float],
+    runWatchdog: Optional[NnxRunWatchdog],
+    resultCache: Optional[NnxCache],
+    nnxTestNames: List[str],
+) -> str:
+    buildFlow = build(
+        nnxName,
+        buildFlowName,
+        wmem,
+        backend,
+        binaryData,
+        outputCheck,
+        layerImage,
+        buildCache,
+        workdir,
+        nnxTestNames,
+    )
+    return buildFlow.run(simTimeout, runWatchdog, resultCache)
+
+
 def test(
     nnxName: NnxName,
     buildFlowName: NnxBuildFlowName,
     wmem: NnxWmem,
+    backend: NnxBackend,
+    binaryData: bool,
+    outputCheck: NnxOutputCheck,
+    layerImage: bool,
+    buildCache: Optional[NnxCache],
+    workdir: Optional[str],
+    simTimeout: Optional[float],
+    runWatchdog: Optional[NnxRunWatchdog],
+    resultCache: Optional[NnxCache],
+    nnxBatch: List[str],
+    batchResults: Dict[str, Union[str, Exception]],
+    nnxPipeline: Optional[NnxTestPipeline],
     nnxTestName: str,
 ):
-    testConfCls, weightCls = NnxMapping[nnxName]
+    # The first test of a batch runs it for all of them
+    if nnxTestName not in batchResults:
+        result: Union[str, Exception]
+        if nnxPipeline is not None:
+            result = nnxPipeline.result(
+                nnxBatch,
+                lambda batch, batchWorkdir: build(
+                    nnxName,
+                    buildFlowName,
+                    wmem,
+                    backend,
+                    binaryData,
+                    outputCheck,
+                    layerImage,
+                    buildCache,
+                    batchWorkdir,
+                    batch,
+                ),
+                # The watchdog counts the errors of a single simulation
+                lambda buildFlow: buildFlow.run(
+                    simTimeout,
+                    None if runWatchdog is None else runWatchdog.copy(),
+                    resultCache,
+                ),
+            )
+        else:
+            try:
+                result = run(
+                    nnxName,
+                    buildFlowName,
+                    wmem,
+                    backend,
+                    binaryData,
+                    outputCheck,
+                    layerImage,
+                    buildCache,
+                    workdir,
+                    simTimeout,
+                    runWatchdog,
+                    resultCache,
+                    nnxBatch,
+                )
+            except Exception as e:
+                result = e
+        for name in nnxBatch:
+            batchResults[name] = result
 
-    # conftest.py makes sure the test is valid and generated
-    nnxTest = NnxTest.load(testConfCls, nnxTestName)
+    result = batchResults.pop(nnxTestName)
+    if isinstance(result, (subprocess.TimeoutExpired, NnxRunStopped)):
+        # The layers that finished before the simulation got killed still count
+        stdout = result.output
+        assert isinstance(stdout, str)
+        if layer_stdout(stdout, nnxTestName) is None:
+            if isinstance(result, subprocess.TimeoutExpired):
+                pytest.fail(
+                    assert_message(
+                        f"The simulation timed out after {result.timeout}s.",
+                        nnxTestName,
+                        stdout,
+                    )
+                )
+            if not layer_started(stdout, nnxTestName):
+                pytest.skip(
+                    f"The simulation stopped early at a failure of another test: {result.reason}"
+                )
+            pytest.fail(
+                assert_message(
+                    f"The simulation stopped early: {result.reason}",
+                    nnxTestName,
+                    stdout,
+                )
+            )
+    elif isinstance(result, Exception):
+        raise result
+    else:
+        stdout = result
 
-    NnxTestHeaderGenerator(weightCls(wmem)).generate(nnxTestName, nnxTest)
+    nnx_layer_stdout = layer_stdout(stdout, nnxTestName)
 
-    buildFlow = NnxBuildFlowClsMapping[buildFlowName](nnxName)
-    buildFlow.build()
-    stdout = buildFlow.run()
+    assert nnx_layer_stdout is not None, assert_message(
+        "The layer didn't finish.", nnxTestName, stdout
+    )
 
-    match_success = re.search(r"> Success! No errors found.", stdout)
-    match_fail = re.search(r"> Failure! Found (\d*)/(\d*) errors.", stdout)
+    match_success = re.search(r"> Success! No errors found.", nnx_layer_stdout)
+    match_fail = re.search(r"> Failure! Found (\d*)/(\d*) errors.", nnx_layer_stdout)
 
     assert match_success or match_fail, assert_message(
-        "No regexes matched.", nnxTestName, stdout
+        "No regexes matched.", nnxTestName, nnx_layer_stdout
     )
 
+    if match_fail and outputCheck == NnxOutputCheck.crc32:
+        rows = wrong_output_rows(nnx_layer_stdout)
+        assert False, assert_message(
+            f"Wrong output rows {match_fail.group(1)}/{match_fail.group(2)}: "
+            f"output[:, :, h, :] for h in {rows}",
+            nnxTestName,
+            nnx_layer_stdout,
+        )
+
     assert not match_fail, assert_message(
         f"Errors found: {match_fail.group(1)}/{match_fail.group(2)}",
         nnxTestName,
-        stdout,
+        nnx_layer_stdout,
     )
@@ -16,23 +16,46 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+from __future__ import annotations
+
 import argparse
 import json
 import os
+import sys
+import time
 import typing
-from typing import Optional, Set, Type, Union
-
-import toml
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
+from NnxCache import NnxCache
 from NnxMapping import NnxMapping, NnxName
-from NnxTestClasses import (
-    NnxTest,
-    NnxTestConf,
-    NnxTestGenerator,
-    NnxTestHeaderGenerator,
-    NnxWeight,
-    NnxWmem,
-)
+
+# The heavy modules, torch, pydantic, and the accelerator specific ones included, get
+# imported by the subcommands that need them to keep the script's startup fast
+if TYPE_CHECKING:
+    from NnxBackend import NnxBackend
+    from NnxTestClasses import (
+        NnxOutputCheck,
+        NnxTensorFormat,
+        NnxTest,
+        NnxTestConf,
+        NnxTestGenerator,
+        NnxWeight,
+    )
+
+
+def _golden_cache(args) -> Optional[NnxCache]:
+    return None if args.no_golden_cache else NnxCache(args.golden_cache)
 
 
 def headers_gen(
@@ -41,12 +64,20 @@ def headers_gen(
     nnxWeight: NnxWeight,
     test: Optional[NnxTest] = None,
 ):
+    from NnxBackend import NnxBackend
+    from NnxTestClasses import NnxTest, NnxTestGenerator, NnxTestHeaderGenerator
+
     if test is None:
-        test = NnxTest.load(nnxTestConfCls, args.test_dir)
+        # Rendering the headers only needs NumPy arrays
+        test = NnxTest.load(nnxTestConfCls, args.test_dir, NnxBackend.numpy)
     assert test is not None
     if not test.is_valid():
-        test = NnxTestGenerator.from_conf(test.conf)
-    NnxTestHeaderGenerator(nnxWeight).generate(args.test_dir, test)
+        test = NnxTestGenerator.from_conf(
+            test.conf, cache=_golden_cache(args), backend=args.backend
+        )
+    NnxTestHeaderGenerator(
+        nnxWeight, binary=args.binary_data, output_check=args.output_check
+    ).generate(args.test_dir, test)
 
 
 def print_tensors(test: NnxTest):
@@ -64,66 +95,459 @@ def print_tensors(test: NnxTest):
     print(test.output)
 
 
+def _load_conf_file(path: str) -> Dict:
+    if path.endswith(".toml"):
+        import toml
+
+        return toml.load(path)
+    elif path.endswith(".json"):
+        with open(path, "r") as fp:
+            return json.load(fp)
+    else:
+        raise ValueError(
+            f"Unsupported file type for {path} configuration file. Supported file formats: .json and .toml."
+        )
+
+
+def _data_generation_method(args) -> NnxTestGenerator.DataGenerationMethod:
+    from NnxTestClasses import NnxTestGenerator
+
+    method = NnxTestGenerator.DataGenerationMethod.RANDOM
+    if getattr(args, "gen_ones", False):
+        method = NnxTestGenerator.DataGenerationMethod.ONES
+    if getattr(args, "gen_incremented", False):
+        method = NnxTestGenerator.DataGenerationMethod.INCREMENTED
+    if args.gen_method is not None:
+        method = NnxTestGenerator.DataGenerationMethod[args.gen_method.upper()]
+    return method
+
+
 def test_gen(
     args,
     nnxTestConfCls: Type[NnxTestConf],
     nnxWeight: NnxWeight,
 ):
-    assert not (
-        args.gen_ones and args.gen_incremented
+    from NnxTestClasses import NnxTestGenerator
+
+    assert (
+        sum([args.gen_ones, args.gen_incremented, args.gen_method is not None]) <= 1
     ), "You can choose only one method for input generation."
 
-    if args.conf.endswith(".toml"):
-        test_conf_dict = toml.load(args.conf)
-    elif args.conf.endswith(".json"):
-        with open(args.conf, "r") as fp:
-            test_conf_dict = json.load(fp)
-    else:
-        print(
-            f"ERROR: Unsupported file type for {args.conf} configuration file. Supported file formats: .json and .toml."
-        )
+    try:
+        test_conf_dict = _load_conf_file(args.conf)
+    except ValueError as e:
+        print(f"ERROR: {e}")
         exit(-1)
 
     test_conf = nnxTestConfCls.model_validate(test_conf_dict)
 
-    method = NnxTestGenerator.DataGenerationMethod.RANDOM
-    if args.gen_ones:
-        method = NnxTestGenerator.DataGenerationMethod.ONES
-    if args.gen_incremented:
-        method = NnxTestGenerator.DataGenerationMethod.INCREMENTED
+    method = _data_generation_method(args)
 
     test = NnxTestGenerator.from_conf(
-        test_conf, data_generation_method=method, verbose=args.print_tensors
+        test_conf,
+        data_generation_method=method,
+        verbose=args.print_tensors,
+        cache=_golden_cache(args),
+        seed=args.seed,
+        backend=args.backend,
     )
     if not args.skip_save:
-        test.save(args.test_dir)
+        test.save(args.test_dir, args.tensor_format)
     if args.headers:
         headers_gen(args, nnxTestConfCls, nnxWeight, test)
     if args.print_tensors:
         print_tensors(test)
 
 
+class _BatchEntry(NamedTuple):
+    test_dir: str
+    conf: NnxTestConf
+    seed: Optional[int]
+
+
+# Directory inside of each test receiving its headers in batch mode
+BATCH_HEADERS_DIR = "gen"
+
+
+def _read_manifest(path: str) -> List[Dict]:
+    """Entries of a TOML manifest's [[test]] tables or of a JSONL manifest's lines"""
+    if path.endswith(".toml"):
+        import toml
+
+        entries = toml.load(path).get("test", [])
+    elif path.endswith(".jsonl"):
+        with open(path, "r") as fp:
+            entries = [json.loads(line) for line in fp if line.strip() != ""]
+    else:
+        raise ValueError(
+            f"Unsupported file type for {path} manifest. Supported file formats: .toml and .jsonl."
+        )
+    if not isinstance(entries, list) or not all(
+        isinstance(entry, dict) for entry in entries
+    ):
+        raise ValueError(f"Manifest {path} has to be a list of tests.")
+    return entries
+
+
+def _glob_test_name(conf_path: str, pattern: str) -> str:
+    """Name of the test of a configuration found with the glob pattern
+
+    The configuration's path relative to the pattern's base directory, without the
+    extension. The conf.json of a test directory names the test after the directory.
+    """
+    import glob
+
+    from NnxTestClasses import NnxTest
+
+    parts = pattern.split(os.sep)
+    base_parts = []
+    for part in parts[:-1]:
+        if glob.has_magic(part):
+            break
+        base_parts.append(part)
+    base = os.sep.join(base_parts)
+
+    name = os.path.relpath(conf_path, base if base != "" else os.curdir)
+    if os.path.basename(name) == NnxTest._CONF_NAME and os.path.dirname(name) != "":
+        return os.path.dirname(name)
+    return os.path.splitext(name)[0]
+
+
+def _batch_entries(args, nnxTestConfCls: Type[NnxTestConf]) -> List[_BatchEntry]:
+    """Load and validate all of the batch's configurations
+
+    Reports every invalid entry at once and exits before anything gets generated.
+    """
+    import glob
+
+    import pydantic
+
+    raw_entries: List[Dict] = []
+    errors: List[str] = []
+    if args.manifest is not None:
+        try:
+            raw_entries = _read_manifest(args.manifest)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            exit(-1)
+        # Relative paths in the manifest are relative to the manifest itself
+        base_dir = os.path.dirname(args.manifest)
+    else:
+        base_dir = ""
+        for conf_path in sorted(glob.glob(args.glob, recursive=True)):
+            name = _glob_test_name(conf_path, args.glob)
+            raw_entries.append(
+                {"conf": conf_path, "test_dir": os.path.join(args.output_dir, name)}
+            )
+
+    entries: List[_BatchEntry] = []
+    for i, raw_entry in enumerate(raw_entries):
+        name = f"entry {i}"
+        try:
+            test_dir = raw_entry["test_dir"]
+            name = f"{name} ({test_dir})"
+            conf = raw_entry["conf"]
+            if isinstance(conf, str):
+                conf = _load_conf_file(os.path.join(base_dir, conf))
+            seed = raw_entry.get("seed")
+            if seed is not None and not isinstance(seed, int):
+                raise ValueError(f"Seed {seed} is not an integer")
+            entries.append(
+                _BatchEntry(
+                    os.path.join(base_dir, test_dir),
+                    nnxTestConfCls.model_validate(conf),
+                    seed,
+                )
+            )
+        except KeyError as e:
+            errors.append(f"{name}: missing the {e} field")
+        except pydantic.ValidationError as e:
+            errors.append(
+                f"{name}: "
+                + "; ".join(
+                    f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+                    for error in e.errors()
+                )
+            )
+        except (OSError, ValueError, TypeError) as e:
+            errors.append(f"{name}: {e}")
+
+    test_dirs = [entry.test_dir for entry in entries]
+    for test_dir in sorted(set(test_dirs)):
+        if test_dirs.count(test_dir) > 1:
+            errors.append(
+                f"{test_dir}: targeted by {test_dirs.count(test_dir)} entries"
+            )
+
+    if len(errors) > 0:
+        print(f"Found {len(errors)} invalid entries:")
+        for error in errors:
+            print(f" - {error}")
+        exit(-1)
+
+    return entries
+
+
+def _batch_gen_chunk(
+    entries: List[_BatchEntry],
+    data_generation_method: NnxTestGenerator.DataGenerationMethod,
+    backend: NnxBackend,
+    cache: Optional[NnxCache],
+    tensor_format: Optional[NnxTensorFormat],
+    nnxWeight: Optional[NnxWeight],
+    binary: bool,
+    output_check: NnxOutputCheck,
+) -> Dict[str, Optional[str]]:
+    """Generate and save the tests, and their headers given a weight
+
+    Returns the error of each test, or None if it succeeded.
+    """
+    import contextlib
+    import io
+
+    from NnxTestClasses import NnxTestGenerator, NnxTestHeaderGenerator
+
+    try:
+        tests = NnxTestGenerator.from_confs(
+            [entry.conf for entry in entries],
+            data_generation_method,
+            cache=cache,
+            batch_size=len(entries),
+            seeds=[entry.seed for entry in entries],
+            backend=backend,
+        )
+    except Exception as e:
+        if len(entries) == 1:
+            return {entries[0].test_dir: f"{type(e).__name__}: {e}"}
+        # Isolate the failing tests
+        results: Dict[str, Optional[str]] = {}
+        for entry in entries:
+            results.update(
+                _batch_gen_chunk(
+                    [entry],
+                    data_generation_method,
+                    backend,
+                    cache,
+                    tensor_format,
+                    nnxWeight,
+                    binary,
+                    output_check,
+                )
+            )
+        return results
+
+    results = {}
+    for entry, test in zip(entries, tests):
+        try:
+            test.save(entry.test_dir, tensor_format)
+            if nnxWeight is not None:
+                # Silence the header writer's report of every generated file
+                with contextlib.redirect_stdout(io.StringIO()):
+                    NnxTestHeaderGenerator(
+                        nnxWeight,
+                        os.path.join(entry.test_dir, BATCH_HEADERS_DIR),
+                        binary=binary,
+                        output_check=output_check,
+                    ).generate(entry.test_dir, test)
+            results[entry.test_dir] = None
+        except Exception as e:
+            results[entry.test_dir] = f"{type(e).__name__}: {e}"
+    return results
+
+
+def batch_gen(
+    args,
+    nnxTestConfCls: Type[NnxTestConf],
+    nnxWeight: NnxWeight,
+):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    assert args.batch_size > 0, f"Invalid batch size {args.batch_size}"
+
+    start = time.perf_counter()
+    entries = _batch_entries(args, nnxTestConfCls)
+    method = _data_generation_method(args)
+    cache = _golden_cache(args)
+    print(f"Generating {len(entries)} tests")
+
+    # Every chunk is generated by a single from_confs call, batching the functional
+    # model evaluations of its tests
+    chunks = [
+        entries[i : i + args.batch_size]
+        for i in range(0, len(entries), args.batch_size)
+    ]
+
+    failures: Dict[str, str] = {}
+    done = 0
+    with ProcessPoolExecutor(
+        max_workers=args.jobs, initializer=_init_regen_worker, initargs=(args.backend,)
+    ) as executor:
+        futures = [
+            executor.submit(
+                _batch_gen_chunk,
+                chunk,
+                method,
+                args.backend,
+                cache,
+                args.tensor_format,
+                nnxWeight if args.headers else None,
+                args.binary_data,
+                args.output_check,
+            )
+            for chunk in chunks
+        ]
+        for future in as_completed(futures):
+            for test_dir, error in future.result().items():
+                done += 1
+                if error is not None:
+                    failures[test_dir] = error
+                print(
+                    f"[{done}/{len(entries)}] {test_dir}: {'FAILED' if error is not None else 'done'}",
+                    flush=True,
+                )
+
+    print(
+        f"\nGenerated {len(entries) - len(failures)}/{len(entries)} tests in {time.perf_counter() - start:.2f}s"
+    )
+    if len(failures) > 0:
+        print(f"Failed tests ({len(failures)}):")
+        for test_dir, error in sorted(failures.items()):
+            print(f" - {test_dir}: {error}")
+        exit(-1)
+
+
 def _regen(
     path: Union[str, os.PathLike],
     regen_tensors: Set[NnxTestGenerator.TensorName],
     nnxTestConfCls: Type[NnxTestConf],
-) -> None:
-    test = NnxTest.load(nnxTestConfCls, path)
-    test = NnxTestGenerator.regenerate(test, regen_tensors)
+    backend: NnxBackend,
+    cache: Optional[NnxCache] = None,
+    stale: bool = False,
+) -> bool:
+    """Returns False if the test was skipped as it was up to date"""
+    from NnxTestClasses import NnxTest, NnxTestGenerator
+
+    test = NnxTest.load(nnxTestConfCls, path, backend)
+    if stale and not NnxTestGenerator.is_stale(test):
+        return False
+    test = NnxTestGenerator.regenerate(test, regen_tensors, cache)
     test.save(path)
+    return True
 
 
-def _regen_recursive(
+def _regen_timed(
     path: Union[str, os.PathLike],
     regen_tensors: Set[NnxTestGenerator.TensorName],
     nnxTestConfCls: Type[NnxTestConf],
+    backend: NnxBackend,
+    cache: Optional[NnxCache] = None,
+    stale: bool = False,
+) -> Optional[float]:
+    """Returns None if the test was skipped as it was up to date"""
+    start = time.perf_counter()
+    if not _regen(path, regen_tensors, nnxTestConfCls, backend, cache, stale):
+        return None
+    return time.perf_counter() - start
+
+
+def _find_test_dirs(path: Union[str, os.PathLike]) -> List[str]:
+    from NnxTestClasses import NnxTest
+
+    return sorted(
+        dirpath for dirpath, _, _ in os.walk(path) if NnxTest.is_test_dir(dirpath)
+    )
+
+
+def _init_regen_worker(backend: NnxBackend) -> None:
+    from NnxBackend import NnxBackend
+
+    # Every worker is a separate process so intra-op parallelism only oversubscribes
+    if backend == NnxBackend.torch:
+        import torch
+
+        torch.set_num_threads(1)
+
+
+def _print_regen_summary(
+    timings: Dict[str, float],
+    failures: Dict[str, str],
+    elapsed: float,
+    up_to_date: int = 0,
 ) -> None:
-    if NnxTest.is_test_dir(path):
-        _regen(path, regen_tensors, nnxTestConfCls)
-        return
+    print(
+        f"\nRegenerated {len(timings)}/{len(timings) + len(failures)} tests in {elapsed:.2f}s"
+    )
+    if up_to_date > 0:
+        print(f"Skipped {up_to_date} up to date tests")
+
+    if len(timings) > 0:
+        total = sum(timings.values())
+        print(
+            f"Time per test: total {total:.2f}s, mean {total / len(timings):.2f}s, max {max(timings.values()):.2f}s"
+        )
+        print("Slowest tests:")
+        for path, duration in sorted(timings.items(), key=lambda kv: -kv[1])[:5]:
+            print(f" - {path}: {duration:.2f}s")
 
-    for dirpath, _, _ in os.walk(path):
-        _regen_recursive(dirpath, regen_tensors, nnxTestConfCls)
+    if len(failures) > 0:
+        print(f"Failed tests ({len(failures)}):")
+        for path, error in sorted(failures.items()):
+            print(f" - {path}: {error}")
+
+
+def _regen_recursive(
+    path: Union[str, os.PathLike],
+    regen_tensors: Set[NnxTestGenerator.TensorName],
+    nnxTestConfCls: Type[NnxTestConf],
+    backend: NnxBackend,
+    jobs: Optional[int] = None,
+    cache: Optional[NnxCache] = None,
+    stale: bool = False,
+) -> None:
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    start = time.perf_counter()
+    test_dirs = _find_test_dirs(path)
+    print(f"Found {len(test_dirs)} tests in {path}")
+
+    timings: Dict[str, float] = {}
+    failures: Dict[str, str] = {}
+    up_to_date = 0
+
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_regen_worker, initargs=(backend,)
+    ) as executor:
+        futures = {
+            executor.submit(
+                _regen_timed,
+                test_dir,
+                regen_tensors,
+                nnxTestConfCls,
+                backend,
+                cache,
+                stale,
+            ): (test_dir)
+            for test_dir in test_dirs
+        }
+        for i, future in enumerate(as_completed(futures), start=1):
+            test_dir = futures[future]
+            try:
+                timing = future.result()
+                if timing is None:
+                    up_to_date += 1
+                    status = "up to date"
+                else:
+                    timings[test_dir] = timing
+                    status = f"done in {timing:.2f}s"
+            except Exception as e:
+                failures[test_dir] = f"{type(e).__name__}: {e}"
+                status = "FAILED"
+            print(f"[{i}/{len(test_dirs)}] {test_dir}: {status}", flush=True)
+
+    _print_regen_summary(timings, failures, time.perf_counter() - start, up_to_date)
+
+    if len(failures) > 0:
+        exit(-1)
 
 
 def test_regen(
@@ -134,10 +558,120 @@ def test_regen(
     _ = nnxWeight
     regen_tensors = set(args.tensors)
 
+    cache = _golden_cache(args)
+
     if args.recursive:
-        _regen_recursive(args.test_dir, regen_tensors, nnxTestConfCls)
-    else:
-        _regen(args.test_dir, regen_tensors, nnxTestConfCls)
+        _regen_recursive(
+            args.test_dir,
+            regen_tensors,
+            nnxTestConfCls,
+            args.backend,
+            args.jobs,
+            cache,
+            args.stale,
+        )
+    elif not _regen(
+        args.test_dir, regen_tensors, nnxTestConfCls, args.backend, cache, args.stale
+    ):
+        print(f"Test {args.test_dir} is up to date")
+
+
+def _convert(
+    path: Union[str, os.PathLike],
+    tensor_format: NnxTensorFormat,
+    nnxTestConfCls: Type[NnxTestConf],
+    backend: NnxBackend,
+) -> None:
+    from NnxTestClasses import NnxTest
+
+    test = NnxTest.load(nnxTestConfCls, path, backend)
+    test.save_data(path, tensor_format)
+
+
+def test_convert(
+    args,
+    nnxTestConfCls: Type[NnxTestConf],
+    nnxWeight: NnxWeight,
+):
+    _ = nnxWeight
+
+    test_dirs = _find_test_dirs(args.test_dir) if args.recursive else [args.test_dir]
+    for test_dir in test_dirs:
+        _convert(test_dir, args.tensor_format, nnxTestConfCls, args.backend)
+        print(f"Converted {test_dir} to {args.tensor_format}")
+
+
+def cache_cmd(args):
+    cache = NnxCache(args.golden_cache)
+
+    if args.clear:
+        cache.clear()
+    elif args.max_size is not None:
+        cache.evict(max_size=args.max_size * (1 << 20))
+
+    print(
+        f"Golden cache {args.golden_cache}: {len(cache)} entries, {cache.size() / (1 << 20):.1f} MiB"
+    )
+
+
+def add_headers_arguments(parser: argparse.ArgumentParser):
+    from NnxTestClasses import NnxOutputCheck
+
+    parser.add_argument(
+        "--binary-data",
+        action="store_true",
+        default=False,
+        dest="binary_data",
+        help="Emit the test data as binary files included by an assembler stub instead of C initializers.",
+    )
+    parser.add_argument(
+        "--output-check",
+        type=NnxOutputCheck,
+        dest="output_check",
+        choices=list(NnxOutputCheck),
+        default=NnxOutputCheck.golden,
+        help="Check the output against a golden copy, or against CRC32 digests of its rows "
+        "which take less L2 but only tell the wrong rows. Default: golden",
+    )
+
+
+def add_tensor_format_arguments(
+    parser: argparse.ArgumentParser, default: Optional[NnxTensorFormat]
+):
+    from NnxTestClasses import NnxTensorFormat
+
+    parser.add_argument(
+        "--tensor-format",
+        type=NnxTensorFormat,
+        dest="tensor_format",
+        choices=list(NnxTensorFormat),
+        default=default,
+        help="On-disk format of the test tensors. The npy format gets memory mapped when loaded. "
+        + (
+            f"Default: {default}"
+            if default is not None
+            else "Default: the format already used by the test"
+        ),
+    )
+
+
+def add_golden_cache_arguments(parser: argparse.ArgumentParser):
+    from NnxTestClasses import NnxTestGenerator
+
+    parser.add_argument(
+        "--golden-cache",
+        type=str,
+        dest="golden_cache",
+        default=NnxTestGenerator.GOLDEN_CACHE_DIR,
+        help=f"Path to the golden cache directory. Default: {NnxTestGenerator.GOLDEN_CACHE_DIR}",
+    )
+    parser.add_argument(
+        "--no-golden-cache",
+        action="store_true",
+        default=False,
+        dest="no_golden_cache",
+        help="Always recompute the test data instead of using the golden cache.",
+    )
 
 
 def add_common_arguments(parser: argparse.ArgumentParser):
@@ -149,6 +683,13 @@ def add_common_arguments(parser: argparse.ArgumentParser):
         required=True,
         help="Path to the test.",
     )
+    add_accelerator_arguments(parser)
+
+
+def add_accelerator_arguments(parser: argparse.ArgumentParser):
+    from NnxBackend import NnxBackend
+    from NnxTestClasses import NnxTest, NnxWmem
+
     parser.add_argument(
         "-a",
         "--accelerator",
@@ -165,87 +706,290 @@ def add_common_arguments(parser: argparse.ArgumentParser):
         default=NnxWmem.tcdm,
         help="Choose the weight memory destination. Default: tcdm",
     )
+    parser.add_argument(
+        "--backend",
+        type=NnxBackend,
+        choices=list(NnxBackend),
+        default=NnxTest.DEFAULT_BACKEND,
+        help="Array library that generates and loads the test data. The numpy backend "
+        "generates the same data without torch, though it can't read or write tensors "
+        f"in the pt format without it. Default: {NnxTest.DEFAULT_BACKEND}",
+    )
 
 
-parser = argparse.ArgumentParser(
-    description="Utility script to generate tests and header files."
-)
+def add_headers_command_arguments(parser: argparse.ArgumentParser):
+    add_common_arguments(parser)
+    add_headers_arguments(parser)
+    add_golden_cache_arguments(parser)
+    parser.set_defaults(func=headers_gen)
 
-subparsers = parser.add_subparsers()
 
-parser_header = subparsers.add_parser(
-    "headers", description="Generate headers for a single test."
-)
-add_common_arguments(parser_header)
-parser_header.set_defaults(func=headers_gen)
+def add_test_command_arguments(parser: argparse.ArgumentParser):
+    from NnxTestClasses import NnxTestGenerator
+
+    parser.add_argument(
+        "-c",
+        "--conf",
+        type=str,
+        default="conf.toml",
+        required=True,
+        help="Path to the configuration file.",
+    )
+    parser.add_argument(
+        "--headers", action="store_true", default=False, help="Generate headers."
+    )
+    parser.add_argument(
+        "--skip-save",
+        action="store_true",
+        default=False,
+        dest="skip_save",
+        help="Skip saving the test.",
+    )
+    parser.add_argument(
+        "--print-tensors",
+        action="store_true",
+        default=False,
+        dest="print_tensors",
+        help="Print tensor values to stdout.",
+    )
+    parser.add_argument(
+        "--gen-ones",
+        action="store_true",
+        default=False,
+        dest="gen_ones",
+        help="Generate all ones for input tensors, useful for testing arithmetic issues.",
+    )
+    parser.add_argument(
+        "--gen-incremented",
+        action="store_true",
+        default=False,
+        dest="gen_incremented",
+        help="Generate incremented values for input tensors, useful for testing tensor load issues.",
+    )
+    parser.add_argument(
+        "--gen-method",
+        type=str,
+        dest="gen_method",
+        choices=[
+            method.name.lower() for method in NnxTestGenerator.DataGenerationMethod
+        ],
+        default=None,
+        help="Method for input generation. Default: random",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed of the random data generation. Default: derived from the configuration",
+    )
+    add_common_arguments(parser)
+    add_headers_arguments(parser)
+    add_golden_cache_arguments(parser)
+    add_tensor_format_arguments(parser, default=None)
+    parser.set_defaults(func=test_gen)
 
-parser_test = subparsers.add_parser(
-    "test", description="Generate a test from a configuration."
-)
-parser_test.add_argument(
-    "-c",
-    "--conf",
-    type=str,
-    default="conf.toml",
-    required=True,
-    help="Path to the configuration file.",
-)
-parser_test.add_argument(
-    "--headers", action="store_true", default=False, help="Generate headers."
-)
-parser_test.add_argument(
-    "--skip-save",
-    action="store_true",
-    default=False,
-    dest="skip_save",
-    help="Skip saving the test.",
-)
-parser_test.add_argument(
-    "--print-tensors",
-    action="store_true",
-    default=False,
-    dest="print_tensors",
-    help="Print tensor values to stdout.",
-)
-parser_test.add_argument(
-    "--gen-ones",
-    action="store_true",
-    default=False,
-    dest="gen_ones",
-    help="Generate all ones for input tensors, useful for testing arithmetic issues.",
-)
-parser_test.add_argument(
-    "--gen-incremented",
-    action="store_true",
-    default=False,
-    dest="gen_incremented",
-    help="Generate incremented values for input tensors, useful for testing tensor load issues.",
-)
-add_common_arguments(parser_test)
-parser_test.set_defaults(func=test_gen)
-
-parser_regen = subparsers.add_parser("regen", description="Regenerate test tensors.")
-parser_regen.add_argument(
-    "--tensor",
-    type=str,
-    dest="tensors",
-    choices=typing.get_args(NnxTestGenerator.TensorName),
-    action="append",
-    default=["output"],
-    help="Tensors that should be regenerated. Output included by default.",
-)
-parser_regen.add_argument(
-    "-r",
-    "--recursive",
-    action="store_true",
-    default=False,
-    help="Recursively search for test directiories inside given test directories.",
-)
-add_common_arguments(parser_regen)
-parser_regen.set_defaults(func=test_regen)
 
-args = parser.parse_args()
+def add_batch_command_arguments(parser: argparse.ArgumentParser):
+    from NnxTestClasses import NnxTestGenerator
 
-testConfCls, weightCls = NnxMapping[args.accelerator]
+    sources = parser.add_mutually_exclusive_group(required=True)
+    sources.add_argument(
+        "-m",
+        "--manifest",
+        type=str,
+        default=None,
+        help="Path to a manifest of the tests, either a TOML file with a [[test]] table per test "
+        "or a JSONL file with an object per line. Every test has a test_dir, a conf given "
+        "either as a path to a configuration file or inline, and optionally a seed. "
+        "Relative paths are relative to the manifest.",
+    )
+    sources.add_argument(
+        "-g",
+        "--glob",
+        type=str,
+        default=None,
+        help="Glob pattern of the configuration files. Each test is generated into the "
+        "output directory, at the path of its configuration file relative to the pattern's "
+        "base directory, or of its directory for the conf.json of a test.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        type=str,
+        dest="output_dir",
+        default="tests",
+        help="Directory receiving the tests of the configurations found with --glob. Default: tests",
+    )
+    parser.add_argument(
+        "--headers",
+        action="store_true",
+        default=False,
+        help=f"Generate the headers of each test into its {BATCH_HEADERS_DIR} directory.",
+    )
+    parser.add_argument(
+        "--gen-method",
+        type=str,
+        dest="gen_method",
+        choices=[
+            method.name.lower() for method in NnxTestGenerator.DataGenerationMethod
+        ],
+        default=None,
+        help="Method for input generation. Default: random",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes. Default: number of CPUs",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        dest="batch_size",
+        default=NnxTestGenerator.DEFAULT_BATCH_SIZE,
+        help="Maximum number of tests evaluated together by the functional model. "
+        f"Default: {NnxTestGenerator.DEFAULT_BATCH_SIZE}",
+    )
+    add_accelerator_arguments(parser)
+    add_headers_arguments(parser)
+    add_golden_cache_arguments(parser)
+    add_tensor_format_arguments(parser, default=None)
+    parser.set_defaults(func=batch_gen)
 
-args.func(args, testConfCls, weightCls(args.wmem))
+
+def add_regen_command_arguments(parser: argparse.ArgumentParser):
+    from NnxTestClasses import NnxTestGenerator
+
+    parser.add_argument(
+        "--tensor",
+        type=str,
+        dest="tensors",
+        choices=typing.get_args(NnxTestGenerator.TensorName),
+        action="append",
+        default=["output"],
+        help="Tensors that should be regenerated. Output included by default.",
+    )
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        default=False,
+        help="Recursively search for test directiories inside given test directories.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes used with --recursive. Default: number of CPUs",
+    )
+    parser.add_argument(
+        "--stale",
+        action="store_true",
+        default=False,
+        help="Only regenerate the tests whose data was generated by other versions of the generator "
+        "or the functional model, or from another configuration.",
+    )
+    add_common_arguments(parser)
+    add_golden_cache_arguments(parser)
+    parser.set_defaults(func=test_regen)
+
+
+def add_convert_command_arguments(parser: argparse.ArgumentParser):
+    from NnxTestClasses import NnxTensorFormat
+
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        default=False,
+        help="Recursively search for test directiories inside given test directories.",
+    )
+    add_common_arguments(parser)
+    add_tensor_format_arguments(parser, default=NnxTensorFormat.npy)
+    parser.set_defaults(func=test_convert)
+
+
+def add_cache_command_arguments(parser: argparse.ArgumentParser):
+    from NnxTestClasses import NnxTestGenerator
+
+    parser.add_argument(
+        "--clear",
+        action="store_true",
+        default=False,
+        help="Remove all the entries from the golden cache.",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        dest="max_size",
+        default=None,
+        help="Evict the least recently used entries until the cache is smaller than the given size in MiB.",
+    )
+    parser.add_argument(
+        "--golden-cache",
+        type=str,
+        dest="golden_cache",
+        default=NnxTestGenerator.GOLDEN_CACHE_DIR,
+        help=f"Path to the golden cache directory. Default: {NnxTestGenerator.GOLDEN_CACHE_DIR}",
+    )
+    parser.set_defaults(func=cache_cmd)
+
+
+# Subcommands with their description and the function adding their arguments
+_COMMANDS: Dict[str, Tuple[str, Callable[[argparse.ArgumentParser], None]]] = {
+    "headers": (
+        "Generate headers for a single test.",
+        add_headers_command_arguments,
+    ),
+    "test": (
+        "Generate a test from a configuration.",
+        add_test_command_arguments,
+    ),
+    "batch": (
+        "Generate many tests from a manifest or a glob of configurations.",
+        add_batch_command_arguments,
+    ),
+    "regen": ("Regenerate test tensors.", add_regen_command_arguments),
+    "convert": (
+        "Convert the test tensors to another on-disk format.",
+        add_convert_command_arguments,
+    ),
+    "cache": (
+        "Inspect, prune, or invalidate the golden cache.",
+        add_cache_command_arguments,
+    ),
+}
+
+
+def build_parser(command: Optional[str]) -> argparse.ArgumentParser:
+    """Parser with the arguments of the given subcommand only
+
+    The arguments of a subcommand need the modules it imports, so that the other
+    subcommands, and the help, don't pay for importing them.
+    """
+    parser = argparse.ArgumentParser(
+        description="Utility script to generate tests and header files."
+    )
+
+    subparsers = parser.add_subparsers()
+    for name, (description, add_arguments) in _COMMANDS.items():
+        subparser = subparsers.add_parser(name, description=description)
+        if name == command:
+            add_arguments(subparser)
+
+    return parser
+
+
+if __name__ == "__main__":
+    # The script has no options of its own apart from help, so the first positional
+    # argument is the subcommand
+    command = next((arg for arg in sys.argv[1:] if not arg.startswith("-")), None)
+    args = build_parser(command).parse_args()
+
+    if hasattr(args, "accelerator"):
+        testConfCls, weightCls = NnxMapping[args.accelerator]
+        args.func(args, testConfCls, weightCls(args.wmem))
+    else:
+        args.func(args)